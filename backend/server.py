@@ -1,20 +1,54 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Query, Body
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Query, Body, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from starlette.background import BackgroundTask
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, DeleteOne, ReturnDocument, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
+import shutil
+import struct
+import zlib
+import tempfile
+import multiprocessing
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
 import bcrypt
 from enum import Enum
 import io
+import gzip
+import hashlib
+import json
+import base64
+import copy
+import re
+import unicodedata
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+from email.utils import format_datetime, parsedate_to_datetime
 import pandas as pd
+import numpy as np
+import openpyxl
+import xlsxwriter
+from PIL import Image as PILImage, ImageOps  # Image is reportlab's flowable
+import pypdfium2 as pdfium
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm, mm
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -69,12 +103,39 @@ class StatusPersonel(str, Enum):
     DIBERHENTIKAN = "DIBERHENTIKAN"
 
 # ================== HELPER FUNCTIONS ==================
-def hash_password(password: str) -> str:
+# bcrypt is CPU bound (~250ms per call); run it on a dedicated pool so it never
+# blocks the event loop, and shed load once too many calls are waiting.
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', 32))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+password_jobs_pending = 0
+
+async def run_password_job(func, *args):
+    global password_jobs_pending
+    if password_jobs_pending >= PASSWORD_HASH_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=503,
+            detail="Server sedang sibuk, silakan coba lagi",
+            headers={"Retry-After": "1"}
+        )
+    password_jobs_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+    finally:
+        password_jobs_pending -= 1
+
+def _hash_password_sync(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
-def verify_password(password: str, hashed: str) -> bool:
+def _verify_password_sync(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+async def hash_password(password: str) -> str:
+    return await run_password_job(_hash_password_sync, password)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await run_password_job(_verify_password_sync, password, hashed)
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
@@ -87,13 +148,70 @@ def generate_id() -> str:
 def now_isoformat() -> str:
     return datetime.now(timezone.utc).isoformat()
 
+class TTLCache:
+    """Bounded LRU cache with a per-entry TTL; values are returned as shallow copies.
+
+    Used for principals (evicted explicitly when a user changes; the TTL bounds
+    how long other worker processes may keep serving a stale principal) and
+    for list totals.
+    """
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.copy(entry[1])
+
+    def set(self, key, value):
+        if self.max_size <= 0 or self.ttl_seconds <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.copy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+principal_cache = TTLCache(
+    max_size=int(os.environ.get('USER_CACHE_MAX_SIZE', 1000)),
+    ttl_seconds=float(os.environ.get('USER_CACHE_TTL_SECONDS', 30))
+)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Token tidak valid")
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
+        user = principal_cache.get(user_id)
+        if user is None:
+            user = await db.users.find_one({"id": user_id}, {"_id": 0})
+            if user is not None:
+                principal_cache.set(user_id, user)
         if user is None:
             raise HTTPException(status_code=401, detail="User tidak ditemukan")
         if not user.get("is_active", True):
@@ -111,6 +229,195 @@ def require_roles(*roles: UserRole):
         return user
     return role_checker
 
+# Audit entries live in one collection per month (audit_logs_YYYY_MM) so old
+# months can be archived and dropped whole. Entries keep a field-level diff
+# ("changes") instead of full before/after snapshots.
+AUDIT_PARTITION_PATTERN = re.compile(r"^audit_logs_\d{4}_\d{2}$")
+AUDIT_LEGACY_COLLECTION = "audit_logs"
+AUDIT_DIFF_IGNORED_FIELDS = {"_id", "created_at", "created_by", "updated_at", "updated_by"}
+AUDIT_EMPTY_VALUES = (None, "", [], {})
+
+audit_partitions_ready = set()
+
+def audit_partition(timestamp: str) -> str:
+    """Partition (collection name) for an ISO timestamp"""
+    return f"audit_logs_{timestamp[:4]}_{timestamp[5:7]}"
+
+def audit_changes(old_value: Optional[dict], new_value: Optional[dict]) -> Optional[dict]:
+    """Field-level diff: {"pangkat": {"old": "SERDA", "new": "SERTU"}}.
+
+    Only the fields in ``new_value`` are compared (updates pass just the fields
+    they set); with no ``new_value`` the non-empty fields of ``old_value`` are
+    recorded as removed. Empty-to-empty changes and bookkeeping fields are skipped.
+    """
+    if old_value is None and new_value is None:
+        return None
+    old_value = old_value or {}
+    fields = new_value if new_value is not None else old_value
+    new_value = new_value or {}
+    changes = {}
+    for field in fields:
+        if field in AUDIT_DIFF_IGNORED_FIELDS or field in SEARCH_FIELDS:
+            continue
+        before, after = old_value.get(field), new_value.get(field)
+        if before == after or (before in AUDIT_EMPTY_VALUES and after in AUDIT_EMPTY_VALUES):
+            continue
+        changes[field] = {"old": before, "new": after}
+    return changes or None
+
+def group_audit_partitions(logs: List[dict]) -> Dict[str, List[dict]]:
+    partitions = {}
+    for log in logs:
+        partitions.setdefault(audit_partition(log["timestamp"]), []).append(log)
+    return partitions
+
+async def ensure_audit_partition(name: str):
+    """Create the partition's indexes the first time this worker writes to it"""
+    if name in audit_partitions_ready:
+        return
+    for keys, options in AUDIT_PARTITION_INDEX_SPECS:
+        await db[name].create_index(keys, **options)
+    audit_partitions_ready.add(name)
+
+async def insert_audit_entries(partition: str, logs: List[dict]):
+    """insert_many into one partition; raises BulkWriteError like insert_many(ordered=False)"""
+    await ensure_audit_partition(partition)
+    await db[partition].insert_many(logs, ordered=False)
+
+async def list_audit_collections() -> tuple:
+    """(existing monthly partitions newest first, whether the legacy collection still exists)"""
+    names = await db.list_collection_names()
+    partitions = sorted((name for name in names if AUDIT_PARTITION_PATTERN.match(name)), reverse=True)
+    return partitions, AUDIT_LEGACY_COLLECTION in names
+
+# Audit entries are written off the request path by default. "sync" inserts
+# before the route returns, "async" fires one background insert per entry and
+# "batched" buffers entries and writes them with insert_many once
+# AUDIT_BATCH_SIZE are pending or every AUDIT_FLUSH_INTERVAL_SECONDS.
+AUDIT_DURABILITY = os.environ.get('AUDIT_DURABILITY', 'batched')
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 200))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.environ.get('AUDIT_FLUSH_INTERVAL_SECONDS', 1))
+AUDIT_QUEUE_MAX_SIZE = int(os.environ.get('AUDIT_QUEUE_MAX_SIZE', 10000))
+AUDIT_SHUTDOWN_FLUSH_SECONDS = float(os.environ.get('AUDIT_SHUTDOWN_FLUSH_SECONDS', 5))
+
+class AuditWriter:
+    """Writes audit entries according to the configured durability mode.
+
+    In "async" and "batched" mode an entry can be lost if the process dies
+    before it is written; shutdown flushes whatever is still pending. Until
+    `start()` has run (scripts, benchmarks), and whenever AUDIT_QUEUE_MAX_SIZE
+    entries are already waiting, entries are inserted inline instead.
+    """
+    MODES = ("sync", "async", "batched")
+
+    def __init__(self, mode: str, batch_size: int, flush_interval: float, max_pending: int):
+        if mode not in self.MODES:
+            raise ValueError(f"AUDIT_DURABILITY harus salah satu dari {', '.join(self.MODES)}: {mode}")
+        self.mode = mode
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: List[dict] = []
+        self._inflight = set()
+        self._started = False
+        self._task = None
+        self._wakeup = None
+        self._flush_lock = None
+
+    def start(self):
+        if self.mode == "sync" or self._started:
+            return
+        self._started = True
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        if self.mode == "batched":
+            self._task = asyncio.create_task(self._run())
+
+    async def write(self, log: dict):
+        if not self._started or len(self._pending) + len(self._inflight) >= self.max_pending:
+            await insert_audit_entries(audit_partition(log["timestamp"]), [log])
+        elif self.mode == "async":
+            task = asyncio.create_task(self._insert_one(log))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+        else:
+            self._pending.append(log)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+
+    async def _insert_one(self, log: dict):
+        try:
+            await insert_audit_entries(audit_partition(log["timestamp"]), [log])
+        except Exception as e:
+            logger.error(f"Audit log write failed ({log['action']} {log.get('entity_id')}): {e}")
+
+    async def flush(self):
+        """Write everything buffered so far and wait for in-flight inserts."""
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                try:
+                    for partition, logs in group_audit_partitions(batch).items():
+                        try:
+                            await insert_audit_entries(partition, logs)
+                        except BulkWriteError as e:
+                            # 11000 = entry already written by an earlier, interrupted flush
+                            lost = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+                            if lost:
+                                logger.error(f"Audit log batch dropped {len(lost)} entries: {lost[0].get('errmsg')}")
+                except asyncio.CancelledError:
+                    self._pending[:0] = batch
+                    raise
+                except Exception as e:
+                    # keep the batch for the next flush; write() goes inline once the buffer is full
+                    self._pending[:0] = batch
+                    logger.error(f"Audit log flush failed, {len(self._pending)} entries pending: {e}")
+                    break
+        if self._inflight:
+            await asyncio.gather(*list(self._inflight), return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def stop(self):
+        """Best-effort flush on shutdown, bounded by AUDIT_SHUTDOWN_FLUSH_SECONDS."""
+        if not self._started:
+            return
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await asyncio.wait_for(self.flush(), AUDIT_SHUTDOWN_FLUSH_SECONDS)
+        except Exception as e:
+            logger.error(f"Audit log shutdown flush failed: {e}")
+        if self._pending:
+            logger.error(f"{len(self._pending)} audit log entries were not written before shutdown")
+        self._started = False
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "pending": len(self._pending),
+            "in_flight": len(self._inflight),
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval
+        }
+
+audit_writer = AuditWriter(AUDIT_DURABILITY, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL_SECONDS, AUDIT_QUEUE_MAX_SIZE)
+
 async def create_audit_log(user_id: str, username: str, action: str, entity_type: str, 
                            entity_id: str = None, old_value: dict = None, new_value: dict = None):
     log = {
@@ -120,17 +427,171 @@ async def create_audit_log(user_id: str, username: str, action: str, entity_type
         "action": action,
         "entity_type": entity_type,
         "entity_id": entity_id,
-        "old_value": old_value,
-        "new_value": new_value,
+        "changes": audit_changes(old_value, new_value),
         "timestamp": now_isoformat()
     }
-    await db.audit_logs.insert_one(log)
+    await audit_writer.write(log)
+
+async def attach_personel_fields(items: list, fields: tuple = ("nama_lengkap", "pangkat")) -> list:
+    """Decorate records that carry an `nrp` with personel fields.
+
+    Fetches all referenced personel in a single `$in` query and joins in memory,
+    instead of one find_one per record.
+    """
+    nrps = list({item.get("nrp") for item in items if item.get("nrp")})
+    if not nrps:
+        return items
+    
+    projection = {"_id": 0, "nrp": 1}
+    projection.update({field: 1 for field in fields})
+    personel_map = {}
+    async for personel in db.personel.find({"nrp": {"$in": nrps}}, projection):
+        personel_map[personel["nrp"]] = personel
+    
+    for item in items:
+        personel = personel_map.get(item.get("nrp"))
+        if personel:
+            for field in fields:
+                item[field] = personel.get(field)
+    return items
+
+# ================== PAGINATION ==================
+# List endpoints page either with skip/limit or with an opaque cursor holding the
+# sort key of the last row (keyset pagination), which costs the same for every page.
+# Totals are optional: "exact" counts, "estimated" uses collection metadata when there
+# is no filter and a short-lived cached count otherwise, "none" skips counting.
+COUNT_CACHE_TTL_SECONDS = float(os.environ.get('COUNT_CACHE_TTL_SECONDS', 30))
+TOTAL_MODES = ("exact", "estimated", "none")
+
+count_cache = TTLCache(max_size=256, ttl_seconds=COUNT_CACHE_TTL_SECONDS)
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(token: str, size: int) -> list:
+    """Sort key values from a cursor token; 400 if it is not one of ours"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Cursor tidak valid")
+    return values
+
+def keyset_filter(sort: List[tuple], values: list) -> dict:
+    """Filter for rows strictly after ``values`` in ``sort`` order (a compound-key comparison)"""
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        value = values[i]
+        if value is None:
+            # null sorts first: everything non-null is after it, nothing is before it
+            after = {field: {"$ne": None}} if direction == 1 else None
+        else:
+            after = {field: {"$gt" if direction == 1 else "$lt": value}}
+        if after is not None:
+            clauses.append({**{f: values[j] for j, (f, _) in enumerate(sort[:i])}, **after})
+    return {"$or": clauses} if clauses else {"_id": {"$exists": False}}
+
+async def paginate_keyset(collection, query: dict, sort: List[tuple], projection: dict,
+                          cursor: Optional[str], limit: int, skip: int = 0) -> tuple:
+    """(rows, next cursor or None) for one keyset page; ``projection`` must keep the sort fields"""
+    if cursor:
+        after = keyset_filter(sort, decode_cursor(cursor, len(sort)))
+        query = {"$and": [query, after]} if query else after
+    rows = await collection.find(query, projection).sort(sort).skip(skip).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].get(field) for field, _ in sort])
+    return rows, next_cursor
+
+async def count_total(collection, query: dict, mode: str) -> Optional[int]:
+    """Total for a list response according to ``mode`` (see TOTAL_MODES)"""
+    if mode == "none":
+        return None
+    if mode == "exact":
+        return await collection.count_documents(query)
+    if not query:
+        return await collection.estimated_document_count()
+    key = (collection.name, json.dumps(query, sort_keys=True, default=str))
+    total = count_cache.get(key)
+    if total is None:
+        total = await collection.count_documents(query)
+        count_cache.set(key, total)
+    return total
+
+# ================== CONDITIONAL GET ==================
+# Read endpoints send an ETag (and Last-Modified where a reliable change time
+# exists) and answer 304 when the client's copy is current. Reference data is
+# validated against a per-collection version counter, so a 304 costs one tiny
+# lookup; other reads tag a hash of the serialized body, which saves the
+# transfer. Cache-Control is set per route: "no-cache" lets browsers keep a
+# copy but revalidate it on every use.
+CACHE_CONTROL_REFERENCE = os.environ.get('CACHE_CONTROL_REFERENCE', 'private, no-cache')
+CACHE_CONTROL_PERSONEL = os.environ.get('CACHE_CONTROL_PERSONEL', 'private, no-cache')
+
+def render_json(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+def json_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check with weak comparison (RFC 9110 13.1.2)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """If-None-Match wins; If-Modified-Since is only consulted without it"""
+    if "if-none-match" in request.headers:
+        return etag_matches(request, etag)
+    since = request.headers.get("if-modified-since")
+    if not since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(since)
+    except (TypeError, ValueError):
+        return False
+    return since.tzinfo is not None and last_modified.replace(microsecond=0) <= since
+
+def validator_headers(etag: str, cache_control: str, last_modified: Optional[datetime] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Authorization"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+def etag_json_response(request: Request, payload, cache_control: str) -> Response:
+    """Serialize once, tag the body, and answer 304 when the client already has it"""
+    body = render_json(payload)
+    headers = validator_headers(json_etag(body), cache_control)
+    if is_not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def get_collection_version(collection: str) -> dict:
+    version = await db.collection_versions.find_one({"name": collection}, {"_id": 0})
+    return version or {"name": collection, "version": 0, "updated_at": None}
+
+async def bump_collection_version(collection: str) -> dict:
+    """Advance a collection's change counter; call after every write to it"""
+    return await db.collection_versions.find_one_and_update(
+        {"name": collection},
+        {"$inc": {"version": 1}, "$set": {"updated_at": now_isoformat()}},
+        projection={"_id": 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
 
 # ================== AUTH ROUTES ==================
 @api_router.post("/auth/login")
 async def login(credentials: dict = Body(...)):
     user = await db.users.find_one({"username": credentials["username"]}, {"_id": 0})
-    if not user or not verify_password(credentials["password"], user["password"]):
+    if not user or not await verify_password(credentials["password"], user["password"]):
         raise HTTPException(status_code=401, detail="Username atau password salah")
     if not user.get("is_active", True):
         raise HTTPException(status_code=401, detail="Akun tidak aktif")
@@ -165,14 +626,81 @@ REFERENCE_COLLECTIONS = {
     "hubungan_keluarga": "ref_hubungan_keluarga"
 }
 
+REFERENCE_CACHE_POLL_SECONDS = float(os.environ.get('REFERENCE_CACHE_POLL_SECONDS', 2))
+
+class ReferenceCache:
+    """Reference tables held in memory as ready-to-send JSON bodies.
+
+    Each entry is tagged with its collection's version from `collection_versions`.
+    Writes on this worker refresh the entry immediately; other workers pick up the
+    new version on their next poll (REFERENCE_CACHE_POLL_SECONDS).
+    """
+    def __init__(self):
+        self._entries = {}
+        self.hits = 0
+        self.reloads = 0
+
+    async def _load(self, collection: str, version: dict) -> dict:
+        # the version is read before the data: a racing write leaves the tag older, never newer
+        data = await db[collection].find({}, {"_id": 0}).sort("urutan", 1).to_list(1000)
+        entry = {
+            "version": version["version"],
+            "etag": f'"{collection}.{version["version"]}"',
+            "last_modified": datetime.fromisoformat(version["updated_at"]) if version.get("updated_at") else None,
+            "body": render_json(data),
+        }
+        self._entries[collection] = entry
+        self.reloads += 1
+        return entry
+
+    async def get(self, collection: str) -> dict:
+        entry = self._entries.get(collection)
+        if entry is None:
+            return await self._load(collection, await get_collection_version(collection))
+        self.hits += 1
+        return entry
+
+    async def refresh(self, collection: str, version: dict = None):
+        await self._load(collection, version or await get_collection_version(collection))
+
+    async def sync(self):
+        """Reload every table whose version in Mongo differs from the cached one"""
+        names = list(REFERENCE_COLLECTIONS.values())
+        versions = {doc["name"]: doc for doc in
+                    await db.collection_versions.find({"name": {"$in": names}}, {"_id": 0}).to_list(None)}
+        for collection in names:
+            version = versions.get(collection) or {"name": collection, "version": 0, "updated_at": None}
+            entry = self._entries.get(collection)
+            if entry is None or entry["version"] != version["version"]:
+                await self._load(collection, version)
+
+    def stats(self) -> dict:
+        return {
+            "versions": {name: entry["version"] for name, entry in self._entries.items()},
+            "hits": self.hits,
+            "reloads": self.reloads
+        }
+
+reference_cache = ReferenceCache()
+
+async def reference_cache_loop():
+    while True:
+        try:
+            await reference_cache.sync()
+        except Exception as e:
+            logger.error(f"Reference cache sync failed: {e}")
+        await asyncio.sleep(REFERENCE_CACHE_POLL_SECONDS)
+
 @api_router.get("/reference/{ref_type}")
-async def get_reference_data(ref_type: str, user: dict = Depends(get_current_user)):
+async def get_reference_data(ref_type: str, request: Request, user: dict = Depends(get_current_user)):
     if ref_type not in REFERENCE_COLLECTIONS:
         raise HTTPException(status_code=404, detail="Tipe referensi tidak ditemukan")
     
-    collection = REFERENCE_COLLECTIONS[ref_type]
-    data = await db[collection].find({}, {"_id": 0}).sort("urutan", 1).to_list(1000)
-    return data
+    entry = await reference_cache.get(REFERENCE_COLLECTIONS[ref_type])
+    headers = validator_headers(entry["etag"], CACHE_CONTROL_REFERENCE, entry["last_modified"])
+    if is_not_modified(request, entry["etag"], entry["last_modified"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
 
 @api_router.post("/reference/{ref_type}")
 async def create_reference_data(ref_type: str, data: dict = Body(...), user: dict = Depends(require_roles(UserRole.ADMIN))):
@@ -184,6 +712,7 @@ async def create_reference_data(ref_type: str, data: dict = Body(...), user: dic
     data["created_at"] = now_isoformat()
     
     await db[collection].insert_one(data)
+    await reference_cache.refresh(collection, await bump_collection_version(collection))
     await create_audit_log(user["id"], user["username"], f"CREATE_REF_{ref_type.upper()}", collection, data["id"])
     
     return {"message": "Data berhasil ditambahkan", "id": data["id"]}
@@ -201,6 +730,7 @@ async def update_reference_data(ref_type: str, item_id: str, data: dict = Body(.
     result = await db[collection].update_one({"id": item_id}, {"$set": data})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Data tidak ditemukan")
+    await reference_cache.refresh(collection, await bump_collection_version(collection))
     
     await create_audit_log(user["id"], user["username"], f"UPDATE_REF_{ref_type.upper()}", collection, item_id)
     return {"message": "Data berhasil diupdate"}
@@ -214,11 +744,270 @@ async def delete_reference_data(ref_type: str, item_id: str, user: dict = Depend
     result = await db[collection].delete_one({"id": item_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Data tidak ditemukan")
+    await reference_cache.refresh(collection, await bump_collection_version(collection))
     
     await create_audit_log(user["id"], user["username"], f"DELETE_REF_{ref_type.upper()}", collection, item_id)
     return {"message": "Data berhasil dihapus"}
 
+# ================== STATISTICS SNAPSHOT ==================
+# Personel counters are materialized in `stats_snapshot`, one document per
+# (dimension, value), e.g. {"dimension": "pangkat_aktif", "value": "KAPTEN", "count": 12}.
+# Write paths apply +1/-1 deltas; a periodic reconciliation rebuilds everything
+# from the personel collection and fixes any drift.
+PERSONEL_STAT_FIELDS = ("kategori", "pangkat", "status_personel", "satuan_induk")
+PERSONEL_STATS_PROJECTION = {"_id": 0, **{field: 1 for field in PERSONEL_STAT_FIELDS}}
+STATS_RECONCILE_INTERVAL_SECONDS = int(os.environ.get('STATS_RECONCILE_INTERVAL_SECONDS', 3600))
+
+# Full recount in one round trip, used for reconciliation
+PERSONEL_COUNTERS_PIPELINE = [
+    {"$facet": {
+        "total": [{"$group": {"_id": "all", "count": {"$sum": 1}}}],
+        "status": [{"$group": {"_id": "$status_personel", "count": {"$sum": 1}}}],
+        "kategori": [{"$group": {"_id": "$kategori", "count": {"$sum": 1}}}],
+        "pangkat": [{"$group": {"_id": "$pangkat", "count": {"$sum": 1}}}],
+        "pangkat_aktif": [
+            {"$match": {"status_personel": "AKTIF"}},
+            {"$group": {"_id": "$pangkat", "count": {"$sum": 1}}}
+        ],
+        "satuan_aktif": [
+            {"$match": {"status_personel": "AKTIF"}},
+            {"$group": {"_id": "$satuan_induk", "count": {"$sum": 1}}}
+        ]
+    }}
+]
+
+def personel_stat_keys(personel: dict) -> list:
+    """Counters a single personel document contributes to"""
+    keys = [
+        ("total", "all"),
+        ("status", personel.get("status_personel")),
+        ("kategori", personel.get("kategori")),
+        ("pangkat", personel.get("pangkat")),
+    ]
+    if personel.get("status_personel") == "AKTIF":
+        keys.append(("pangkat_aktif", personel.get("pangkat")))
+        keys.append(("satuan_aktif", personel.get("satuan_induk")))
+    return keys
+
+async def apply_personel_stats_delta(old_docs: list, new_docs: list):
+    """Move counters from the old versions of personel documents to the new ones"""
+    delta = {}
+    for doc in old_docs:
+        for key in personel_stat_keys(doc):
+            delta[key] = delta.get(key, 0) - 1
+    for doc in new_docs:
+        for key in personel_stat_keys(doc):
+            delta[key] = delta.get(key, 0) + 1
+    
+    ops = [
+        UpdateOne({"dimension": dimension, "value": value}, {"$inc": {"count": change}}, upsert=True)
+        for (dimension, value), change in delta.items() if change
+    ]
+    if ops:
+        await db.stats_snapshot.bulk_write(ops, ordered=False)
+
+async def set_personel_fields(nrp: str, fields: dict):
+    """$set fields on a personel and keep stats_snapshot and the search fields in step"""
+    if "nama_lengkap" in fields:
+        fields = {**fields, **personel_search_fields(fields["nama_lengkap"])}
+    old = await db.personel.find_one_and_update({"nrp": nrp}, {"$set": fields}, projection=PERSONEL_STATS_PROJECTION)
+    if old is None:
+        return
+    if any(field in fields for field in PERSONEL_STAT_FIELDS):
+        new = {**old, **{field: fields[field] for field in PERSONEL_STAT_FIELDS if field in fields}}
+        await apply_personel_stats_delta([old], [new])
+
+async def reconcile_stats_snapshot() -> int:
+    """Recount every counter from the personel collection; returns how many were off.
+
+    Every write is conditional on the count read before the recount, so a delta
+    that lands between that read and the write makes the write a no-op. This is
+    not exact: a personel write that commits before the recount but applies its
+    delta after the conditional write is counted twice (or a removal twice)
+    until the next pass corrects it.
+    """
+    current = {}
+    async for doc in db.stats_snapshot.find({"dimension": {"$ne": "meta"}}, {"_id": 0}):
+        current[(doc["dimension"], doc.get("value"))] = doc.get("count", 0)
+    
+    result = await db.personel.aggregate(PERSONEL_COUNTERS_PIPELINE).to_list(1)
+    facets = result[0] if result else {}
+    expected = {
+        (dimension, item["_id"]): item["count"]
+        for dimension, items in facets.items()
+        for item in items
+    }
+    
+    ops = []
+    corrected = 0
+    for (dimension, value), count in expected.items():
+        key = (dimension, value)
+        if key not in current:
+            # Only create it if no delta has created it since
+            ops.append(UpdateOne({"dimension": dimension, "value": value}, {"$setOnInsert": {"count": count}}, upsert=True))
+            corrected += 1
+        elif current[key] != count:
+            ops.append(UpdateOne({"dimension": dimension, "value": value, "count": current[key]}, {"$set": {"count": count}}))
+            corrected += 1
+    for (dimension, value), count in current.items():
+        if (dimension, value) not in expected:
+            # Counters decremented to zero are only cleaned up, not drift
+            ops.append(DeleteOne({"dimension": dimension, "value": value, "count": count}))
+            if count != 0:
+                corrected += 1
+    if ops:
+        try:
+            outcome = (await db.stats_snapshot.bulk_write(ops, ordered=False)).bulk_api_result
+        except BulkWriteError as e:
+            # A delta may upsert the same new counter first (unique index)
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+            outcome = e.details
+        skipped = len(ops) - outcome["nModified"] - outcome["nUpserted"] - outcome["nRemoved"]
+        if skipped:
+            logger.info(f"Stats reconciliation: {skipped} counters changed concurrently, left for the next pass")
+    if corrected:
+        logger.warning(f"Stats snapshot drift: {corrected} counters corrected")
+    
+    await db.stats_snapshot.update_one(
+        {"dimension": "meta", "value": "reconcile"},
+        {"$set": {"reconciled_at": now_isoformat(), "corrected": corrected}},
+        upsert=True
+    )
+    return corrected
+
+async def stats_reconcile_loop():
+    while True:
+        try:
+            await reconcile_stats_snapshot()
+        except Exception as e:
+            logger.error(f"Stats reconciliation failed: {e}")
+        await asyncio.sleep(STATS_RECONCILE_INTERVAL_SECONDS)
+
+stats_bootstrap_lock = asyncio.Lock()
+
+async def read_stats_counters() -> dict:
+    """All counters as {dimension: {value: count}}, built on first use"""
+    docs = await db.stats_snapshot.find({}, {"_id": 0}).to_list(None)
+    if not any(doc["dimension"] == "meta" for doc in docs):
+        # Concurrent first requests wait for one build instead of each running it
+        async with stats_bootstrap_lock:
+            if not await db.stats_snapshot.find_one({"dimension": "meta", "value": "reconcile"}):
+                await reconcile_stats_snapshot()
+        docs = await db.stats_snapshot.find({}, {"_id": 0}).to_list(None)
+    
+    counters = {}
+    for doc in docs:
+        if doc["dimension"] != "meta" and doc.get("count", 0) > 0:
+            counters.setdefault(doc["dimension"], {})[doc.get("value")] = doc["count"]
+    return counters
+
+def top_counts(counts: dict, limit: int = None) -> dict:
+    items = sorted(((k, v) for k, v in counts.items() if k), key=lambda item: (-item[1], item[0]))
+    return dict(items[:limit] if limit else items)
+
+async def compute_personel_stats() -> dict:
+    counters = await read_stats_counters()
+    return {
+        "total": counters.get("total", {}).get("all", 0),
+        "aktif": counters.get("status", {}).get("AKTIF", 0),
+        "by_kategori": top_counts(counters.get("kategori", {})),
+        "by_pangkat": top_counts(counters.get("pangkat_aktif", {}), 15),
+        "by_satuan": top_counts(counters.get("satuan_aktif", {}), 10)
+    }
+
+@api_router.post("/admin/stats/reconcile")
+async def trigger_stats_reconcile(user: dict = Depends(require_roles(UserRole.ADMIN))):
+    corrected = await reconcile_stats_snapshot()
+    return {"message": "Statistik berhasil direkonsiliasi", "corrected": corrected}
+
+# ================== PERSONEL SEARCH ==================
+# Search runs on fields derived from nama_lengkap and kept up to date on every write:
+# `search_name` (lowercase, ASCII, single spaced) and `search_prefixes` (every prefix of
+# every word, multikey-indexed). A query matches when each of its words is a word prefix
+# of the name; an all-digit query is an anchored NRP prefix, and a single word with a digit
+# in it matches either way. NRPs only match from their start (index-served), not as
+# substrings. Documents written before SEARCH_FIELDS_VERSION are backfilled at startup.
+SEARCH_FIELDS_VERSION = 1
+SEARCH_PREFIX_MAX_LEN = 20
+SEARCH_BACKFILL_BATCH_SIZE = 1000
+SEARCH_FIELDS = ("search_name", "search_prefixes", "search_version")
+PERSONEL_PROJECTION = {"_id": 0, **{field: 0 for field in SEARCH_FIELDS}}
+
+def normalize_search_text(value) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    text = unicodedata.normalize("NFKD", str(value or "")).encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", text.lower()).split())
+
+def personel_search_fields(nama_lengkap) -> dict:
+    """The derived search fields for a personel with this name"""
+    search_name = normalize_search_text(nama_lengkap)
+    prefixes = {word[:i] for word in search_name.split() for i in range(1, min(len(word), SEARCH_PREFIX_MAX_LEN) + 1)}
+    return {"search_name": search_name, "search_prefixes": sorted(prefixes), "search_version": SEARCH_FIELDS_VERSION}
+
+def personel_search_query(search: str) -> tuple:
+    """(match filter, relevance expression) for a search box value"""
+    search = search.strip()
+    if search.isdigit():
+        score = {"$cond": [{"$eq": ["$nrp", search]}, 2, 1]}
+        return {"nrp": {"$regex": f"^{re.escape(search)}"}}, score
+    
+    normalized = normalize_search_text(search)
+    terms = sorted({term[:SEARCH_PREFIX_MAX_LEN] for term in normalized.split()}, key=len, reverse=True)
+    if not terms:
+        return {"search_prefixes": {"$in": []}}, {"$literal": 1}
+    score = {"$switch": {"branches": [
+        {"case": {"$eq": ["$search_name", normalized]}, "then": 3},
+        {"case": {"$regexMatch": {"input": "$search_name", "regex": f"^{re.escape(normalized)}"}}, "then": 2},
+    ], "default": 1}}
+    query = {"search_prefixes": {"$all": terms}}
+    if len(search.split()) == 1 and any(char.isdigit() for char in search):
+        # Could be an NRP with letters in it; both branches are indexed
+        query = {"$or": [query, {"nrp": {"$regex": f"^{re.escape(search)}"}}]}
+        score = {"$cond": [{"$eq": ["$nrp", search]}, 3, score]}
+    return query, score
+
+def satuan_filter(satuan: str) -> dict:
+    """Anchored, escaped prefix on satuan_induk, so the index serves it"""
+    return {"$regex": f"^{re.escape(satuan.strip())}"}
+
+async def search_personel(query: dict, score: dict, skip: int, limit: int) -> List[dict]:
+    """Page of matching personel, best match first (then by name)"""
+    ranked = await db.personel.aggregate([
+        {"$match": query},
+        {"$project": {"_id": 0, "nrp": 1, "nama_lengkap": 1, "score": score}},
+        {"$sort": {"score": -1, "nama_lengkap": 1, "nrp": 1}},
+        {"$skip": skip},
+        {"$limit": limit},
+    ], allowDiskUse=True).to_list(limit)
+    
+    nrps = [doc["nrp"] for doc in ranked]
+    docs = {doc["nrp"]: doc async for doc in db.personel.find({"nrp": {"$in": nrps}}, PERSONEL_PROJECTION)}
+    return [docs[nrp] for nrp in nrps if nrp in docs]
+
+async def backfill_personel_search_fields() -> int:
+    """Compute search fields for personel written before SEARCH_FIELDS_VERSION"""
+    updated = 0
+    ops = []
+    cursor = db.personel.find(
+        {"search_version": {"$ne": SEARCH_FIELDS_VERSION}}, {"_id": 0, "nrp": 1, "nama_lengkap": 1}
+    ).batch_size(SEARCH_BACKFILL_BATCH_SIZE)
+    async for doc in cursor:
+        # Only if the name is unchanged; a concurrent rename sets its own search fields
+        ops.append(UpdateOne({"nrp": doc["nrp"], "nama_lengkap": doc.get("nama_lengkap")},
+                             {"$set": personel_search_fields(doc.get("nama_lengkap"))}))
+        if len(ops) >= SEARCH_BACKFILL_BATCH_SIZE:
+            updated += (await db.personel.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        updated += (await db.personel.bulk_write(ops, ordered=False)).modified_count
+    if updated:
+        logger.info(f"Search fields backfilled for {updated} personel")
+    return updated
+
 # ================== PERSONEL ROUTES ==================
+PERSONEL_LIST_SORT = [("kategori", 1), ("pangkat", 1), ("nrp", 1)]
+
 @api_router.get("/personel")
 async def get_all_personel(
     search: Optional[str] = None,
@@ -228,6 +1017,8 @@ async def get_all_personel(
     status: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="next_cursor dari halaman sebelumnya"),
+    total_mode: Literal["exact", "estimated", "none"] = Query("exact", alias="total"),
     user: dict = Depends(get_current_user)
 ):
     query = {}
@@ -237,68 +1028,53 @@ async def get_all_personel(
         query["nrp"] = user.get("nrp")
     
     if search:
-        query["$or"] = [
-            {"nama_lengkap": {"$regex": search, "$options": "i"}},
-            {"nrp": {"$regex": search, "$options": "i"}}
-        ]
+        search_query, score = personel_search_query(search)
+        query = {"$and": [query, search_query]} if query else search_query
     if kategori:
         query["kategori"] = kategori
     if pangkat:
         query["pangkat"] = pangkat
     if satuan:
-        query["satuan_induk"] = {"$regex": satuan, "$options": "i"}
+        query["satuan_induk"] = satuan_filter(satuan)
     if status:
         query["status_personel"] = status
     
-    personel = await db.personel.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
-    total = await db.personel.count_documents(query)
+    if search:
+        if cursor:
+            raise HTTPException(status_code=400, detail="Cursor tidak didukung untuk pencarian, gunakan skip")
+        personel, next_cursor = await search_personel(query, score, skip, limit), None
+    else:
+        personel, next_cursor = await paginate_keyset(db.personel, query, PERSONEL_LIST_SORT, PERSONEL_PROJECTION, cursor, limit, skip)
+    total = await count_total(db.personel, query, total_mode)
     
-    return {"data": personel, "total": total}
+    return {"data": personel, "total": total, "next_cursor": next_cursor}
 
 @api_router.get("/personel/stats")
 async def get_personel_stats(user: dict = Depends(get_current_user)):
-    total = await db.personel.count_documents({})
-    aktif = await db.personel.count_documents({"status_personel": "AKTIF"})
-    
-    by_kategori = await db.personel.aggregate([
-        {"$group": {"_id": "$kategori", "count": {"$sum": 1}}}
-    ]).to_list(10)
-    
-    by_pangkat = await db.personel.aggregate([
-        {"$match": {"status_personel": "AKTIF"}},
-        {"$group": {"_id": "$pangkat", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 15}
-    ]).to_list(15)
-    
-    by_satuan = await db.personel.aggregate([
-        {"$match": {"status_personel": "AKTIF"}},
-        {"$group": {"_id": "$satuan_induk", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 10}
-    ]).to_list(10)
-    
-    pending_pengajuan = await db.pengajuan.count_documents({"status": "pending"})
+    stats, pending_pengajuan = await asyncio.gather(
+        compute_personel_stats(),
+        db.pengajuan.count_documents({"status": "pending"})
+    )
     
     return {
-        "total": total,
-        "aktif": aktif,
+        "total": stats["total"],
+        "aktif": stats["aktif"],
         "pending_pengajuan": pending_pengajuan,
-        "by_kategori": {item["_id"]: item["count"] for item in by_kategori if item["_id"]},
-        "by_pangkat": {item["_id"]: item["count"] for item in by_pangkat if item["_id"]},
-        "by_satuan": {item["_id"]: item["count"] for item in by_satuan if item["_id"]}
+        "by_kategori": stats["by_kategori"],
+        "by_pangkat": stats["by_pangkat"],
+        "by_satuan": stats["by_satuan"]
     }
 
 @api_router.get("/personel/{nrp}")
-async def get_personel_by_nrp(nrp: str, user: dict = Depends(get_current_user)):
+async def get_personel_by_nrp(nrp: str, request: Request, user: dict = Depends(get_current_user)):
     # Personnel can only see their own data
     if user["role"] == UserRole.PERSONNEL.value and user.get("nrp") != nrp:
         raise HTTPException(status_code=403, detail="Akses ditolak")
     
-    personel = await db.personel.find_one({"nrp": nrp}, {"_id": 0})
+    personel = await db.personel.find_one({"nrp": nrp}, PERSONEL_PROJECTION)
     if not personel:
         raise HTTPException(status_code=404, detail="Personel tidak ditemukan")
-    return personel
+    return etag_json_response(request, personel, CACHE_CONTROL_PERSONEL)
 
 @api_router.post("/personel")
 async def create_personel(data: dict = Body(...), user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
@@ -310,14 +1086,15 @@ async def create_personel(data: dict = Body(...), user: dict = Depends(require_r
     data["created_at"] = now_isoformat()
     data["created_by"] = user["id"]
     
-    await db.personel.insert_one(data)
+    await db.personel.insert_one({**data, **personel_search_fields(data.get("nama_lengkap"))})
+    await apply_personel_stats_delta([], [data])
     await create_audit_log(user["id"], user["username"], "CREATE_PERSONEL", "personel", data["nrp"], new_value=data)
     
     return {"message": "Personel berhasil ditambahkan", "nrp": data["nrp"]}
 
 @api_router.put("/personel/{nrp}")
 async def update_personel(nrp: str, data: dict = Body(...), user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
-    existing = await db.personel.find_one({"nrp": nrp}, {"_id": 0})
+    existing = await db.personel.find_one({"nrp": nrp}, PERSONEL_PROJECTION)
     if not existing:
         raise HTTPException(status_code=404, detail="Personel tidak ditemukan")
     
@@ -326,16 +1103,16 @@ async def update_personel(nrp: str, data: dict = Body(...), user: dict = Depends
     data["updated_at"] = now_isoformat()
     data["updated_by"] = user["id"]
     
-    await db.personel.update_one({"nrp": nrp}, {"$set": data})
+    await set_personel_fields(nrp, data)
     await create_audit_log(user["id"], user["username"], "UPDATE_PERSONEL", "personel", nrp, existing, data)
     
     return {"message": "Personel berhasil diupdate"}
 
 # ================== RIWAYAT JABATAN ROUTES ==================
 @api_router.get("/personel/{nrp}/riwayat-jabatan")
-async def get_riwayat_jabatan(nrp: str, user: dict = Depends(get_current_user)):
+async def get_riwayat_jabatan(nrp: str, request: Request, user: dict = Depends(get_current_user)):
     data = await db.riwayat_jabatan.find({"nrp": nrp}, {"_id": 0}).sort("tmt_jabatan", -1).to_list(100)
-    return data
+    return etag_json_response(request, data, CACHE_CONTROL_PERSONEL)
 
 @api_router.post("/personel/{nrp}/riwayat-jabatan")
 async def create_riwayat_jabatan(nrp: str, data: dict = Body(...), user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
@@ -351,19 +1128,19 @@ async def create_riwayat_jabatan(nrp: str, data: dict = Body(...), user: dict =
     
     # Update current jabatan if this is the latest
     if data.get("status_jabatan") == "AKTIF":
-        await db.personel.update_one({"nrp": nrp}, {"$set": {
+        await set_personel_fields(nrp, {
             "jabatan_sekarang": data.get("jabatan"),
             "satuan_induk": data.get("satuan")
-        }})
+        })
     
     await create_audit_log(user["id"], user["username"], "CREATE_RIWAYAT_JABATAN", "riwayat_jabatan", data["id"])
     return {"message": "Riwayat jabatan berhasil ditambahkan", "id": data["id"]}
 
 # ================== RIWAYAT PANGKAT ROUTES ==================
 @api_router.get("/personel/{nrp}/riwayat-pangkat")
-async def get_riwayat_pangkat(nrp: str, user: dict = Depends(get_current_user)):
+async def get_riwayat_pangkat(nrp: str, request: Request, user: dict = Depends(get_current_user)):
     data = await db.riwayat_pangkat.find({"nrp": nrp}, {"_id": 0}).sort("tmt_pangkat", -1).to_list(100)
-    return data
+    return etag_json_response(request, data, CACHE_CONTROL_PERSONEL)
 
 @api_router.post("/personel/{nrp}/riwayat-pangkat")
 async def create_riwayat_pangkat(nrp: str, data: dict = Body(...), user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
@@ -378,22 +1155,22 @@ async def create_riwayat_pangkat(nrp: str, data: dict = Body(...), user: dict =
     await db.riwayat_pangkat.insert_one(data)
     
     # Update current pangkat
-    await db.personel.update_one({"nrp": nrp}, {"$set": {
+    await set_personel_fields(nrp, {
         "pangkat": data.get("pangkat"),
         "tmt_pangkat": data.get("tmt_pangkat")
-    }})
+    })
     
     await create_audit_log(user["id"], user["username"], "CREATE_RIWAYAT_PANGKAT", "riwayat_pangkat", data["id"])
     return {"message": "Riwayat pangkat berhasil ditambahkan", "id": data["id"]}
 
 # ================== DIKBANG ROUTES ==================
 @api_router.get("/personel/{nrp}/dikbang")
-async def get_dikbang(nrp: str, jenis: Optional[str] = None, user: dict = Depends(get_current_user)):
+async def get_dikbang(nrp: str, request: Request, jenis: Optional[str] = None, user: dict = Depends(get_current_user)):
     query = {"nrp": nrp}
     if jenis:
         query["jenis_diklat"] = jenis
     data = await db.dikbang.find(query, {"_id": 0}).sort("tahun", -1).to_list(100)
-    return data
+    return etag_json_response(request, data, CACHE_CONTROL_PERSONEL)
 
 @api_router.post("/personel/{nrp}/dikbang")
 async def create_dikbang(nrp: str, data: dict = Body(...), user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
@@ -433,9 +1210,9 @@ async def delete_dikbang(dikbang_id: str, user: dict = Depends(require_roles(Use
 
 # ================== PRESTASI ROUTES ==================
 @api_router.get("/personel/{nrp}/prestasi")
-async def get_prestasi(nrp: str, user: dict = Depends(get_current_user)):
+async def get_prestasi(nrp: str, request: Request, user: dict = Depends(get_current_user)):
     data = await db.prestasi.find({"nrp": nrp}, {"_id": 0}).sort("tahun", -1).to_list(100)
-    return data
+    return etag_json_response(request, data, CACHE_CONTROL_PERSONEL)
 
 @api_router.post("/personel/{nrp}/prestasi")
 async def create_prestasi(nrp: str, data: dict = Body(...), user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
@@ -453,9 +1230,9 @@ async def create_prestasi(nrp: str, data: dict = Body(...), user: dict = Depends
 
 # ================== TANDA JASA ROUTES ==================
 @api_router.get("/personel/{nrp}/tanda-jasa")
-async def get_tanda_jasa(nrp: str, user: dict = Depends(get_current_user)):
+async def get_tanda_jasa(nrp: str, request: Request, user: dict = Depends(get_current_user)):
     data = await db.tanda_jasa.find({"nrp": nrp}, {"_id": 0}).sort("tahun", -1).to_list(100)
-    return data
+    return etag_json_response(request, data, CACHE_CONTROL_PERSONEL)
 
 @api_router.post("/personel/{nrp}/tanda-jasa")
 async def create_tanda_jasa(nrp: str, data: dict = Body(...), user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
@@ -473,9 +1250,9 @@ async def create_tanda_jasa(nrp: str, data: dict = Body(...), user: dict = Depen
 
 # ================== KELUARGA ROUTES ==================
 @api_router.get("/personel/{nrp}/keluarga")
-async def get_keluarga(nrp: str, user: dict = Depends(get_current_user)):
+async def get_keluarga(nrp: str, request: Request, user: dict = Depends(get_current_user)):
     data = await db.keluarga.find({"nrp": nrp}, {"_id": 0}).to_list(100)
-    return data
+    return etag_json_response(request, data, CACHE_CONTROL_PERSONEL)
 
 @api_router.post("/personel/{nrp}/keluarga")
 async def create_keluarga(nrp: str, data: dict = Body(...), user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
@@ -493,9 +1270,9 @@ async def create_keluarga(nrp: str, data: dict = Body(...), user: dict = Depends
 
 # ================== KESEJAHTERAAN ROUTES ==================
 @api_router.get("/personel/{nrp}/kesejahteraan")
-async def get_kesejahteraan(nrp: str, user: dict = Depends(get_current_user)):
+async def get_kesejahteraan(nrp: str, request: Request, user: dict = Depends(get_current_user)):
     data = await db.kesejahteraan.find_one({"nrp": nrp}, {"_id": 0})
-    return data or {}
+    return etag_json_response(request, data or {}, CACHE_CONTROL_PERSONEL)
 
 @api_router.post("/personel/{nrp}/kesejahteraan")
 async def upsert_kesejahteraan(nrp: str, data: dict = Body(...), user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
@@ -519,9 +1296,9 @@ async def upsert_kesejahteraan(nrp: str, data: dict = Body(...), user: dict = De
 
 # ================== KESJAS (KESEHATAN JASMANI) ROUTES ==================
 @api_router.get("/personel/{nrp}/kesjas")
-async def get_kesjas(nrp: str, user: dict = Depends(get_current_user)):
+async def get_kesjas(nrp: str, request: Request, user: dict = Depends(get_current_user)):
     data = await db.kesjas.find({"nrp": nrp}, {"_id": 0}).sort("tanggal_tes", -1).to_list(100)
-    return data
+    return etag_json_response(request, data, CACHE_CONTROL_PERSONEL)
 
 @api_router.post("/personel/{nrp}/kesjas")
 async def create_kesjas(nrp: str, data: dict = Body(...), user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
@@ -539,9 +1316,9 @@ async def create_kesjas(nrp: str, data: dict = Body(...), user: dict = Depends(r
 
 # ================== HUKUMAN DISIPLIN ROUTES ==================
 @api_router.get("/personel/{nrp}/hukuman")
-async def get_hukuman(nrp: str, user: dict = Depends(get_current_user)):
+async def get_hukuman(nrp: str, request: Request, user: dict = Depends(get_current_user)):
     data = await db.hukuman.find({"nrp": nrp}, {"_id": 0}).sort("tmt_mulai", -1).to_list(100)
-    return data
+    return etag_json_response(request, data, CACHE_CONTROL_PERSONEL)
 
 @api_router.post("/personel/{nrp}/hukuman")
 async def create_hukuman(nrp: str, data: dict = Body(...), user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
@@ -559,9 +1336,9 @@ async def create_hukuman(nrp: str, data: dict = Body(...), user: dict = Depends(
 
 # ================== ABSENSI CUTI ROUTES ==================
 @api_router.get("/personel/{nrp}/cuti")
-async def get_cuti(nrp: str, user: dict = Depends(get_current_user)):
+async def get_cuti(nrp: str, request: Request, user: dict = Depends(get_current_user)):
     data = await db.absensi_cuti.find({"nrp": nrp}, {"_id": 0}).sort("tanggal_mulai", -1).to_list(100)
-    return data
+    return etag_json_response(request, data, CACHE_CONTROL_PERSONEL)
 
 @api_router.post("/personel/{nrp}/cuti")
 async def create_cuti(nrp: str, data: dict = Body(...), user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
@@ -578,6 +1355,63 @@ async def create_cuti(nrp: str, data: dict = Body(...), user: dict = Depends(req
     await create_audit_log(user["id"], user["username"], "CREATE_CUTI", "absensi_cuti", data["id"])
     return {"message": "Pengajuan cuti berhasil ditambahkan", "id": data["id"]}
 
+# ================== PERSONEL PROFILE ==================
+# Everything the detail page shows, in one round trip. Each section runs the
+# same query as its own endpoint; all of them run concurrently.
+PROFILE_SECTIONS = {
+    "riwayat_jabatan": ("riwayat_jabatan", "tmt_jabatan"),
+    "riwayat_pangkat": ("riwayat_pangkat", "tmt_pangkat"),
+    "dikbang": ("dikbang", "tahun"),
+    "prestasi": ("prestasi", "tahun"),
+    "tanda_jasa": ("tanda_jasa", "tahun"),
+    "keluarga": ("keluarga", None),
+    "kesjas": ("kesjas", "tanggal_tes"),
+    "hukuman": ("hukuman", "tmt_mulai"),
+    "cuti": ("absensi_cuti", "tanggal_mulai"),
+    "documents": ("documents", "created_at"),
+}
+PROFILE_INCLUDE_ALL = ("personel", *PROFILE_SECTIONS, "kesejahteraan")
+
+async def fetch_profile_section(nrp: str, section: str):
+    if section == "personel":
+        return await db.personel.find_one({"nrp": nrp}, PERSONEL_PROJECTION)
+    if section == "kesejahteraan":
+        return await db.kesejahteraan.find_one({"nrp": nrp}, {"_id": 0}) or {}
+    collection, sort_field = PROFILE_SECTIONS[section]
+    cursor = db[collection].find({"nrp": nrp}, {"_id": 0})
+    if sort_field:
+        cursor = cursor.sort(sort_field, -1)
+    return await cursor.to_list(100)
+
+@api_router.get("/personel/{nrp}/profile")
+async def get_personel_profile(
+    nrp: str,
+    request: Request,
+    include: Optional[str] = Query(None, description="Bagian dipisah koma, mis. personel,riwayat_jabatan,documents (default: semua)"),
+    user: dict = Depends(get_current_user)
+):
+    """Personel biodata with all sub-collections, tagged with an ETag"""
+    if user["role"] == UserRole.PERSONNEL.value and user.get("nrp") != nrp:
+        raise HTTPException(status_code=403, detail="Akses ditolak")
+    
+    sections = PROFILE_INCLUDE_ALL
+    if include:
+        sections = list(dict.fromkeys(part.strip() for part in include.split(",") if part.strip()))
+        unknown = [section for section in sections if section not in PROFILE_INCLUDE_ALL]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Bagian profil tidak dikenal: {', '.join(unknown)}")
+    
+    # personel is always fetched so a missing NRP is a 404 regardless of include
+    results = await asyncio.gather(fetch_profile_section(nrp, "personel"),
+                                   *(fetch_profile_section(nrp, s) for s in sections if s != "personel"))
+    if not results[0]:
+        raise HTTPException(status_code=404, detail="Personel tidak ditemukan")
+    
+    profile = dict(zip([s for s in sections if s != "personel"], results[1:]))
+    if "personel" in sections:
+        profile = {"personel": results[0], **profile}
+    return etag_json_response(request, profile, CACHE_CONTROL_PERSONEL)
+
 # ================== PENGAJUAN (UNIFIED REQUEST) ROUTES ==================
 @api_router.get("/pengajuan")
 async def get_all_pengajuan(
@@ -594,11 +1428,7 @@ async def get_all_pengajuan(
     data = await db.pengajuan.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
     
     # Enrich with personel data
-    for item in data:
-        personel = await db.personel.find_one({"nrp": item.get("nrp")}, {"_id": 0, "nama_lengkap": 1, "pangkat": 1})
-        if personel:
-            item["nama_lengkap"] = personel.get("nama_lengkap")
-            item["pangkat"] = personel.get("pangkat")
+    await attach_personel_fields(data)
     
     return data
 
@@ -654,21 +1484,21 @@ async def verify_pengajuan(pengajuan_id: str, action: dict = Body(...), user: di
         
         if jenis == "mutasi":
             if existing.get("jabatan_baru"):
-                await db.personel.update_one({"nrp": nrp}, {"$set": {
+                await set_personel_fields(nrp, {
                     "jabatan_sekarang": existing["jabatan_baru"],
                     "satuan_induk": existing.get("satuan_baru", "")
-                }})
+                })
         elif jenis == "pensiun":
-            await db.personel.update_one({"nrp": nrp}, {"$set": {"status_personel": "PENSIUN"}})
+            await set_personel_fields(nrp, {"status_personel": "PENSIUN"})
         elif jenis == "kenaikan_pangkat":
             if existing.get("pangkat_baru"):
-                await db.personel.update_one({"nrp": nrp}, {"$set": {
+                await set_personel_fields(nrp, {
                     "pangkat": existing["pangkat_baru"],
                     "tmt_pangkat": existing.get("tmt_pangkat_baru", "")
-                }})
+                })
         elif jenis == "koreksi":
             if existing.get("field_name") and existing.get("nilai_baru"):
-                await db.personel.update_one({"nrp": nrp}, {"$set": {existing["field_name"]: existing["nilai_baru"]}})
+                await set_personel_fields(nrp, {existing["field_name"]: existing["nilai_baru"]})
     
     await create_audit_log(user["id"], user["username"], f"VERIFY_PENGAJUAN_{action['status'].upper()}", "pengajuan", pengajuan_id)
     return {"message": f"Pengajuan {action['status']}"}
@@ -686,7 +1516,7 @@ async def create_user(data: dict = Body(...), admin: dict = Depends(require_role
         raise HTTPException(status_code=400, detail="Username sudah digunakan")
     
     data["id"] = generate_id()
-    data["password"] = hash_password(data["password"])
+    data["password"] = await hash_password(data["password"])
     data["is_active"] = True
     data["created_at"] = now_isoformat()
     
@@ -707,6 +1537,7 @@ async def update_user(user_id: str, data: dict = Body(...), admin: dict = Depend
     data["updated_at"] = now_isoformat()
     
     await db.users.update_one({"id": user_id}, {"$set": data})
+    principal_cache.invalidate(user_id)
     await create_audit_log(admin["id"], admin["username"], "UPDATE_USER", "user", user_id)
     return {"message": "User berhasil diupdate"}
 
@@ -716,14 +1547,16 @@ async def reset_password(user_id: str, new_password: str = Query(...), admin: di
     if not existing:
         raise HTTPException(status_code=404, detail="User tidak ditemukan")
     
-    hashed = hash_password(new_password)
+    hashed = await hash_password(new_password)
     await db.users.update_one({"id": user_id}, {"$set": {"password": hashed}})
+    principal_cache.invalidate(user_id)
     await create_audit_log(admin["id"], admin["username"], "RESET_PASSWORD", "user", user_id)
     return {"message": "Password berhasil direset"}
 
 @api_router.delete("/users/{user_id}")
 async def deactivate_user(user_id: str, admin: dict = Depends(require_roles(UserRole.ADMIN))):
     await db.users.update_one({"id": user_id}, {"$set": {"is_active": False}})
+    principal_cache.invalidate(user_id)
     await create_audit_log(admin["id"], admin["username"], "DEACTIVATE_USER", "user", user_id)
     return {"message": "User berhasil dinonaktifkan"}
 
@@ -745,198 +1578,623 @@ async def change_password(data: dict = Body(...), user: dict = Depends(get_curre
         raise HTTPException(status_code=404, detail="User tidak ditemukan")
     
     # Verify current password
-    if not verify_password(current_password, user_data["password"]):
+    if not await verify_password(current_password, user_data["password"]):
         raise HTTPException(status_code=400, detail="Password saat ini salah")
     
     # Update password
-    hashed = hash_password(new_password)
+    hashed = await hash_password(new_password)
     await db.users.update_one({"id": user["id"]}, {"$set": {"password": hashed, "updated_at": now_isoformat()}})
+    principal_cache.invalidate(user["id"])
     await create_audit_log(user["id"], user["username"], "CHANGE_PASSWORD", "user", user["id"])
     
     return {"message": "Password berhasil diubah"}
 
 # ================== AUDIT LOG ROUTES ==================
+AUDIT_LOG_SORT = [("timestamp", -1), ("id", -1)]
+
+def _audit_sort_key(log: dict) -> tuple:
+    return (log.get("timestamp") or "", log.get("id") or "")
+
+async def find_audit_logs(query: dict, cursor: Optional[str], limit: int, skip: int = 0) -> tuple:
+    """(rows, next cursor or None) across all partitions, newest first.
+
+    Partitions hold disjoint months, so they are read newest first until the
+    page is full. The legacy `audit_logs` collection, while it still holds
+    entries, overlaps them and is merged in. Cursors match paginate_keyset.
+    """
+    newest = None
+    if cursor:
+        after = decode_cursor(cursor, len(AUDIT_LOG_SORT))
+        newest = audit_partition(str(after[0] or ""))
+        query = {"$and": [query, keyset_filter(AUDIT_LOG_SORT, after)]} if query else keyset_filter(AUDIT_LOG_SORT, after)
+    wanted = skip + limit + 1
+
+    partitions, has_legacy = await list_audit_collections()
+    rows = []
+    for partition in partitions:
+        if len(rows) >= wanted:
+            break
+        if newest and partition > newest:
+            continue
+        rows += await db[partition].find(query, {"_id": 0}).sort(AUDIT_LOG_SORT) \
+            .limit(wanted - len(rows)).to_list(wanted - len(rows))
+    if has_legacy:
+        legacy = await db[AUDIT_LEGACY_COLLECTION].find(query, {"_id": 0}).sort(AUDIT_LOG_SORT) \
+            .limit(wanted).to_list(wanted)
+        # an entry being moved out of the legacy collection can briefly exist twice
+        merged = []
+        for log in sorted(rows + legacy, key=_audit_sort_key, reverse=True):
+            if not merged or _audit_sort_key(merged[-1]) != _audit_sort_key(log):
+                merged.append(log)
+        rows = merged[:wanted]
+
+    rows = rows[skip:]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].get(field) for field, _ in AUDIT_LOG_SORT])
+    return rows, next_cursor
+
+async def count_audit_logs(query: dict, mode: str) -> Optional[int]:
+    if mode == "none":
+        return None
+    partitions, has_legacy = await list_audit_collections()
+    collections = partitions + ([AUDIT_LEGACY_COLLECTION] if has_legacy else [])
+    totals = await asyncio.gather(*(count_total(db[name], query, mode) for name in collections))
+    return sum(totals)
+
 @api_router.get("/audit-logs")
 async def get_audit_logs(
+    response: Response,
     entity_type: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Nilai header X-Next-Cursor dari halaman sebelumnya"),
+    total_mode: Literal["exact", "estimated", "none"] = Query("none", alias="total"),
     user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.LEADER))
 ):
+    """Newest first. The body stays a plain list; paging info goes in X-Next-Cursor / X-Total-Count"""
     query = {}
     if entity_type:
         query["entity_type"] = entity_type
     
-    logs = await db.audit_logs.find(query, {"_id": 0}).sort("timestamp", -1).skip(skip).limit(limit).to_list(limit)
+    # entries buffered by this worker become visible right away
+    await audit_writer.flush()
+    logs, next_cursor = await find_audit_logs(query, cursor, limit, skip)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    total = await count_audit_logs(query, total_mode)
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
     return logs
 
+# ================== AUDIT LOG RETENTION ==================
+# Partitions older than AUDIT_RETENTION_MONTHS full months are written to
+# AUDIT_ARCHIVE_DIR/audit_logs_YYYY_MM.jsonl.gz and dropped (0 keeps everything).
+# Entries still in the pre-partition `audit_logs` collection are moved into their
+# partitions, with diffs instead of snapshots, by the same background task.
+AUDIT_RETENTION_MONTHS = int(os.environ.get('AUDIT_RETENTION_MONTHS', 12))
+AUDIT_ARCHIVE_DIR = Path(os.environ.get('AUDIT_ARCHIVE_DIR', '/app/audit_archive'))
+AUDIT_RETENTION_INTERVAL_SECONDS = int(os.environ.get('AUDIT_RETENTION_INTERVAL_SECONDS', 6 * 3600))
+AUDIT_RETENTION_BATCH_SIZE = 1000
+# Every worker runs the retention task; a lease in `leases` lets one of them work at a time
+AUDIT_RETENTION_LEASE = "audit_retention"
+AUDIT_RETENTION_LEASE_SECONDS = 300
+PROCESS_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+class LeaseLost(Exception):
+    pass
+
+def audit_retention_cutoff(now: datetime) -> str:
+    """Oldest partition that is kept; partitions sorting before it are archived"""
+    month_index = now.year * 12 + now.month - 1 - AUDIT_RETENTION_MONTHS
+    return f"audit_logs_{month_index // 12:04d}_{month_index % 12 + 1:02d}"
+
+async def split_legacy_audit_logs() -> int:
+    """Move entries of the legacy collection into their monthly partitions.
+
+    Safe to interrupt: entries keep their _id, so a repeated batch only hits
+    duplicate keys before the originals are deleted.
+    """
+    legacy = db[AUDIT_LEGACY_COLLECTION]
+    moved = 0
+    while True:
+        batch = await legacy.find({}).sort("_id", 1).limit(AUDIT_RETENTION_BATCH_SIZE).to_list(AUDIT_RETENTION_BATCH_SIZE)
+        if not batch:
+            break
+        for log in batch:
+            if "changes" not in log:
+                log["changes"] = audit_changes(log.pop("old_value", None), log.pop("new_value", None))
+        for partition, logs in group_audit_partitions(batch).items():
+            try:
+                await insert_audit_entries(partition, logs)
+            except BulkWriteError as e:
+                if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                    raise
+        await legacy.delete_many({"_id": {"$in": [log["_id"] for log in batch]}})
+        moved += len(batch)
+    if moved:
+        await check_lease(AUDIT_RETENTION_LEASE)
+        await legacy.drop()
+        logger.info(f"Moved {moved} audit log entries into monthly partitions")
+    return moved
+
+def _write_archive_lines(handle, logs: List[dict]):
+    handle.writelines(json.dumps(log, ensure_ascii=False, default=str).encode("utf-8") + b"\n" for log in logs)
+
+async def archive_audit_partition(partition: str) -> Path:
+    """Write a partition to a gzip JSON-lines file (oldest entry first), then drop it"""
+    await asyncio.to_thread(AUDIT_ARCHIVE_DIR.mkdir, parents=True, exist_ok=True)
+    path = AUDIT_ARCHIVE_DIR / f"{partition}.jsonl.gz"
+    suffix = 1
+    while await asyncio.to_thread(path.exists):
+        # entries for an already archived month (e.g. moved late from the legacy collection)
+        path = AUDIT_ARCHIVE_DIR / f"{partition}.{suffix}.jsonl.gz"
+        suffix += 1
+    partial = path.with_name(f"{path.name}.{os.getpid()}.part")
+
+    handle = await asyncio.to_thread(gzip.open, partial, "wb")
+    count = 0
+    try:
+        batch = []
+        async for log in db[partition].find({}, {"_id": 0}).sort([("timestamp", 1), ("id", 1)]):
+            batch.append(log)
+            if len(batch) >= AUDIT_RETENTION_BATCH_SIZE:
+                await asyncio.to_thread(_write_archive_lines, handle, batch)
+                count += len(batch)
+                batch = []
+        await asyncio.to_thread(_write_archive_lines, handle, batch)
+        count += len(batch)
+        await asyncio.to_thread(handle.close)
+    except BaseException:
+        await asyncio.to_thread(handle.close)
+        await asyncio.to_thread(partial.unlink, missing_ok=True)
+        raise
+    try:
+        # another worker that took over the lease archives this month itself
+        await check_lease(AUDIT_RETENTION_LEASE)
+    except LeaseLost:
+        await asyncio.to_thread(partial.unlink, missing_ok=True)
+        raise
+    await asyncio.to_thread(os.replace, partial, path)
+    await db[partition].drop()
+    audit_partitions_ready.discard(partition)
+    logger.info(f"Archived {count} audit log entries of {partition} to {path}")
+    return path
+
+async def run_audit_retention(now: datetime = None) -> dict:
+    moved = await split_legacy_audit_logs()
+    archived = []
+    if AUDIT_RETENTION_MONTHS > 0:
+        cutoff = audit_retention_cutoff(now or datetime.now(timezone.utc))
+        partitions, _ = await list_audit_collections()
+        for partition in reversed(partitions):
+            if partition < cutoff:
+                archived.append(str(await archive_audit_partition(partition)))
+    return {"moved": moved, "archived": archived}
+
+async def acquire_lease(name: str, seconds: float) -> bool:
+    """Take or renew the named lease for this process; False while another process holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.leases.find_one_and_update(
+            {"name": name, "$or": [{"owner": PROCESS_ID}, {"expires_at": {"$lt": now.isoformat()}}]},
+            {"$set": {"owner": PROCESS_ID, "expires_at": (now + timedelta(seconds=seconds)).isoformat()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # the filter missed because the lease is held, so the upsert collided with it
+        return False
+    return True
+
+async def check_lease(name: str):
+    """Raise LeaseLost unless this process still holds an unexpired lease; call before destructive steps"""
+    lease = await db.leases.find_one(
+        {"name": name, "owner": PROCESS_ID, "expires_at": {"$gt": now_isoformat()}}, {"_id": 1}
+    )
+    if lease is None:
+        raise LeaseLost(name)
+
+async def release_lease(name: str):
+    await db.leases.delete_one({"name": name, "owner": PROCESS_ID})
+
+async def renew_lease(name: str, seconds: float):
+    """Keep the lease alive; returns once it could not be renewed"""
+    while True:
+        await asyncio.sleep(seconds / 3)
+        if not await acquire_lease(name, seconds):
+            logger.warning(f"Lost lease {name}")
+            return
+
+async def run_with_lease(name: str, seconds: float, work):
+    """Run ``work()`` while holding the lease; None if another process holds it.
+
+    The lease is renewed in the background. If a renewal fails, ``work`` is
+    cancelled and LeaseLost is raised, so two processes never keep going at once.
+    """
+    if not await acquire_lease(name, seconds):
+        return None
+    task = asyncio.create_task(work())
+    renewal = asyncio.create_task(renew_lease(name, seconds))
+    try:
+        await asyncio.wait({task, renewal}, return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            task.cancel()
+            await asyncio.wait({task})
+            raise LeaseLost(name)
+        return task.result()
+    finally:
+        task.cancel()
+        renewal.cancel()
+        await release_lease(name)
+
+async def audit_retention_loop():
+    while True:
+        try:
+            await run_with_lease(AUDIT_RETENTION_LEASE, AUDIT_RETENTION_LEASE_SECONDS, run_audit_retention)
+        except Exception as e:
+            logger.error(f"Audit log retention failed: {e}")
+        await asyncio.sleep(AUDIT_RETENTION_INTERVAL_SECONDS)
+
 # ================== DASHBOARD ROUTES ==================
 @api_router.get("/dashboard/stats")
 async def get_dashboard_stats(user: dict = Depends(get_current_user)):
-    stats = await get_personel_stats(user)
-    
-    recent_activities = await db.audit_logs.find({}, {"_id": 0}).sort("timestamp", -1).limit(10).to_list(10)
+    await audit_writer.flush()
+    stats, (recent_activities, _) = await asyncio.gather(
+        get_personel_stats(user),
+        find_audit_logs({}, None, 10)
+    )
     stats["recent_activities"] = recent_activities
     
     return stats
 
 # ================== IMPORT EXCEL ==================
-@api_router.post("/import/personel")
-async def import_personel_excel(file: UploadFile = File(...), user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="File harus berformat Excel")
+IMPORT_SYNC_MAX_BYTES = int(os.environ.get('IMPORT_SYNC_MAX_BYTES', 512 * 1024))
+
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+
+# pandas' default na_values: these strings are read as empty cells
+EXCEL_NA_STRINGS = frozenset({
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+})
+
+def _write_upload_chunk(out, chunk: bytes, digest):
+    out.write(chunk)
+    if digest is not None:
+        digest.update(chunk)
+
+async def spool_upload(file: UploadFile, path: Path, max_size: int = None, digest=None) -> int:
+    """Copy an upload to ``path`` in UPLOAD_CHUNK_SIZE pieces; returns the size.
+
+    File I/O, and hashing when a hashlib ``digest`` is given, runs in a worker
+    thread. Once more than ``max_size`` bytes have been read the copy stops, the
+    partial file is removed and a 400 is raised.
+    """
+    too_large = HTTPException(status_code=400, detail=f"Ukuran file maksimal {(max_size or 0) // (1024 * 1024)}MB")
+    if max_size is not None and file.size is not None and file.size > max_size:
+        raise too_large
+    size = 0
+    out = await asyncio.to_thread(open, path, "wb")
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                raise too_large
+            await asyncio.to_thread(_write_upload_chunk, out, chunk, digest)
+    except BaseException:
+        await asyncio.to_thread(out.close)
+        path.unlink(missing_ok=True)
+        raise
+    await asyncio.to_thread(out.close)
+    return size
+
+def excel_cell_value(cell):
+    """Cell value as pandas.read_excel (openpyxl engine) returns it, None for empty cells"""
+    value = cell.value
+    if value is None or cell.data_type == 'e':
+        return None
+    if cell.data_type == 'n':
+        return int(value) if int(value) == value else float(value)
+    if isinstance(value, str) and value in EXCEL_NA_STRINGS:
+        return None
+    return value
+
+def open_workbook_blocks(path: Path, block_rows: int):
+    """Open the first sheet of a workbook for reading in blocks of ``block_rows`` rows.
+
+    Returns ``(total_rows, blocks)`` where ``blocks`` yields DataFrames indexed
+    by sheet row, as ``pd.read_excel(header=None)`` would have numbered them.
+    .xlsx files are read with openpyxl in read-only mode: a first pass finds
+    the used width and height, the second converts rows one block at a time,
+    so memory does not grow with the sheet. Other formats are read whole.
+    """
+    if path.suffix.lower() != '.xlsx':
+        df = pd.read_excel(path, header=None)
+        return len(df), (df.iloc[start:start + block_rows] for start in range(0, len(df), block_rows))
+    
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    ws = wb.worksheets[0]
+    ws.reset_dimensions()
+    total_rows = width = 0
+    for idx, row in enumerate(ws.iter_rows(values_only=True)):
+        used = [i for i, value in enumerate(row) if value is not None and value != '']
+        if used:
+            total_rows = idx + 1
+            width = max(width, used[-1] + 1)
+    
+    def blocks():
+        try:
+            rows = []
+            for idx, row in enumerate(ws.iter_rows()):
+                if idx >= total_rows:
+                    break
+                values = [excel_cell_value(cell) for cell in row[:width]]
+                rows.append(values + [None] * (width - len(values)))
+                if len(rows) == block_rows:
+                    yield pd.DataFrame(rows, index=range(idx + 1 - len(rows), idx + 1), dtype=object)
+                    rows = []
+            if rows:
+                yield pd.DataFrame(rows, index=range(total_rows - len(rows), total_rows), dtype=object)
+        finally:
+            wb.close()
+    
+    return total_rows, blocks()
+
+def split_diklat_items(value: str) -> List[str]:
+    """Split a comma separated DIKBANG cell, dropping leading numbering ("1. SUSPA" -> "SUSPA")"""
+    items = []
+    for dik in value.split(','):
+        dik = dik.strip()
+        if dik and dik[0].isdigit() and '.' in dik:
+            dik = dik.split('.', 1)[-1].strip()
+        if dik:
+            items.append(dik)
+    return items
+
+IMPORT_SECTION_MARKERS = ("PERWIRA", "BINTARA", "TAMTAMA")
+IMPORT_SUBHEADER_MARKERS = ("URT", "BAG", "1 2 3 4 5")
+IMPORT_FIELDS = ("NAMA", "PANGKAT", "LAHIR", "JABATAN", "TMT", "DIKBANGUM", "DIKBANGSPES", "PRESTASI")
+
+class PersonelSheetParser:
+    """Vectorized parser for Data Personel sheets.
+
+    A sheet is a sequence of sections: a PERWIRA/BINTARA/TAMTAMA marker row,
+    a header row (containing NRP and NAMA) and data rows. Marker and header
+    rows are located with pandas string operations; the header is turned into
+    a field -> column positions map once, and every data block between two
+    such rows is extracted column-wise. ``feed`` keeps the current section
+    across calls, so consecutive row blocks of one sheet can be fed in turn.
+    """
+
+    def __init__(self):
+        self.kategori = None
+        self.nrp_column = None
+        self.field_columns = None
+
+    @staticmethod
+    def stringify(df: pd.DataFrame) -> pd.DataFrame:
+        """Cell text as the row parser saw it: str(value).strip(), '' for empty cells"""
+        cells = df.astype(object).where(df.notna(), '')
+        return cells.apply(lambda col: col.astype(str).str.strip())
+
+    def set_header(self, header: List[str]):
+        upper = [col.upper() for col in header]
+        self.nrp_column = next((i for i, col in enumerate(upper) if 'NRP' in col), None)
+        self.field_columns = {field: [i for i, col in enumerate(upper) if field in col] for field in IMPORT_FIELDS}
+
+    def feed(self, df: pd.DataFrame):
+        """Yield (row index, nrp, fields, kategori) for every personel row in ``df``"""
+        if df.empty:
+            return
+        cells = self.stringify(df)
+        cells.columns = range(cells.shape[1])
+        text = cells[0].str.cat(cells.iloc[:, 1:], sep=' ') if cells.shape[1] > 1 else cells[0]
+        text = text.str.upper()
+        
+        short = text.str.len() < 20
+        kategori = pd.Series(None, index=cells.index, dtype=object)
+        for marker in reversed(IMPORT_SECTION_MARKERS):
+            kategori = kategori.mask(short & text.str.contains(marker, regex=False), marker)
+        is_marker = kategori.notna()
+        is_header = ~is_marker & text.str.contains('NRP', regex=False) & text.str.contains('NAMA', regex=False)
+        is_subheader = pd.Series(False, index=cells.index)
+        for marker in IMPORT_SUBHEADER_MARKERS:
+            is_subheader |= text.str.contains(marker, regex=False)
+        
+        positions = np.flatnonzero((is_marker | is_header).to_numpy())
+        boundary_rows = set(positions.tolist())
+        bounds = sorted({0, *positions.tolist(), len(cells)})
+        for start, end in zip(bounds, bounds[1:]):
+            if start in boundary_rows:
+                idx = cells.index[start]
+                if is_marker.iat[start]:
+                    self.kategori = kategori.iat[start]
+                    self.field_columns = None
+                else:
+                    self.set_header(cells.loc[idx].tolist())
+                start += 1
+            if start >= end or self.kategori is None or self.field_columns is None or self.nrp_column is None:
+                continue
+            
+            block = cells.iloc[start:end]
+            block = block[~is_subheader.iloc[start:end].to_numpy()]
+            nrp = block[self.nrp_column]
+            block = block[(nrp.str.len() >= 5) & nrp.str.contains(r'\d', regex=True)]
+            if block.empty:
+                continue
+            
+            values = {field: self.first_filled(block, cols) for field, cols in self.field_columns.items()}
+            for row in zip(block.index, block[self.nrp_column], *values.values()):
+                yield row[0], row[1], dict(zip(values, row[2:])), self.kategori
+
+    @staticmethod
+    def first_filled(block: pd.DataFrame, columns: List[int]) -> List[str]:
+        """Per row, the first non-empty value among ``columns`` (header order), else ''"""
+        result = pd.Series('', index=block.index, dtype=object)
+        for col in reversed(columns):
+            values = block[col]
+            result = values.where((values != '') & (values.str.lower() != 'nan'), result)
+        return result.tolist()
+
+def build_import_documents(nrp: str, fields: Dict[str, str], kategori: str, user: dict) -> dict:
+    """Build the personel, dikbang and prestasi documents for one workbook row"""
+    created_at = now_isoformat()
+    personel = {
+        "id": generate_id(),
+        "nrp": nrp,
+        "nama_lengkap": fields['NAMA'],
+        "kategori": kategori,
+        "pangkat": fields['PANGKAT'],
+        "korps": "ARH",
+        "tempat_lahir": "",
+        "tanggal_lahir": fields['LAHIR'],
+        "jenis_kelamin": "L",
+        "agama": "ISLAM",
+        "status_personel": "AKTIF",
+        "tmt_masuk_dinas": "",
+        "satuan_induk": "",
+        "jabatan_sekarang": fields['JABATAN'],
+        "tmt_pangkat": fields['TMT'],
+        "created_at": created_at,
+        "created_by": user["id"]
+    }
+    personel.update(personel_search_fields(personel["nama_lengkap"]))
+    
+    dikbang = []
+    for jenis in ("DIKBANGUM", "DIKBANGSPES"):
+        for dik in split_diklat_items(fields[jenis]):
+            dikbang.append({
+                "id": generate_id(),
+                "nrp": nrp,
+                "jenis_diklat": jenis,
+                "nama_diklat": dik,
+                "tahun": "",
+                "hasil": "LULUS",
+                "created_at": created_at
+            })
+    
+    prestasi = []
+    nama_prestasi = fields['PRESTASI']
+    if nama_prestasi:
+        prestasi.append({
+            "id": generate_id(),
+            "nrp": nrp,
+            "nama_prestasi": nama_prestasi,
+            "tingkat": "",
+            "tahun": "",
+            "created_at": created_at
+        })
     
-    content = await file.read()
-    df_raw = pd.read_excel(io.BytesIO(content), header=None)
+    return {"personel": personel, "dikbang": dikbang, "prestasi": prestasi}
+
+async def insert_many_unordered(collection, docs: List[dict]) -> Dict[int, dict]:
+    """insert_many(ordered=False); returns the write errors keyed by document index"""
+    if not docs:
+        return {}
+    try:
+        await collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        return {err["index"]: err for err in e.details.get("writeErrors", [])}
+    return {}
+
+async def write_import_batch(pending: List[dict], seen_nrps: set) -> dict:
+    """Write one batch of parsed rows: one $in prefetch, then unordered insert_many per collection.
+
+    Repeated NRPs within the batch are left to the unique index: the first row
+    that inserts wins and later ones come back as duplicates. An NRP is only
+    remembered in ``seen_nrps`` once it is stored, so a row that failed for
+    another reason does not turn later rows with that NRP into skips.
+    """
+    result = {"imported": [], "skipped": 0, "errors": []}
+    
+    nrps = [item["nrp"] for item in pending]
+    existing = await db.personel.find({"nrp": {"$in": nrps}}, {"_id": 0, "nrp": 1}).to_list(len(nrps))
+    existing_nrps = {doc["nrp"] for doc in existing}
+    
+    batch = []
+    for item in pending:
+        if item["nrp"] in existing_nrps or item["nrp"] in seen_nrps:
+            result["skipped"] += 1
+            continue
+        batch.append(item)
+    
+    write_errors = await insert_many_unordered(db.personel, [item["personel"] for item in batch])
+    
+    inserted = []
+    for i, item in enumerate(batch):
+        err = write_errors.get(i)
+        if err is None:
+            inserted.append(item)
+            seen_nrps.add(item["nrp"])
+        elif err.get("code") == 11000:
+            # An earlier row of this batch, or another import since the prefetch
+            result["skipped"] += 1
+            seen_nrps.add(item["nrp"])
+        else:
+            result["errors"].append(f"Row {item['row']}: {err.get('errmsg', err)}")
+    
+    dikbang_docs = [doc for item in inserted for doc in item["dikbang"]]
+    prestasi_docs = [doc for item in inserted for doc in item["prestasi"]]
+    for collection, docs in ((db.dikbang, dikbang_docs), (db.prestasi, prestasi_docs)):
+        for err in (await insert_many_unordered(collection, docs)).values():
+            result["errors"].append(f"NRP {docs[err['index']]['nrp']}: {err.get('errmsg', err)}")
+    
+    result["imported"] = [item["personel"] for item in inserted]
+    return result
+
+async def import_personel_workbook(path: Path, user: dict, progress=None) -> dict:
+    """Import personel (with DIKBANG and prestasi) from a Data Personel workbook on disk.
+
+    The sheet is read in blocks of IMPORT_BATCH_SIZE rows (open_workbook_blocks)
+    and parsed with PersonelSheetParser; each batch of rows is turned into
+    documents and written with one ``$in`` query for NRPs that already exist
+    and one unordered insert_many per collection. Only the current block and
+    batch are held in memory.
+    """
+    total_rows, blocks = await asyncio.to_thread(open_workbook_blocks, path, IMPORT_BATCH_SIZE)
+    parser = PersonelSheetParser()
+    
+    def next_rows():
+        block = next(blocks, None)
+        return None if block is None else list(parser.feed(block))
     
     imported_count = 0
     skipped_count = 0
     errors = []
-    current_kategori = None
-    header_row = None
-    columns = []
+    seen_nrps = set()
+    pending = []
+    
+    async def flush():
+        nonlocal imported_count, skipped_count
+        result = await write_import_batch(pending, seen_nrps)
+        await apply_personel_stats_delta([], result["imported"])
+        imported_count += len(result["imported"])
+        skipped_count += result["skipped"]
+        errors.extend(result["errors"][:10 - len(errors)])
+        pending.clear()
     
-    for idx, row in df_raw.iterrows():
-        row_values = [str(v).strip() if pd.notna(v) else '' for v in row]
-        row_text = ' '.join(row_values).upper()
-        
-        # Detect category
-        if 'PERWIRA' in row_text and len(row_text) < 20:
-            current_kategori = 'PERWIRA'
-            header_row = None
-            continue
-        elif 'BINTARA' in row_text and len(row_text) < 20:
-            current_kategori = 'BINTARA'
-            header_row = None
-            continue
-        elif 'TAMTAMA' in row_text and len(row_text) < 20:
-            current_kategori = 'TAMTAMA'
-            header_row = None
-            continue
-        
-        # Detect header row
-        if 'NRP' in row_text and 'NAMA' in row_text:
-            header_row = idx
-            columns = row_values
-            continue
-        
-        if header_row is None or current_kategori is None:
-            continue
-        
-        # Skip sub-header rows
-        if any(x in row_text for x in ['URT', 'BAG', '1 2 3 4 5']):
-            continue
-        
-        # Get NRP
-        nrp_idx = None
-        for i, col in enumerate(columns):
-            if 'NRP' in col.upper():
-                nrp_idx = i
-                break
-        
-        if nrp_idx is None or nrp_idx >= len(row_values):
-            continue
+    try:
+        while (rows := await asyncio.to_thread(next_rows)) is not None:
+            for idx, nrp, fields, kategori in rows:
+                try:
+                    docs = build_import_documents(nrp, fields, kategori, user)
+                    pending.append({"row": idx, "nrp": nrp, **docs})
+                except Exception as e:
+                    if len(errors) < 10:
+                        errors.append(f"Row {idx}: {str(e)}")
+                
+                if len(pending) >= IMPORT_BATCH_SIZE:
+                    await flush()
+            if progress and rows:
+                await progress(rows[-1][0], total_rows)
         
-        nrp = row_values[nrp_idx]
-        if not nrp or not any(c.isdigit() for c in nrp) or len(nrp) < 5:
-            continue
-        
-        # Check if exists
-        existing = await db.personel.find_one({"nrp": nrp})
-        if existing:
-            skipped_count += 1
-            continue
-        
-        try:
-            # Map columns
-            def get_val(col_name):
-                for i, col in enumerate(columns):
-                    if col_name.upper() in col.upper() and i < len(row_values):
-                        val = row_values[i]
-                        if val and val.lower() != 'nan':
-                            return val
-                return ''
-            
-            personel = {
-                "id": generate_id(),
-                "nrp": nrp,
-                "nama_lengkap": get_val('NAMA'),
-                "kategori": current_kategori,
-                "pangkat": get_val('PANGKAT'),
-                "korps": "ARH",
-                "tempat_lahir": "",
-                "tanggal_lahir": get_val('LAHIR'),
-                "jenis_kelamin": "L",
-                "agama": "ISLAM",
-                "status_personel": "AKTIF",
-                "tmt_masuk_dinas": "",
-                "satuan_induk": "",
-                "jabatan_sekarang": get_val('JABATAN'),
-                "tmt_pangkat": get_val('TMT'),
-                "created_at": now_isoformat(),
-                "created_by": user["id"]
-            }
-            
-            await db.personel.insert_one(personel)
-            
-            # Import DIKBANG
-            dikbangum = get_val('DIKBANGUM')
-            tahun_dikbangum = get_val('TAHUN')
-            if dikbangum:
-                for i, dik in enumerate(dikbangum.split(',')):
-                    dik = dik.strip()
-                    if dik and not dik[0].isdigit():
-                        dik = dik
-                    elif dik:
-                        dik = dik.split('.', 1)[-1].strip() if '.' in dik else dik
-                    
-                    if dik:
-                        await db.dikbang.insert_one({
-                            "id": generate_id(),
-                            "nrp": nrp,
-                            "jenis_diklat": "DIKBANGUM",
-                            "nama_diklat": dik,
-                            "tahun": "",
-                            "hasil": "LULUS",
-                            "created_at": now_isoformat()
-                        })
-            
-            dikbangspes = get_val('DIKBANGSPES')
-            if dikbangspes:
-                for dik in dikbangspes.split(','):
-                    dik = dik.strip()
-                    if dik and not dik[0].isdigit():
-                        dik = dik
-                    elif dik:
-                        dik = dik.split('.', 1)[-1].strip() if '.' in dik else dik
-                    
-                    if dik:
-                        await db.dikbang.insert_one({
-                            "id": generate_id(),
-                            "nrp": nrp,
-                            "jenis_diklat": "DIKBANGSPES",
-                            "nama_diklat": dik,
-                            "tahun": "",
-                            "hasil": "LULUS",
-                            "created_at": now_isoformat()
-                        })
-            
-            # Import Prestasi
-            prestasi = get_val('PRESTASI')
-            if prestasi:
-                await db.prestasi.insert_one({
-                    "id": generate_id(),
-                    "nrp": nrp,
-                    "nama_prestasi": prestasi,
-                    "tingkat": "",
-                    "tahun": "",
-                    "created_at": now_isoformat()
-                })
-            
-            imported_count += 1
-            
-        except Exception as e:
-            errors.append(f"Row {idx}: {str(e)}")
+        if pending:
+            await flush()
+    finally:
+        blocks.close()
     
     await create_audit_log(user["id"], user["username"], "IMPORT_PERSONEL", "personel", None, None, {
         "imported": imported_count,
@@ -947,9 +2205,35 @@ async def import_personel_excel(file: UploadFile = File(...), user: dict = Depen
         "message": f"Import selesai. {imported_count} data berhasil, {skipped_count} dilewati",
         "imported": imported_count,
         "skipped": skipped_count,
-        "errors": errors[:10]
+        "errors": errors
     }
 
+@api_router.post("/import/personel")
+async def import_personel_excel(
+    file: UploadFile = File(...),
+    background: Optional[bool] = Query(None, description="Paksa job (true) atau langsung (false); default otomatis menurut ukuran file"),
+    user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))
+):
+    if not file.filename.endswith(('.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail="File harus berformat Excel")
+    
+    job_id = generate_id()
+    input_path = EXPORT_DIR / f"{job_id}.input{Path(file.filename).suffix.lower()}"
+    job = None
+    try:
+        size = await spool_upload(file, input_path)
+        if background is None:
+            background = size > IMPORT_SYNC_MAX_BYTES
+        
+        if background:
+            job = await create_job("import_personel", user, {"filename": file.filename, "input_path": str(input_path)}, job_id=job_id)
+            return job_accepted_response(job, "Import sedang diproses")
+        
+        return await import_personel_workbook(input_path, user)
+    finally:
+        if job is None:
+            input_path.unlink(missing_ok=True)
+
 # ================== REPORTS ==================
 @api_router.get("/reports/dsp")
 async def get_dsp_report(
@@ -959,11 +2243,11 @@ async def get_dsp_report(
 ):
     query = {"status_personel": "AKTIF"}
     if satuan:
-        query["satuan_induk"] = {"$regex": satuan, "$options": "i"}
+        query["satuan_induk"] = satuan_filter(satuan)
     if kategori:
         query["kategori"] = kategori
     
-    personel = await db.personel.find(query, {"_id": 0}).sort([("kategori", 1), ("pangkat", 1)]).to_list(10000)
+    personel = await db.personel.find(query, PERSONEL_PROJECTION).sort([("kategori", 1), ("pangkat", 1)]).to_list(10000)
     
     return {
         "data": personel,
@@ -982,11 +2266,7 @@ async def get_mutasi_report(
     
     data = await db.pengajuan.find(query, {"_id": 0}).sort("created_at", -1).to_list(10000)
     
-    for item in data:
-        personel = await db.personel.find_one({"nrp": item.get("nrp")}, {"_id": 0, "nama_lengkap": 1, "pangkat": 1})
-        if personel:
-            item["nama_lengkap"] = personel.get("nama_lengkap")
-            item["pangkat"] = personel.get("pangkat")
+    await attach_personel_fields(data)
     
     return {"data": data, "total": len(data)}
 
@@ -1005,25 +2285,106 @@ async def create_custom_field(data: dict = Body(...), user: dict = Depends(requi
     return {"message": "Custom field berhasil ditambahkan", "id": data["id"]}
 
 # ================== FILE UPLOAD (DOCUMENTS) ==================
-import os
-import shutil
-from fastapi.responses import FileResponse
-
 UPLOAD_DIR = Path("/app/uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png', '.doc', '.docx'}
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+MAX_FILE_SIZE = int(os.environ.get('MAX_FILE_SIZE', 10 * 1024 * 1024))
+
+DOCUMENT_MEDIA_TYPES = {
+    '.pdf': 'application/pdf',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.doc': 'application/msword',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+# Types a browser can preview; everything else is always sent as an attachment
+INLINE_MEDIA_TYPES = {'application/pdf', 'image/jpeg', 'image/png'}
+
+# Document files are stored once per content, named by their SHA-256 under
+# BLOB_DIR/ab/cd/<sha256>. The `documents` rows sharing a sha256 are the
+# references to a blob; it is removed together with the last of them.
+# Uploads are spooled into UPLOAD_TMP_DIR (same filesystem) and renamed in.
+BLOB_DIR = UPLOAD_DIR / "blobs"
+UPLOAD_TMP_DIR = UPLOAD_DIR / "tmp"
+BLOB_DIR.mkdir(exist_ok=True)
+UPLOAD_TMP_DIR.mkdir(exist_ok=True)
+
+def blob_path(sha256: str) -> Path:
+    return BLOB_DIR / sha256[:2] / sha256[2:4] / sha256
+
+def _store_blob(source: Path, target: Path) -> bool:
+    """Move ``source`` into the blob store; returns False (and drops it) if the content is already there"""
+    if target.exists():
+        source.unlink(missing_ok=True)
+        return False
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(source, target)
+    return True
+
+def _link_blob(source: Path, target: Path) -> bool:
+    """Like _store_blob but leaves ``source`` in place (hard link, copy if linking fails)"""
+    if target.exists():
+        return False
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        return False
+    except OSError:
+        temp_path = UPLOAD_TMP_DIR / f"{target.name}.{generate_id()}.part"
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, target)
+    return True
+
+def _file_digest(path: Path) -> tuple:
+    """(size, sha256 hex) of a file, read in UPLOAD_CHUNK_SIZE pieces"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            digest.update(chunk)
+    return size, digest.hexdigest()
+
+async def release_document_file(doc: dict):
+    """Remove a deleted document's file unless another document still references it.
+
+    The blob is renamed aside before the final recount: an upload of the same
+    content inserts its row before looking for the blob, so it either finds
+    the blob gone and writes it again, or is seen by the recount and the blob
+    is put back.
+    """
+    file_path = Path(doc["file_path"])
+    sha256 = doc.get("sha256")
+    if not sha256 or file_path != blob_path(sha256):
+        # Not yet moved into the blob store: one file per document
+        await asyncio.to_thread(file_path.unlink, missing_ok=True)
+        return
+    if await db.documents.count_documents({"sha256": sha256}, limit=1):
+        return
+    trash_path = file_path.with_name(f"{sha256}.{doc['id']}.deleting")
+    try:
+        await asyncio.to_thread(os.replace, file_path, trash_path)
+    except FileNotFoundError:
+        return
+    if await db.documents.count_documents({"sha256": sha256}, limit=1):
+        await asyncio.to_thread(os.replace, trash_path, file_path)
+    else:
+        await asyncio.to_thread(trash_path.unlink, missing_ok=True)
+        for variant in PREVIEW_SIZES:
+            await asyncio.to_thread(preview_path(sha256, variant).unlink, missing_ok=True)
 
 @api_router.get("/personel/{nrp}/documents")
-async def get_personel_documents(nrp: str, user: dict = Depends(get_current_user)):
+async def get_personel_documents(nrp: str, request: Request, user: dict = Depends(get_current_user)):
     """Get all documents for a personel"""
     # Personnel can only access own documents
     if user["role"] == "personnel" and user.get("nrp") != nrp:
         raise HTTPException(status_code=403, detail="Akses ditolak")
     
     documents = await db.documents.find({"nrp": nrp}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return documents
+    return etag_json_response(request, documents, CACHE_CONTROL_PERSONEL)
 
 @api_router.post("/personel/{nrp}/documents")
 async def upload_document(
@@ -1044,23 +2405,14 @@ async def upload_document(
     if file_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(status_code=400, detail=f"Format file tidak didukung. Gunakan: {', '.join(ALLOWED_EXTENSIONS)}")
     
-    # Read and validate file size
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="Ukuran file maksimal 10MB")
-    
-    # Create directory for personel
-    personel_dir = UPLOAD_DIR / nrp
-    personel_dir.mkdir(exist_ok=True)
-    
-    # Generate unique filename
     doc_id = generate_id()
-    filename = f"{doc_id}{file_ext}"
-    file_path = personel_dir / filename
+    temp_path = UPLOAD_TMP_DIR / f"{doc_id}.part"
     
-    # Save file
-    with open(file_path, "wb") as f:
-        f.write(content)
+    # Stream to disk, hashing as we go; stops as soon as MAX_FILE_SIZE is exceeded
+    digest = hashlib.sha256()
+    file_size = await spool_upload(file, temp_path, MAX_FILE_SIZE, digest)
+    sha256 = digest.hexdigest()
+    file_path = blob_path(sha256)
     
     # Save to database
     doc_data = {
@@ -1068,24 +2420,115 @@ async def upload_document(
         "nrp": nrp,
         "jenis_dokumen": jenis_dokumen,
         "nama_file": file.filename,
-        "filename_stored": filename,
+        "filename_stored": sha256,
         "file_path": str(file_path),
-        "file_size": len(content),
+        "file_size": file_size,
+        "sha256": sha256,
         "file_type": file_ext,
         "keterangan": keterangan,
         "uploaded_by": user["id"],
         "uploaded_by_name": user.get("nama_lengkap", user["username"]),
         "created_at": now_isoformat()
     }
+    if file_ext not in ZIP_STORED_EXTENSIONS:
+        # Sized once here so ZIP bundles can deflate it without a pass over the file
+        try:
+            compressed_size, doc_data["crc32"] = await asyncio.to_thread(_deflate_size, temp_path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        doc_data["zip_deflate"] = {"zlib": zlib.ZLIB_RUNTIME_VERSION, "size": compressed_size}
     
-    await db.documents.insert_one(doc_data)
+    # The row goes in before the blob so release_document_file always sees this reference
+    try:
+        await db.documents.insert_one(doc_data)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    try:
+        await asyncio.to_thread(_store_blob, temp_path, file_path)
+    except BaseException:
+        await db.documents.delete_one({"id": doc_id})
+        temp_path.unlink(missing_ok=True)
+        raise
     await create_audit_log(user["id"], user["username"], "UPLOAD_DOCUMENT", "documents", doc_id)
+    if file_ext in PREVIEW_EXTENSIONS:
+        # Only a warm-up: the preview route renders on demand, so a failed insert must not fail the upload
+        try:
+            await create_job("document_previews", user, {"doc_id": doc_id})
+        except Exception as e:
+            logger.warning(f"Preview job for document {doc_id} not queued: {e}")
     
     return {"message": "Dokumen berhasil diupload", "id": doc_id, "filename": file.filename}
 
+def parse_byte_range(header: Optional[str], size: int) -> Optional[tuple]:
+    """A single ``bytes=`` range as inclusive (start, end); None means send everything.
+
+    Malformed and multi-range headers are ignored, which RFC 9110 14.2
+    allows; a range that starts past the end of the file is a 416.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    if not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    if start >= size:
+        raise HTTPException(status_code=416, detail="Range tidak valid", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+class FileRangeResponse(FileResponse):
+    """206 Partial Content for bytes ``start``-``end`` (inclusive) of a file.
+
+    The body goes out through the ASGI zero-copy send extension when the
+    server offers it, otherwise in chunk_size reads in a worker thread.
+    """
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: Path, start: int, end: int, stat_result: os.stat_result, headers: dict, **kwargs):
+        headers = {
+            **headers,
+            "Content-Range": f"bytes {start}-{end}/{stat_result.st_size}",
+            "Content-Length": str(end - start + 1),
+        }
+        super().__init__(path, status_code=206, headers=headers, stat_result=stat_result, **kwargs)
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.end - self.start + 1
+        file = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": file, "offset": self.start, "count": remaining})
+                return
+            await asyncio.to_thread(file.seek, self.start)
+            while remaining > 0:
+                chunk = await asyncio.to_thread(file.read, min(self.chunk_size, remaining))
+                remaining = remaining - len(chunk) if chunk else 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        finally:
+            await asyncio.to_thread(file.close)
+
 @api_router.get("/documents/{doc_id}/download")
-async def download_document(doc_id: str, user: dict = Depends(get_current_user)):
-    """Download a document"""
+async def download_document(
+    doc_id: str,
+    request: Request,
+    inline: bool = Query(False, description="Tampilkan PDF/gambar di browser alih-alih diunduh"),
+    user: dict = Depends(get_current_user)
+):
+    """Download a document (supports Range, If-Range and If-None-Match)"""
     doc = await db.documents.find_one({"id": doc_id}, {"_id": 0})
     if not doc:
         raise HTTPException(status_code=404, detail="Dokumen tidak ditemukan")
@@ -1095,14 +2538,176 @@ async def download_document(doc_id: str, user: dict = Depends(get_current_user))
         raise HTTPException(status_code=403, detail="Akses ditolak")
     
     file_path = Path(doc["file_path"])
-    if not file_path.exists():
+    try:
+        stat_result = await asyncio.to_thread(file_path.stat)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File tidak ditemukan di server")
     
-    return FileResponse(
-        path=file_path,
-        filename=doc["nama_file"],
-        media_type="application/octet-stream"
-    )
+    # Blobs never change, so the content hash is a strong validator; files not
+    # yet migrated to the blob store only get a weak one from their stat
+    if doc.get("sha256"):
+        etag = f'"{doc["sha256"]}"'
+    else:
+        etag = f'W/"{stat_result.st_size}-{stat_result.st_mtime_ns}"'
+    headers = {**validator_headers(etag, CACHE_CONTROL_PERSONEL), "Accept-Ranges": "bytes", "X-Content-Type-Options": "nosniff"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    extension = doc.get("file_type") or Path(doc["nama_file"]).suffix.lower()
+    media_type = DOCUMENT_MEDIA_TYPES.get(extension, "application/octet-stream")
+    options = {
+        "headers": headers,
+        "media_type": media_type,
+        "filename": doc["nama_file"],
+        "content_disposition_type": "inline" if inline and media_type in INLINE_MEDIA_TYPES else "attachment",
+    }
+    
+    # If-Range needs a strong match, otherwise the whole (changed) file is sent
+    if_range = request.headers.get("if-range")
+    if if_range is None or (if_range.strip() == etag and not etag.startswith("W/")):
+        byte_range = parse_byte_range(request.headers.get("range"), stat_result.st_size)
+        if byte_range:
+            return FileRangeResponse(file_path, *byte_range, stat_result, **options)
+    return FileResponse(file_path, stat_result=stat_result, **options)
+
+# ---- Previews ----
+# JPEG derivatives of images and of the first page of PDFs, written next to the
+# blob as <sha256>.<variant>.jpg. A background job renders them after upload;
+# the preview route renders a missing one on demand. Serving a preview bumps
+# its mtime, and preview_cache_loop removes the least recently used ones once
+# the cache grows past PREVIEW_CACHE_MAX_BYTES.
+PREVIEW_SIZES = {"web": int(os.environ.get('PREVIEW_WEB_SIZE', 1600)), "thumb": int(os.environ.get('PREVIEW_THUMB_SIZE', 256))}
+PREVIEW_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png'}
+PREVIEW_JPEG_QUALITY = {"web": 85, "thumb": 75}
+PREVIEW_RENDER_CONCURRENCY = int(os.environ.get('PREVIEW_RENDER_CONCURRENCY', 2))
+PREVIEW_CACHE_MAX_BYTES = int(os.environ.get('PREVIEW_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+PREVIEW_CACHE_SWEEP_SECONDS = int(os.environ.get('PREVIEW_CACHE_SWEEP_SECONDS', 900))
+PREVIEW_TOUCH_SECONDS = 3600  # mtime granularity used for LRU; avoids a write on every hit
+
+preview_render_slots = asyncio.Semaphore(PREVIEW_RENDER_CONCURRENCY)
+
+def preview_path(sha256: str, variant: str) -> Path:
+    return blob_path(sha256).with_name(f"{sha256}.{variant}.jpg")
+
+def has_previews(doc: dict) -> bool:
+    """Previews exist for images and PDFs that are in the blob store"""
+    sha256 = doc.get("sha256")
+    return doc.get("file_type") in PREVIEW_EXTENSIONS and bool(sha256) and Path(doc["file_path"]) == blob_path(sha256)
+
+def _render_previews(source: Path, file_type: str, sha256: str):
+    """Write every PREVIEW_SIZES variant of a blob, largest first"""
+    largest = max(PREVIEW_SIZES.values())
+    if file_type == ".pdf":
+        pdf = pdfium.PdfDocument(str(source))
+        try:
+            page = pdf[0]
+            image = page.render(scale=largest / max(page.get_size())).to_pil()
+        finally:
+            pdf.close()
+    else:
+        with PILImage.open(source) as original:
+            original.draft("RGB", (largest, largest))  # JPEG: decode at reduced scale
+            image = ImageOps.exif_transpose(original)
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = PILImage.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+    
+    for variant, size in sorted(PREVIEW_SIZES.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size), PILImage.LANCZOS)
+        target = preview_path(sha256, variant)
+        temp_path = UPLOAD_TMP_DIR / f"{target.name}.{generate_id()}.part"
+        image.save(temp_path, "JPEG", quality=PREVIEW_JPEG_QUALITY.get(variant, 80), optimize=True, progressive=True)
+        os.replace(temp_path, target)
+
+async def ensure_previews(doc: dict) -> bool:
+    """Render the document's previews unless they exist; False if it cannot have any.
+
+    Files Pillow/PDFium cannot read raise a 422.
+    """
+    if not has_previews(doc):
+        return False
+    sha256 = doc["sha256"]
+    if await asyncio.to_thread(lambda: all(preview_path(sha256, variant).exists() for variant in PREVIEW_SIZES)):
+        return True
+    async with preview_render_slots:
+        try:
+            await asyncio.to_thread(_render_previews, blob_path(sha256), doc["file_type"], sha256)
+        except (OSError, PILImage.DecompressionBombError, pdfium.PdfiumError) as e:
+            logger.warning(f"Preview of document {doc['id']} failed: {e}")
+            raise HTTPException(status_code=422, detail="Preview tidak dapat dibuat dari file ini")
+    return True
+
+def _evict_previews(max_bytes: int) -> int:
+    """Remove least recently served previews until the cache is under 90% of ``max_bytes``"""
+    entries = []
+    for path in BLOB_DIR.glob("*/*/*.*.jpg"):
+        try:
+            stat_result = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat_result.st_mtime, stat_result.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return 0
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes * 0.9:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return removed
+
+async def preview_cache_loop():
+    while True:
+        try:
+            removed = await asyncio.to_thread(_evict_previews, PREVIEW_CACHE_MAX_BYTES)
+            if removed:
+                logger.info(f"Evicted {removed} cached previews")
+        except Exception as e:
+            logger.error(f"Preview cache eviction failed: {e}")
+        await asyncio.sleep(PREVIEW_CACHE_SWEEP_SECONDS)
+
+@api_router.get("/documents/{doc_id}/preview")
+async def get_document_preview(
+    doc_id: str,
+    request: Request,
+    size: Literal["thumb", "web"] = Query("thumb", description="thumb (daftar) atau web (tampilan penuh)"),
+    user: dict = Depends(get_current_user)
+):
+    """JPEG preview of an image or the first page of a PDF"""
+    doc = await db.documents.find_one({"id": doc_id}, {"_id": 0})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Dokumen tidak ditemukan")
+    
+    # Personnel can only preview own documents
+    if user["role"] == "personnel" and user.get("nrp") != doc["nrp"]:
+        raise HTTPException(status_code=403, detail="Akses ditolak")
+    
+    if not has_previews(doc):
+        raise HTTPException(status_code=415, detail="Preview tidak tersedia untuk dokumen ini")
+    
+    etag = f'"{doc["sha256"]}.{size}"'
+    headers = validator_headers(etag, CACHE_CONTROL_PERSONEL)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    path = preview_path(doc["sha256"], size)
+    try:
+        stat_result = await asyncio.to_thread(path.stat)
+    except FileNotFoundError:
+        # Not rendered yet, or evicted from the cache
+        await ensure_previews(doc)
+        stat_result = await asyncio.to_thread(path.stat)
+    else:
+        if time.time() - stat_result.st_mtime > PREVIEW_TOUCH_SECONDS:
+            await asyncio.to_thread(os.utime, path)
+    
+    return FileResponse(path, stat_result=stat_result, headers=headers, media_type="image/jpeg")
 
 @api_router.delete("/documents/{doc_id}")
 async def delete_document(doc_id: str, user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF))):
@@ -1111,46 +2716,322 @@ async def delete_document(doc_id: str, user: dict = Depends(require_roles(UserRo
     if not doc:
         raise HTTPException(status_code=404, detail="Dokumen tidak ditemukan")
     
-    # Delete file from disk
-    file_path = Path(doc["file_path"])
-    if file_path.exists():
-        file_path.unlink()
-    
-    # Delete from database
+    # Delete from database, then the file if this was its last reference
     await db.documents.delete_one({"id": doc_id})
+    await release_document_file(doc)
     await create_audit_log(user["id"], user["username"], "DELETE_DOCUMENT", "documents", doc_id)
     
     return {"message": "Dokumen berhasil dihapus"}
 
-# ================== EXPORT REPORTS PDF/EXCEL ==================
-from fastapi.responses import StreamingResponse
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm, mm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-import xlsxwriter
+# ---- ZIP bundles ----
+# A bundle's ZIP is written on the fly from the document rows. Its layout is
+# fixed before the first byte from stat() and cached values only:
+# already-compressed formats are stored as-is, and the rest is deflated
+# deterministically when the row carries its compressed size for this zlib
+# (`zip_deflate`, recorded at upload) and stored otherwise. The total length,
+# a strong ETag and any byte range are therefore known up front. Ranges are
+# served by regenerating the archive from the requested offset, which lets
+# clients resume a dropped download. CRC-32s go into data descriptors; they are
+# computed while streaming and cached on the document rows (`crc32`) for
+# resumed requests that skip over a file.
+ZIP_STORED_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png', '.docx'}
+ZIP_STORED, ZIP_DEFLATED = 0, 8
+ZIP_DEFLATE_LEVEL = 6
+ZIP_CHUNK_SIZE = 256 * 1024
+ZIP64_LIMIT = 0xFFFFFFFF  # sizes/offsets from here on need ZIP64 records
 
-@api_router.get("/export/personel/excel")
-async def export_personel_excel(
-    kategori: Optional[str] = None,
-    status: Optional[str] = None,
-    user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF, UserRole.LEADER))
+def _zip_dos_time(timestamp: Optional[str]) -> tuple:
+    try:
+        moment = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        moment = datetime(1980, 1, 1)
+    moment = max(moment.replace(tzinfo=None), datetime(1980, 1, 1))
+    return ((moment.hour << 11) | (moment.minute << 5) | (moment.second // 2),
+            ((moment.year - 1980) << 9) | (moment.month << 5) | moment.day)
+
+def _file_crc32(path: Path) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(ZIP_CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+def _deflate_size(path: Path) -> tuple:
+    """(compressed size, crc32) of a file under the bundle's deflate settings; run once at upload"""
+    compressor = zlib.compressobj(ZIP_DEFLATE_LEVEL, zlib.DEFLATED, -15)
+    size, crc = 0, 0
+    with open(path, "rb") as f:
+        while chunk := f.read(ZIP_CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += len(compressor.compress(chunk))
+    return size + len(compressor.flush()), crc
+
+def zip_entry_name(doc: dict, used: set) -> str:
+    """``<nrp>/<original file name>``, made unique within the archive"""
+    filename = Path(str(doc.get("nama_file") or "").replace("\\", "/")).name or f"{doc['id']}{doc.get('file_type', '')}"
+    stem, suffix = Path(filename).stem, Path(filename).suffix
+    name, counter = f"{doc['nrp']}/{filename}", 1
+    while name.lower() in used:
+        counter += 1
+        name = f"{doc['nrp']}/{stem} ({counter}){suffix}"
+    used.add(name.lower())
+    return name
+
+class ZipBundle:
+    """Byte-exact plan of a streamed ZIP of document files; see iter_range()"""
+
+    def __init__(self, entries: List[dict]):
+        self.entries = entries
+        self.zip64 = False
+        self._layout()
+        if self.zip64_needed():
+            self.zip64 = True
+            self._layout()
+
+    def _layout(self):
+        offset = 0
+        for entry in self.entries:
+            entry["offset"] = offset
+            offset += self.local_header_size(entry) + entry["compressed_size"] + self.descriptor_size
+        self.central_offset = offset
+        self.central_size = sum(46 + len(e["name_bytes"]) + (28 if self.zip64 else 0) for e in self.entries)
+        self.size = self.central_offset + self.central_size + (56 + 20 if self.zip64 else 0) + 22
+
+    def zip64_needed(self) -> bool:
+        return (len(self.entries) >= 0xFFFF or self.central_offset + self.central_size >= ZIP64_LIMIT
+                or any(e["size"] >= ZIP64_LIMIT for e in self.entries))
+
+    @property
+    def descriptor_size(self) -> int:
+        return 24 if self.zip64 else 16
+
+    @property
+    def version(self) -> int:
+        return 45 if self.zip64 else 20
+
+    def local_header_size(self, entry: dict) -> int:
+        return 30 + len(entry["name_bytes"]) + (20 if self.zip64 else 0)
+
+    def etag(self) -> str:
+        manifest = [[e["name"], e["key"], e["size"], e["method"], e["mtime"]] for e in self.entries]
+        if any(e["method"] == ZIP_DEFLATED for e in self.entries):
+            manifest.append(zlib.ZLIB_RUNTIME_VERSION)
+        return f'"{hashlib.sha256(json.dumps(manifest).encode()).hexdigest()[:32]}"'
+
+    # ---- Records ----
+    def local_header(self, entry: dict) -> bytes:
+        sizes = 0xFFFFFFFF if self.zip64 else 0
+        extra = struct.pack("<HHQQ", 1, 16, 0, 0) if self.zip64 else b""
+        return struct.pack(
+            "<IHHHHHIIIHH", 0x04034b50, self.version, 0x0808, entry["method"], *entry["dos_time"],
+            0, sizes, sizes, len(entry["name_bytes"]), len(extra)
+        ) + entry["name_bytes"] + extra
+
+    def descriptor(self, entry: dict) -> bytes:
+        fmt = "<IIQQ" if self.zip64 else "<IIII"
+        return struct.pack(fmt, 0x08074b50, entry["crc"], entry["compressed_size"], entry["size"])
+
+    def central_directory(self) -> bytes:
+        records = []
+        for entry in self.entries:
+            if self.zip64:
+                extra = struct.pack("<HHQQQ", 1, 24, entry["size"], entry["compressed_size"], entry["offset"])
+                sizes = (0xFFFFFFFF, 0xFFFFFFFF, 0xFFFFFFFF)
+            else:
+                extra = b""
+                sizes = (entry["compressed_size"], entry["size"], entry["offset"])
+            records.append(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014b50, self.version, self.version, 0x0808, entry["method"],
+                *entry["dos_time"], entry["crc"], sizes[0], sizes[1], len(entry["name_bytes"]), len(extra),
+                0, 0, 0, 0, sizes[2]
+            ) + entry["name_bytes"] + extra)
+        count = len(self.entries)
+        if self.zip64:
+            end_offset = self.central_offset + self.central_size
+            records.append(struct.pack("<IQHHIIQQQQ", 0x06064b50, 44, 45, 45, 0, 0, count, count,
+                                       self.central_size, self.central_offset))
+            records.append(struct.pack("<IIQI", 0x07064b50, 0, end_offset, 1))
+            records.append(struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, 0xFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0))
+        else:
+            records.append(struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, count, count,
+                                       self.central_size, self.central_offset, 0))
+        return b"".join(records)
+
+    # ---- Streaming ----
+    async def ensure_crc(self, entry: dict):
+        if entry["crc"] is None:
+            entry["crc"] = await asyncio.to_thread(_file_crc32, entry["path"])
+            await self.remember_crc(entry)
+
+    async def remember_crc(self, entry: dict):
+        query = {"sha256": entry["key"]} if entry["sha256"] else {"id": entry["key"]}
+        await db.documents.update_many(query, {"$set": {"crc32": entry["crc"]}})
+
+    async def iter_data(self, entry: dict, skip: int, limit: int):
+        """Bytes [skip, limit) of an entry's stored or deflated data"""
+        full = skip == 0 and limit == entry["compressed_size"] and entry["crc"] is None
+        crc, position = 0, 0
+        compressor = zlib.compressobj(ZIP_DEFLATE_LEVEL, zlib.DEFLATED, -15) if entry["method"] == ZIP_DEFLATED else None
+        f = await asyncio.to_thread(open, entry["path"], "rb")
+        try:
+            if compressor is None and skip:
+                await asyncio.to_thread(f.seek, skip)
+                position = skip
+            while position < limit:
+                chunk = await asyncio.to_thread(f.read, ZIP_CHUNK_SIZE)
+                if full:
+                    crc = zlib.crc32(chunk, crc)
+                if compressor is not None:
+                    chunk = compressor.compress(chunk) if chunk else compressor.flush()
+                    if not chunk:
+                        continue
+                elif not chunk:
+                    raise RuntimeError(f"{entry['path']} is shorter than planned")
+                start, position = position, position + len(chunk)
+                if position > skip:
+                    yield chunk[max(skip - start, 0):limit - start]
+        finally:
+            await asyncio.to_thread(f.close)
+        if full:
+            entry["crc"] = crc
+            await self.remember_crc(entry)
+
+    def parts(self):
+        """(length, producer) pieces of the archive in order; producer(skip, limit) yields bytes"""
+        def static(build):
+            async def produce(skip, limit):
+                yield build()[skip:limit]
+            return produce
+
+        def data(entry):
+            return lambda skip, limit: self.iter_data(entry, skip, limit)
+
+        def descriptor(entry):
+            async def produce(skip, limit):
+                await self.ensure_crc(entry)
+                yield self.descriptor(entry)[skip:limit]
+            return produce
+
+        async def central(skip, limit):
+            for entry in self.entries:
+                await self.ensure_crc(entry)
+            yield self.central_directory()[skip:limit]
+
+        for entry in self.entries:
+            yield self.local_header_size(entry), static(lambda entry=entry: self.local_header(entry))
+            yield entry["compressed_size"], data(entry)
+            yield self.descriptor_size, descriptor(entry)
+        yield self.size - self.central_offset, central
+
+    async def iter_range(self, start: int, end: int):
+        """Archive bytes ``start``-``end`` (inclusive)"""
+        offset = 0
+        for length, produce in self.parts():
+            if offset > end:
+                break
+            if offset + length > start and length:
+                async for chunk in produce(max(start - offset, 0), min(length, end - offset + 1)):
+                    if chunk:
+                        yield chunk
+            offset += length
+
+async def build_zip_bundle(docs: List[dict]) -> Optional[ZipBundle]:
+    """Plan a bundle for document rows in archive order; files missing on disk are left out"""
+    entries, used = [], set()
+    for doc in docs:
+        path = Path(doc["file_path"])
+        try:
+            size = (await asyncio.to_thread(path.stat)).st_size
+        except FileNotFoundError:
+            logger.warning(f"Bundle skips document {doc['id']}: {path} is missing")
+            continue
+        entry = {
+            "path": path,
+            "name": zip_entry_name(doc, used),
+            "key": doc.get("sha256") or doc["id"],
+            "sha256": bool(doc.get("sha256")),
+            "size": size,
+            "mtime": doc.get("created_at"),
+            "dos_time": _zip_dos_time(doc.get("created_at")),
+            "crc": doc.get("crc32"),
+        }
+        entry["name_bytes"] = entry["name"].encode("utf-8")
+        deflate = doc.get("zip_deflate") or {}
+        if (doc.get("file_type") or path.suffix.lower()) not in ZIP_STORED_EXTENSIONS \
+                and deflate.get("zlib") == zlib.ZLIB_RUNTIME_VERSION:
+            entry["method"], entry["compressed_size"] = ZIP_DEFLATED, deflate["size"]
+        else:
+            entry["method"], entry["compressed_size"] = ZIP_STORED, size
+        entries.append(entry)
+    return ZipBundle(entries) if entries else None
+
+@api_router.get("/documents/bundle")
+async def download_document_bundle(
+    request: Request,
+    nrp: Optional[str] = None,
+    satuan_induk: Optional[str] = None,
+    user: dict = Depends(get_current_user)
 ):
-    """Export daftar personel ke Excel"""
-    query = {}
-    if kategori:
-        query["kategori"] = kategori
-    if status:
-        query["status_personel"] = status
-    
-    personel_list = await db.personel.find(query, {"_id": 0}).sort([("kategori", 1), ("pangkat", 1)]).to_list(10000)
-    
-    # Create Excel file in memory
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+    """Stream all documents of one personel or one satuan_induk as a ZIP (Range/If-Range for resuming)"""
+    if bool(nrp) == bool(satuan_induk):
+        raise HTTPException(status_code=400, detail="Isi salah satu: nrp atau satuan_induk")
+    if nrp:
+        # Personnel can only bundle own documents
+        if user["role"] == "personnel" and user.get("nrp") != nrp:
+            raise HTTPException(status_code=403, detail="Akses ditolak")
+        nrps = [nrp]
+    else:
+        if user["role"] not in (UserRole.ADMIN.value, UserRole.STAFF.value, UserRole.LEADER.value):
+            raise HTTPException(status_code=403, detail="Akses ditolak")
+        nrps = await db.personel.distinct("nrp", {"satuan_induk": satuan_induk})
+    # Either value comes from the query string; keep quotes, ';' and CR/LF out of the header
+    label = re.sub(r"[^A-Za-z0-9_-]+", "_", nrp or satuan_induk).strip("_") or ("personel" if nrp else "satuan")
+    
+    docs = await db.documents.find(
+        {"nrp": {"$in": nrps}},
+        {"_id": 0, "id": 1, "nrp": 1, "nama_file": 1, "file_path": 1, "file_type": 1, "sha256": 1, "crc32": 1, "zip_deflate": 1, "created_at": 1}
+    ).sort([("nrp", 1), ("created_at", 1), ("id", 1)]).to_list(None)
+    bundle = await build_zip_bundle(docs)
+    if bundle is None:
+        raise HTTPException(status_code=404, detail="Tidak ada dokumen")
+    
+    etag = bundle.etag()
+    headers = {
+        **validator_headers(etag, CACHE_CONTROL_PERSONEL),
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="dokumen_{label}.zip"',
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    start, end, status_code = 0, bundle.size - 1, 200
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        byte_range = parse_byte_range(request.headers.get("range"), bundle.size)
+        if byte_range:
+            (start, end), status_code = byte_range, 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{bundle.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(bundle.iter_range(start, end), status_code=status_code, headers=headers, media_type="application/zip")
+
+# ================== EXPORT REPORTS PDF/EXCEL ==================
+EXCEL_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_SPOOL_MAX_SIZE = 8 * 1024 * 1024  # Keep small exports in memory, roll larger ones to disk
+
+PERSONEL_EXCEL_HEADERS = ['No', 'NRP', 'Nama Lengkap', 'Pangkat', 'Kategori', 'Jabatan', 'Satuan', 'Status']
+PERSONEL_EXCEL_FIELDS = ['nrp', 'nama_lengkap', 'pangkat', 'kategori', 'jabatan_sekarang', 'satuan_induk', 'status_personel']
+PERSONEL_EXCEL_WIDTHS = [5, 18, 35, 15, 12, 30, 25, 12]
+
+async def write_personel_excel(query: dict, output, progress=None) -> int:
+    """Write the personel list matching `query` as an xlsx workbook into `output`.
+
+    Rows are read from the cursor in batches and written by a worker thread in
+    xlsxwriter's constant_memory mode, so memory stays flat for any row count.
+    Returns the number of rows written.
+    """
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
     worksheet = workbook.add_worksheet('Data Personel')
     
     # Styles
@@ -1168,63 +3049,131 @@ async def export_personel_excel(
         'valign': 'vcenter'
     })
     
-    # Headers
-    headers = ['No', 'NRP', 'Nama Lengkap', 'Pangkat', 'Kategori', 'Jabatan', 'Satuan', 'Status']
-    for col, header in enumerate(headers):
+    # Column widths and headers must come first in constant_memory mode
+    for col, width in enumerate(PERSONEL_EXCEL_WIDTHS):
+        worksheet.set_column(col, col, width)
+    for col, header in enumerate(PERSONEL_EXCEL_HEADERS):
         worksheet.write(0, col, header, header_format)
     
-    # Data
-    for row, p in enumerate(personel_list, start=1):
-        worksheet.write(row, 0, row, cell_format)
-        worksheet.write(row, 1, p.get('nrp', ''), cell_format)
-        worksheet.write(row, 2, p.get('nama_lengkap', ''), cell_format)
-        worksheet.write(row, 3, p.get('pangkat', ''), cell_format)
-        worksheet.write(row, 4, p.get('kategori', ''), cell_format)
-        worksheet.write(row, 5, p.get('jabatan_sekarang', ''), cell_format)
-        worksheet.write(row, 6, p.get('satuan_induk', ''), cell_format)
-        worksheet.write(row, 7, p.get('status_personel', ''), cell_format)
-    
-    # Set column widths
-    worksheet.set_column(0, 0, 5)   # No
-    worksheet.set_column(1, 1, 18)  # NRP
-    worksheet.set_column(2, 2, 35)  # Nama
-    worksheet.set_column(3, 3, 15)  # Pangkat
-    worksheet.set_column(4, 4, 12)  # Kategori
-    worksheet.set_column(5, 5, 30)  # Jabatan
-    worksheet.set_column(6, 6, 25)  # Satuan
-    worksheet.set_column(7, 7, 12)  # Status
-    
-    workbook.close()
-    output.seek(0)
-    
-    filename = f"data_personel_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    
-    await create_audit_log(user["id"], user["username"], "EXPORT_EXCEL", "personel", "all")
-    
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    def write_rows(batch, first_row):
+        for row, p in enumerate(batch, start=first_row):
+            worksheet.write(row, 0, row, cell_format)
+            for col, field in enumerate(PERSONEL_EXCEL_FIELDS, start=1):
+                worksheet.write(row, col, p.get(field, ''), cell_format)
+    
+    projection = {"_id": 0, **{field: 1 for field in PERSONEL_EXCEL_FIELDS}}
+    cursor = db.personel.find(query, projection).sort([("kategori", 1), ("pangkat", 1)]).batch_size(EXPORT_BATCH_SIZE)
+    
+    written = 0
+    batch = []
+    async for p in cursor:
+        batch.append(p)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            await asyncio.to_thread(write_rows, batch, written + 1)
+            written += len(batch)
+            batch = []
+            if progress:
+                await progress(written)
+    if batch:
+        await asyncio.to_thread(write_rows, batch, written + 1)
+        written += len(batch)
+    
+    await asyncio.to_thread(workbook.close)
+    return written
 
-@api_router.get("/export/personel/pdf")
-async def export_personel_pdf(
-    kategori: Optional[str] = None,
-    status: Optional[str] = None,
-    user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF, UserRole.LEADER))
-):
-    """Export daftar personel ke PDF"""
+async def iter_file_chunks(fileobj, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Stream a file object in chunks without blocking the event loop, then close it"""
+    try:
+        while True:
+            chunk = await asyncio.to_thread(fileobj.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+EXCEL_SYNC_MAX_ROWS = int(os.environ.get('EXCEL_SYNC_MAX_ROWS', 20000))
+
+def personel_export_query(kategori: Optional[str], status: Optional[str]) -> dict:
     query = {}
     if kategori:
         query["kategori"] = kategori
     if status:
         query["status_personel"] = status
+    return query
+
+@api_router.get("/export/personel/excel")
+async def export_personel_excel(
+    kategori: Optional[str] = None,
+    status: Optional[str] = None,
+    background: Optional[bool] = Query(None, description="Paksa job (true) atau langsung (false); default otomatis menurut jumlah data"),
+    user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF, UserRole.LEADER))
+):
+    """Export daftar personel ke Excel"""
+    query = personel_export_query(kategori, status)
+    if background is None:
+        background = await db.personel.count_documents(query) > EXCEL_SYNC_MAX_ROWS
     
-    personel_list = await db.personel.find(query, {"_id": 0}).sort([("kategori", 1), ("pangkat", 1)]).to_list(10000)
+    if background:
+        job = await create_job("export_personel_excel", user, {"kategori": kategori, "status": status})
+        return job_accepted_response(job, "Export Excel sedang diproses")
+    
+    # xlsx is a ZIP that xlsxwriter assembles on close(), so the workbook is complete
+    # before the first byte goes out; the spool only keeps it off the heap
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE)
+    try:
+        await write_personel_excel(query, output)
+    except Exception:
+        output.close()
+        raise
+    await create_audit_log(user["id"], user["username"], "EXPORT_EXCEL", "personel", "all")
+    size = output.seek(0, os.SEEK_END)
+    output.seek(0)
     
-    # Create PDF in memory
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), 
+    filename = f"data_personel_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    
+    return StreamingResponse(
+        iter_file_chunks(output),
+        media_type=EXCEL_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(size)
+        }
+    )
+
+# ================== PDF RENDERING ==================
+# ReportLab is CPU bound and holds the GIL, so PDFs are rendered in a separate
+# process pool. Each render has a row/byte budget and a wall-clock deadline that
+# the renderer checks between pages.
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+PDF_RENDER_QUEUE_LIMIT = int(os.environ.get('PDF_RENDER_QUEUE_LIMIT', 8))
+PDF_RENDER_TIMEOUT_SECONDS = float(os.environ.get('PDF_RENDER_TIMEOUT_SECONDS', 120))
+PDF_MAX_ROWS = int(os.environ.get('PDF_MAX_ROWS', 50000))
+PDF_MAX_BYTES = int(os.environ.get('PDF_MAX_BYTES', 100 * 1024 * 1024))
+PDF_ROWS_PER_TABLE = 30  # About one landscape A4 page
+
+EXPORT_DIR = Path(os.environ.get('EXPORT_DIR', '/app/exports'))
+EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+
+def new_pdf_render_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=PDF_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+pdf_render_pool = new_pdf_render_pool()
+pdf_renders_pending = 0
+pdf_render_slot_freed = asyncio.Condition()
+
+class PdfBudgetExceeded(Exception):
+    pass
+
+def _pdf_deadline_check(deadline: float):
+    def check(canvas, doc):
+        if time.time() > deadline:
+            raise PdfBudgetExceeded("Waktu pembuatan PDF melebihi batas")
+    return check
+
+def render_personel_list_pdf(output_path: str, rows: list, subtitle: str, deadline: float):
+    """Render the personel list PDF; runs inside the render process pool"""
+    doc = SimpleDocTemplate(output_path, pagesize=landscape(A4),
                            leftMargin=1*cm, rightMargin=1*cm,
                            topMargin=1*cm, bottomMargin=1*cm)
     
@@ -1240,35 +3189,12 @@ async def export_personel_pdf(
         spaceAfter=20
     )
     elements.append(Paragraph("DAFTAR PERSONEL ARHANUD", title_style))
-    
-    # Subtitle
-    subtitle = f"Tanggal: {datetime.now().strftime('%d-%m-%Y %H:%M')}"
-    if kategori:
-        subtitle += f" | Kategori: {kategori}"
-    if status:
-        subtitle += f" | Status: {status}"
     elements.append(Paragraph(subtitle, styles['Normal']))
     elements.append(Spacer(1, 20))
     
-    # Table data
-    table_data = [['No', 'NRP', 'Nama Lengkap', 'Pangkat', 'Kategori', 'Jabatan', 'Status']]
-    
-    for idx, p in enumerate(personel_list, start=1):
-        table_data.append([
-            str(idx),
-            p.get('nrp', ''),
-            p.get('nama_lengkap', '')[:40],  # Truncate long names
-            p.get('pangkat', ''),
-            p.get('kategori', ''),
-            (p.get('jabatan_sekarang', '') or '')[:30],
-            p.get('status_personel', '')
-        ])
-    
-    # Create table
+    header = ['No', 'NRP', 'Nama Lengkap', 'Pangkat', 'Kategori', 'Jabatan', 'Status']
     col_widths = [1*cm, 4*cm, 6*cm, 3*cm, 2.5*cm, 6*cm, 2.5*cm]
-    table = Table(table_data, colWidths=col_widths, repeatRows=1)
-    
-    table.setStyle(TableStyle([
+    table_style = TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4A5D23')),
         ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
         ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
@@ -1283,45 +3209,27 @@ async def export_personel_pdf(
         ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
         ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
         ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
-    ]))
+    ])
     
-    elements.append(table)
+    # One small table per page-sized chunk instead of one giant Table, which
+    # ReportLab would have to re-split on every page
+    for start in range(0, max(len(rows), 1), PDF_ROWS_PER_TABLE):
+        if time.time() > deadline:
+            raise PdfBudgetExceeded("Waktu pembuatan PDF melebihi batas")
+        table = Table([header] + rows[start:start + PDF_ROWS_PER_TABLE], colWidths=col_widths, repeatRows=1)
+        table.setStyle(table_style)
+        elements.append(table)
     
     # Footer
     elements.append(Spacer(1, 20))
-    elements.append(Paragraph(f"Total: {len(personel_list)} personel", styles['Normal']))
-    
-    doc.build(elements)
-    buffer.seek(0)
+    elements.append(Paragraph(f"Total: {len(rows)} personel", styles['Normal']))
     
-    filename = f"data_personel_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    
-    await create_audit_log(user["id"], user["username"], "EXPORT_PDF", "personel", "all")
-    
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    check = _pdf_deadline_check(deadline)
+    doc.build(elements, onFirstPage=check, onLaterPages=check)
 
-@api_router.get("/export/personel/{nrp}/pdf")
-async def export_personel_detail_pdf(nrp: str, user: dict = Depends(get_current_user)):
-    """Export biodata personel individu ke PDF"""
-    # Personnel can only export own data
-    if user["role"] == "personnel" and user.get("nrp") != nrp:
-        raise HTTPException(status_code=403, detail="Akses ditolak")
-    
-    personel = await db.personel.find_one({"nrp": nrp}, {"_id": 0})
-    if not personel:
-        raise HTTPException(status_code=404, detail="Personel tidak ditemukan")
-    
-    # Get related data
-    dikbang = await db.dikbang.find({"nrp": nrp}, {"_id": 0}).to_list(100)
-    keluarga = await db.keluarga.find({"nrp": nrp}, {"_id": 0}).to_list(100)
-    
-    # Create PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4,
+def render_personel_detail_pdf(output_path: str, personel: dict, dikbang: list, keluarga: list, printed_at: str, deadline: float):
+    """Render the biodata PDF of one personel; runs inside the render process pool"""
+    doc = SimpleDocTemplate(output_path, pagesize=A4,
                            leftMargin=2*cm, rightMargin=2*cm,
                            topMargin=2*cm, bottomMargin=2*cm)
     
@@ -1372,6 +3280,16 @@ async def export_personel_detail_pdf(nrp: str, user: dict = Depends(get_current_
     elements.append(personal_table)
     elements.append(Spacer(1, 20))
     
+    section_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4A5D23')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ])
+    
     # DIKBANG Section
     if dikbang:
         elements.append(Paragraph("<b>RIWAYAT PENDIDIKAN</b>", styles['Heading3']))
@@ -1388,15 +3306,7 @@ async def export_personel_detail_pdf(nrp: str, user: dict = Depends(get_current_
             ])
         
         dikbang_table = Table(dikbang_data, colWidths=[1*cm, 3*cm, 6*cm, 2*cm, 3*cm])
-        dikbang_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4A5D23')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+        dikbang_table.setStyle(section_style)
         elements.append(dikbang_table)
         elements.append(Spacer(1, 20))
     
@@ -1416,52 +3326,204 @@ async def export_personel_detail_pdf(nrp: str, user: dict = Depends(get_current_
             ])
         
         keluarga_table = Table(keluarga_data, colWidths=[1*cm, 3*cm, 5*cm, 3*cm, 3*cm])
-        keluarga_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4A5D23')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+        keluarga_table.setStyle(section_style)
         elements.append(keluarga_table)
     
     # Footer
     elements.append(Spacer(1, 30))
-    elements.append(Paragraph(f"Dicetak pada: {datetime.now().strftime('%d-%m-%Y %H:%M')}", styles['Normal']))
+    elements.append(Paragraph(f"Dicetak pada: {printed_at}", styles['Normal']))
     
-    doc.build(elements)
-    buffer.seek(0)
+    check = _pdf_deadline_check(deadline)
+    doc.build(elements, onFirstPage=check, onLaterPages=check)
+
+def replace_pdf_render_pool(broken: ProcessPoolExecutor):
+    """Swap in a fresh pool once per broken one; other renders on it see the same error"""
+    global pdf_render_pool
+    if pdf_render_pool is broken:
+        logger.error("PDF render process died, restarting the render pool")
+        pdf_render_pool = new_pdf_render_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+def _check_pdf_size(output_path: Path) -> int:
+    size = output_path.stat().st_size
+    if size > PDF_MAX_BYTES:
+        output_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=413, detail="Ukuran PDF melebihi batas, gunakan filter")
+    return size
+
+async def run_pdf_render(render_func, output_path: Path, *args, wait: bool = False) -> int:
+    """Render a PDF to `output_path` in the process pool, enforcing the budgets; returns its size.
+
+    Requests get a 503 when PDF_RENDER_QUEUE_LIMIT renders are pending; job
+    handlers pass ``wait=True`` and wait for a slot instead.
+    """
+    global pdf_renders_pending
+    if wait:
+        async with pdf_render_slot_freed:
+            await pdf_render_slot_freed.wait_for(lambda: pdf_renders_pending < PDF_RENDER_QUEUE_LIMIT)
+            pdf_renders_pending += 1
+    elif pdf_renders_pending >= PDF_RENDER_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=503,
+            detail="Antrian pembuatan PDF penuh, silakan coba lagi",
+            headers={"Retry-After": "5"}
+        )
+    else:
+        pdf_renders_pending += 1
+    pool = pdf_render_pool
+    try:
+        deadline = time.time() + PDF_RENDER_TIMEOUT_SECONDS
+        future = asyncio.get_running_loop().run_in_executor(pool, render_func, str(output_path), *args, deadline)
+        # Small grace period for time spent waiting in the pool queue
+        await asyncio.wait_for(future, timeout=PDF_RENDER_TIMEOUT_SECONDS + 10)
+    except (PdfBudgetExceeded, asyncio.TimeoutError):
+        await asyncio.to_thread(output_path.unlink, missing_ok=True)
+        raise HTTPException(status_code=504, detail="Waktu pembuatan PDF melebihi batas")
+    except BrokenProcessPool:
+        # A render process died (OOM, crash); the pool is unusable from now on
+        await asyncio.to_thread(output_path.unlink, missing_ok=True)
+        replace_pdf_render_pool(pool)
+        raise HTTPException(
+            status_code=503,
+            detail="Proses pembuatan PDF terhenti, silakan coba lagi",
+            headers={"Retry-After": "5"}
+        )
+    except BaseException:
+        await asyncio.to_thread(output_path.unlink, missing_ok=True)
+        raise
+    finally:
+        pdf_renders_pending -= 1
+        async with pdf_render_slot_freed:
+            pdf_render_slot_freed.notify()
+    
+    return await asyncio.to_thread(_check_pdf_size, output_path)
+
+PDF_SYNC_MAX_ROWS = int(os.environ.get('PDF_SYNC_MAX_ROWS', 2000))
+
+async def fetch_personel_pdf_rows(query: dict) -> list:
+    """Table rows of the personel list PDF, at most PDF_MAX_ROWS"""
+    projection = {"_id": 0, "nrp": 1, "nama_lengkap": 1, "pangkat": 1, "kategori": 1, "jabatan_sekarang": 1, "status_personel": 1}
+    rows = []
+    cursor = db.personel.find(query, projection).sort([("kategori", 1), ("pangkat", 1)]).batch_size(EXPORT_BATCH_SIZE)
+    async for p in cursor:
+        if len(rows) >= PDF_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"Maksimal {PDF_MAX_ROWS} personel per PDF, gunakan filter atau export Excel")
+        rows.append([
+            str(len(rows) + 1),
+            p.get('nrp', ''),
+            p.get('nama_lengkap', '')[:40],  # Truncate long names
+            p.get('pangkat', ''),
+            p.get('kategori', ''),
+            (p.get('jabatan_sekarang', '') or '')[:30],
+            p.get('status_personel', '')
+        ])
+    return rows
+
+def personel_pdf_subtitle(kategori: Optional[str], status: Optional[str]) -> str:
+    subtitle = f"Tanggal: {datetime.now().strftime('%d-%m-%Y %H:%M')}"
+    if kategori:
+        subtitle += f" | Kategori: {kategori}"
+    if status:
+        subtitle += f" | Status: {status}"
+    return subtitle
+
+async def fetch_personel_detail_pdf_data(nrp: str) -> tuple:
+    personel = await db.personel.find_one({"nrp": nrp}, PERSONEL_PROJECTION)
+    if not personel:
+        raise HTTPException(status_code=404, detail="Personel tidak ditemukan")
     
-    filename = f"biodata_{nrp}_{datetime.now().strftime('%Y%m%d')}.pdf"
+    # Get related data
+    dikbang, keluarga = await asyncio.gather(
+        db.dikbang.find({"nrp": nrp}, {"_id": 0}).to_list(100),
+        db.keluarga.find({"nrp": nrp}, {"_id": 0}).to_list(100)
+    )
+    return personel, dikbang, keluarga
+
+@api_router.get("/export/personel/pdf")
+async def export_personel_pdf(
+    kategori: Optional[str] = None,
+    status: Optional[str] = None,
+    background: Optional[bool] = Query(None, description="Paksa job (true) atau langsung (false); default otomatis menurut jumlah data"),
+    user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF, UserRole.LEADER))
+):
+    """Export daftar personel ke PDF"""
+    query = personel_export_query(kategori, status)
+    if background is None:
+        background = await db.personel.count_documents(query) > PDF_SYNC_MAX_ROWS
+    
+    await create_audit_log(user["id"], user["username"], "EXPORT_PDF", "personel", "all")
+    
+    if background:
+        job = await create_job("export_personel_pdf", user, {"kategori": kategori, "status": status})
+        return job_accepted_response(job, "Export PDF sedang diproses")
+    
+    rows = await fetch_personel_pdf_rows(query)
+    output_path = EXPORT_DIR / f"{generate_id()}.pdf"
+    await run_pdf_render(render_personel_list_pdf, output_path, rows, personel_pdf_subtitle(kategori, status))
+    
+    filename = f"data_personel_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    
+    return FileResponse(
+        path=output_path,
+        filename=filename,
+        media_type="application/pdf",
+        background=BackgroundTask(output_path.unlink, missing_ok=True)
+    )
+
+@api_router.get("/export/personel/{nrp}/pdf")
+async def export_personel_detail_pdf(
+    nrp: str,
+    background: Optional[bool] = Query(None, description="Paksa job (true) atau langsung (false); default otomatis menurut antrian PDF"),
+    user: dict = Depends(get_current_user)
+):
+    """Export biodata personel individu ke PDF"""
+    # Personnel can only export own data
+    if user["role"] == "personnel" and user.get("nrp") != nrp:
+        raise HTTPException(status_code=403, detail="Akses ditolak")
+    
+    personel, dikbang, keluarga = await fetch_personel_detail_pdf_data(nrp)
     
     await create_audit_log(user["id"], user["username"], "EXPORT_PDF", "personel", nrp)
     
-    return StreamingResponse(
-        buffer,
+    # One personel is always small; go through a job only when the render queue is full
+    if background is None:
+        background = pdf_renders_pending >= PDF_RENDER_QUEUE_LIMIT
+    
+    if background:
+        job = await create_job("export_personel_detail_pdf", user, {"nrp": nrp})
+        return job_accepted_response(job, "Export PDF sedang diproses")
+    
+    output_path = EXPORT_DIR / f"{generate_id()}.pdf"
+    printed_at = datetime.now().strftime('%d-%m-%Y %H:%M')
+    await run_pdf_render(render_personel_detail_pdf, output_path, personel, dikbang, keluarga, printed_at)
+    
+    filename = f"biodata_{nrp}_{datetime.now().strftime('%Y%m%d')}.pdf"
+    
+    return FileResponse(
+        path=output_path,
+        filename=filename,
         media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+        background=BackgroundTask(output_path.unlink, missing_ok=True)
     )
 
 @api_router.get("/export/statistik/excel")
 async def export_statistik_excel(user: dict = Depends(require_roles(UserRole.ADMIN, UserRole.STAFF, UserRole.LEADER))):
     """Export statistik personel ke Excel"""
     # Get stats
-    total = await db.personel.count_documents({})
-    aktif = await db.personel.count_documents({"status_personel": "AKTIF"})
+    counters = await read_stats_counters()
+    total = counters.get("total", {}).get("all", 0)
+    aktif = counters.get("status", {}).get("AKTIF", 0)
     
     by_kategori = {}
     for kategori in ["PERWIRA", "BINTARA", "TAMTAMA", "PNS"]:
-        count = await db.personel.count_documents({"kategori": kategori})
+        count = counters.get("kategori", {}).get(kategori, 0)
         if count > 0:
             by_kategori[kategori] = count
     
-    by_pangkat_pipeline = [
-        {"$group": {"_id": "$pangkat", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}}
+    by_pangkat_result = [
+        {"_id": pangkat, "count": count}
+        for pangkat, count in sorted(counters.get("pangkat", {}).items(), key=lambda item: -item[1])
     ]
-    by_pangkat_result = await db.personel.aggregate(by_pangkat_pipeline).to_list(100)
     
     # Create Excel
     output = io.BytesIO()
@@ -1545,7 +3607,7 @@ async def initialize_system():
             "nama_lengkap": user_data["nama_lengkap"],
             "role": user_data["role"],
             "nrp": user_data.get("nrp"),
-            "password": hash_password(user_data["password"]),
+            "password": await hash_password(user_data["password"]),
             "is_active": True,
             "created_at": now_isoformat()
         })
@@ -1617,6 +3679,9 @@ async def initialize_system():
         h["created_at"] = now_isoformat()
         await db.ref_hubungan_keluarga.insert_one(h)
     
+    for collection in ("ref_pangkat", "ref_agama", "ref_jenis_diklat", "ref_hubungan_keluarga"):
+        await reference_cache.refresh(collection, await bump_collection_version(collection))
+    
     return {
         "message": "System initialized successfully",
         "users": [
@@ -1629,104 +3694,849 @@ async def initialize_system():
     }
 
 # ================== MIGRATE OLD DATA ==================
-@api_router.post("/migrate/old-data")
-async def migrate_old_data(user: dict = Depends(require_roles(UserRole.ADMIN))):
-    """Migrate data from old 'personnel' collection to new 'personel' collection"""
-    old_data = await db.personnel.find({}, {"_id": 0}).to_list(10000)
-    migrated = 0
+MIGRATE_SYNC_MAX_DOCS = int(os.environ.get('MIGRATE_SYNC_MAX_DOCS', 500))
+MIGRATE_BATCH_SIZE = int(os.environ.get('MIGRATE_BATCH_SIZE', 500))
+MIGRATE_CHECKPOINT = "personnel"
+# Held for the whole run, so two runs never interleave on the checkpoint
+MIGRATE_LEASE = "migrate_old_data"
+MIGRATE_LEASE_SECONDS = 300
+
+# Legacy pangkat -> kategori: PERWIRA if any of these appears in the pangkat, otherwise BINTARA
+LEGACY_PERWIRA_PANGKAT = ("MAYOR", "LETKOL", "KOLONEL", "JENDERAL", "KAPTEN", "LETTU", "LETDA")
+
+def legacy_kategori_table(pangkat_values: List[Any]) -> Dict[str, str]:
+    """Classify every distinct legacy pangkat once (keys are upper-cased)"""
+    table = {}
+    for value in pangkat_values:
+        pangkat = str(value or "").upper()
+        table[pangkat] = "PERWIRA" if any(x in pangkat for x in LEGACY_PERWIRA_PANGKAT) else "BINTARA"
+    return table
+
+def legacy_child_id(old_id, kind: str, index: int) -> str:
+    """Deterministic id for a migrated child document, so re-running a batch does not duplicate it"""
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, f"personnel:{old_id}:{kind}:{index}"))
+
+def split_legacy_diklat(value) -> List[str]:
+    items = []
+    for dik in str(value).replace('\n', ',').split(','):
+        dik = dik.strip()
+        if dik and len(dik) > 2:
+            # Remove numbering
+            if dik[0].isdigit() and '.' in dik:
+                dik = dik.split('.', 1)[-1].strip()
+            if dik:
+                items.append(dik)
+    return items
+
+def build_migrated_documents(old: dict, kategori_table: Dict[str, str]) -> dict:
+    """Map one legacy `personnel` document to personel, dikbang and prestasi documents"""
+    nrp = old["nrp"]
+    created_at = now_isoformat()
+    personel = {
+        "id": generate_id(),
+        "nrp": nrp,
+        "nama_lengkap": old.get("nama") or "",
+        "kategori": kategori_table.get(str(old.get("pangkat") or "").upper(), "BINTARA"),
+        "pangkat": old.get("pangkat") or "",
+        "korps": "ARH",
+        "tempat_lahir": "",
+        "tanggal_lahir": old.get("tanggal_lahir") or "",
+        "jenis_kelamin": "L",
+        "agama": "ISLAM",
+        "status_personel": str(old.get("status") or "AKTIF").upper(),
+        "tmt_masuk_dinas": "",
+        "satuan_induk": old.get("satuan") or "",
+        "jabatan_sekarang": old.get("jabatan") or "",
+        "tmt_pangkat": old.get("tmt_jabatan") or "",
+        "created_at": created_at,
+        "migrated_from": "personnel"
+    }
+    personel.update(personel_search_fields(personel["nama_lengkap"]))
+    
+    dikbang = []
+    for field, jenis in (("dikbangum", "DIKBANGUM"), ("dikbangspes", "DIKBANGSPES")):
+        value = old.get(field) or ""
+        for i, dik in enumerate(split_legacy_diklat(value) if value else []):
+            dikbang.append({
+                "id": legacy_child_id(old["_id"], jenis, i),
+                "nrp": nrp,
+                "jenis_diklat": jenis,
+                "nama_diklat": dik,
+                "tahun": "",
+                "hasil": "LULUS",
+                "created_at": created_at
+            })
     
-    for old in old_data:
+    prestasi = []
+    if old.get("prestasi"):
+        prestasi.append({
+            "id": legacy_child_id(old["_id"], "PRESTASI", 0),
+            "nrp": nrp,
+            "nama_prestasi": old["prestasi"],
+            "tingkat": "",
+            "tahun": "",
+            "created_at": created_at
+        })
+    
+    return {"personel": personel, "dikbang": dikbang, "prestasi": prestasi}
+
+async def migrate_personnel_batch(batch: List[dict], seen_nrps: set, kategori_table: Dict[str, str], dry_run: bool) -> dict:
+    """Migrate one batch of legacy documents.
+
+    NRPs that already exist are found with one ``$in`` query. Children are
+    upserted (by deterministic id) before their personel, and personel are
+    upserted with ``$setOnInsert`` keyed on NRP, so replaying a batch after a
+    crash neither duplicates nor loses documents.
+    """
+    counts = {"migrated": 0, "skipped": 0, "dikbang": 0, "prestasi": 0}
+    nrps = [old["nrp"] for old in batch if old.get("nrp")]
+    existing = await db.personel.find({"nrp": {"$in": nrps}}, {"_id": 0, "nrp": 1}).to_list(len(nrps))
+    existing_nrps = {doc["nrp"] for doc in existing}
+    
+    migrated = []
+    for old in batch:
         nrp = old.get("nrp")
-        if not nrp:
-            continue
-        
-        existing = await db.personel.find_one({"nrp": nrp})
-        if existing:
+        if not nrp or nrp in existing_nrps or nrp in seen_nrps:
+            counts["skipped"] += 1
             continue
+        seen_nrps.add(nrp)
+        migrated.append(build_migrated_documents(old, kategori_table))
+    
+    counts["dikbang"] = sum(len(docs["dikbang"]) for docs in migrated)
+    counts["prestasi"] = sum(len(docs["prestasi"]) for docs in migrated)
+    if dry_run:
+        counts["migrated"] = len(migrated)
+        return counts
+    
+    for collection, kind in ((db.dikbang, "dikbang"), (db.prestasi, "prestasi")):
+        ops = [UpdateOne({"id": doc["id"]}, {"$setOnInsert": doc}, upsert=True)
+               for docs in migrated for doc in docs[kind]]
+        if ops:
+            await collection.bulk_write(ops, ordered=False)
+    
+    if migrated:
+        result = await db.personel.bulk_write([
+            UpdateOne({"nrp": docs["personel"]["nrp"]}, {"$setOnInsert": docs["personel"]}, upsert=True)
+            for docs in migrated
+        ], ordered=False)
+        inserted = [migrated[i]["personel"] for i in result.upserted_ids]
+        await apply_personel_stats_delta([], inserted)
+        counts["migrated"] = len(inserted)
+        counts["skipped"] += len(migrated) - len(inserted)
+    return counts
+
+async def migrate_personnel_collection(progress=None, dry_run: bool = False) -> dict:
+    """Migrate data from old 'personnel' collection to new 'personel' collection.
+
+    The legacy collection is read with a cursor in ``_id`` order and written
+    in batches of MIGRATE_BATCH_SIZE. After every batch the last ``_id`` is
+    stored in ``migration_checkpoints``; a run that stopped before finishing
+    resumes after that ``_id``. ``dry_run`` reports the counts without
+    writing anything (and without touching the checkpoint). A writing run
+    holds the MIGRATE_LEASE lease; while another run holds it a 409 is raised.
+    """
+    if dry_run:
+        return await _migrate_personnel_collection(progress, dry_run)
+    try:
+        result = await run_with_lease(MIGRATE_LEASE, MIGRATE_LEASE_SECONDS,
+                                      lambda: _migrate_personnel_collection(progress, dry_run))
+    except LeaseLost:
+        result = None
+    if result is None:
+        raise HTTPException(status_code=409, detail="Migrasi lain sedang berjalan")
+    return result
+
+async def _migrate_personnel_collection(progress, dry_run: bool) -> dict:
+    checkpoint = await db.migration_checkpoints.find_one({"name": MIGRATE_CHECKPOINT}, {"_id": 0})
+    resume = checkpoint is not None and checkpoint.get("status") == "running" and not dry_run
+    query = {"_id": {"$gt": checkpoint["last_id"]}} if resume and "last_id" in checkpoint else {}
+    totals = {key: (checkpoint.get(key, 0) if resume else 0) for key in ("migrated", "skipped", "dikbang", "prestasi")}
+    
+    kategori_table = legacy_kategori_table(await db.personnel.distinct("pangkat"))
+    total = await db.personnel.count_documents(query)
+    seen_nrps = set()
+    processed = 0
+    
+    if not dry_run and not resume:
+        await db.migration_checkpoints.update_one(
+            {"name": MIGRATE_CHECKPOINT},
+            {"$set": {"status": "running", "started_at": now_isoformat(), "updated_at": now_isoformat(), **totals},
+             "$unset": {"last_id": "", "finished_at": ""}},
+            upsert=True
+        )
+    
+    async def run_batch(batch):
+        nonlocal processed
+        counts = await migrate_personnel_batch(batch, seen_nrps, kategori_table, dry_run)
+        for key, value in counts.items():
+            totals[key] += value
+        processed += len(batch)
+        if not dry_run:
+            await db.migration_checkpoints.update_one({"name": MIGRATE_CHECKPOINT}, {"$set": {
+                "last_id": batch[-1]["_id"], "updated_at": now_isoformat(), **totals
+            }})
+        if progress:
+            await progress(processed, total)
+    
+    batch = []
+    async for old in db.personnel.find(query).sort("_id", 1).batch_size(MIGRATE_BATCH_SIZE):
+        batch.append(old)
+        if len(batch) >= MIGRATE_BATCH_SIZE:
+            await run_batch(batch)
+            batch = []
+    if batch:
+        await run_batch(batch)
+    
+    if not dry_run:
+        await db.migration_checkpoints.update_one({"name": MIGRATE_CHECKPOINT}, {"$set": {
+            "status": "done", "finished_at": now_isoformat(), **totals
+        }})
+    
+    if dry_run:
+        message = f"Dry run: {totals['migrated']} records would be migrated from old collection"
+    else:
+        message = f"Migrated {totals['migrated']} records from old collection"
+    return {"message": message, **totals, "dry_run": dry_run, "resumed": resume}
+
+@api_router.post("/migrate/old-data")
+async def migrate_old_data(
+    dry_run: bool = Query(False, description="Hitung saja tanpa menulis data"),
+    background: Optional[bool] = Query(None, description="Paksa job (true) atau langsung (false); default otomatis menurut jumlah data"),
+    user: dict = Depends(require_roles(UserRole.ADMIN))
+):
+    """Migrate data from old 'personnel' collection to new 'personel' collection"""
+    if background is None:
+        background = await db.personnel.count_documents({}) > MIGRATE_SYNC_MAX_DOCS
+    
+    if background:
+        job = await create_job("migrate_old_data", user, {"dry_run": dry_run})
+        return job_accepted_response(job, "Migrasi sedang diproses")
+    
+    return await migrate_personnel_collection(dry_run=dry_run)
+
+async def migrate_document_files(progress=None, dry_run: bool = False) -> dict:
+    """Move per-document upload files into the content-addressed blob store.
+
+    Every document whose file_path is outside BLOB_DIR is hashed (a stored
+    sha256 is trusted), linked into the store unless that content is already
+    there, repointed, and only then is its old file removed; an interrupted
+    run is finished by running it again. Missing files are counted and left
+    as they are. Emptied per-NRP directories are removed afterwards.
+    """
+    query = {"file_path": {"$not": re.compile(f"^{re.escape(str(BLOB_DIR))}/")}}
+    total = await db.documents.count_documents(query)
+    counts = {"documents": 0, "stored": 0, "deduplicated": 0, "missing": 0, "bytes_saved": 0}
+    seen = set()
+    
+    async for doc in db.documents.find(query, {"_id": 0, "id": 1, "file_path": 1, "sha256": 1}):
+        old_path = Path(doc["file_path"])
+        try:
+            if doc.get("sha256"):
+                size, sha256 = (await asyncio.to_thread(old_path.stat)).st_size, doc["sha256"]
+            else:
+                size, sha256 = await asyncio.to_thread(_file_digest, old_path)
+        except FileNotFoundError:
+            counts["missing"] += 1
+            size = None
         
-        # Determine kategori from pangkat
-        pangkat = old.get("pangkat", "").upper()
-        kategori = "BINTARA"
-        if any(x in pangkat for x in ["MAYOR", "LETKOL", "KOLONEL", "JENDERAL", "KAPTEN", "LETTU", "LETDA"]):
-            kategori = "PERWIRA"
-        elif any(x in pangkat for x in ["SERTU", "SERDA", "SERKA", "SERMA", "KOPKA", "KOPTU", "KOPDA"]):
-            kategori = "BINTARA"
-        
-        new_personel = {
-            "id": generate_id(),
-            "nrp": nrp,
-            "nama_lengkap": old.get("nama", ""),
-            "kategori": kategori,
-            "pangkat": old.get("pangkat", ""),
-            "korps": "ARH",
-            "tempat_lahir": "",
-            "tanggal_lahir": old.get("tanggal_lahir", ""),
-            "jenis_kelamin": "L",
-            "agama": "ISLAM",
-            "status_personel": old.get("status", "AKTIF").upper(),
-            "tmt_masuk_dinas": "",
-            "satuan_induk": old.get("satuan", ""),
-            "jabatan_sekarang": old.get("jabatan", ""),
-            "tmt_pangkat": old.get("tmt_jabatan", ""),
-            "created_at": now_isoformat(),
-            "migrated_from": "personnel"
-        }
-        
-        await db.personel.insert_one(new_personel)
-        
-        # Migrate dikbang
-        dikbangum = old.get("dikbangum", "")
-        if dikbangum:
-            for dik in str(dikbangum).replace('\n', ',').split(','):
-                dik = dik.strip()
-                if dik and len(dik) > 2:
-                    # Remove numbering
-                    if dik[0].isdigit() and '.' in dik:
-                        dik = dik.split('.', 1)[-1].strip()
-                    if dik:
-                        await db.dikbang.insert_one({
-                            "id": generate_id(),
-                            "nrp": nrp,
-                            "jenis_diklat": "DIKBANGUM",
-                            "nama_diklat": dik,
-                            "tahun": "",
-                            "hasil": "LULUS",
-                            "created_at": now_isoformat()
-                        })
-        
-        dikbangspes = old.get("dikbangspes", "")
-        if dikbangspes:
-            for dik in str(dikbangspes).replace('\n', ',').split(','):
-                dik = dik.strip()
-                if dik and len(dik) > 2:
-                    if dik[0].isdigit() and '.' in dik:
-                        dik = dik.split('.', 1)[-1].strip()
-                    if dik:
-                        await db.dikbang.insert_one({
-                            "id": generate_id(),
-                            "nrp": nrp,
-                            "jenis_diklat": "DIKBANGSPES",
-                            "nama_diklat": dik,
-                            "tahun": "",
-                            "hasil": "LULUS",
-                            "created_at": now_isoformat()
-                        })
+        if size is not None:
+            target = blob_path(sha256)
+            if dry_run:
+                added = sha256 not in seen and not await asyncio.to_thread(target.exists)
+                seen.add(sha256)
+            else:
+                added = await asyncio.to_thread(_link_blob, old_path, target)
+                await db.documents.update_one({"id": doc["id"]}, {"$set": {
+                    "sha256": sha256, "file_size": size, "file_path": str(target), "filename_stored": sha256
+                }})
+                await asyncio.to_thread(old_path.unlink, missing_ok=True)
+            counts["stored" if added else "deduplicated"] += 1
+            counts["bytes_saved"] += 0 if added else size
         
-        # Migrate prestasi
-        prestasi = old.get("prestasi", "")
-        if prestasi:
-            await db.prestasi.insert_one({
-                "id": generate_id(),
-                "nrp": nrp,
-                "nama_prestasi": prestasi,
-                "tingkat": "",
-                "tahun": "",
-                "created_at": now_isoformat()
-            })
+        counts["documents"] += 1
+        if progress:
+            await progress(counts["documents"], total)
+    
+    if not dry_run:
+        for directory in await asyncio.to_thread(lambda: [d for d in UPLOAD_DIR.iterdir() if d.is_dir()]):
+            if directory in (BLOB_DIR, UPLOAD_TMP_DIR):
+                continue
+            try:
+                await asyncio.to_thread(directory.rmdir)
+            except OSError:
+                pass  # still holds files
+    
+    moved = counts["documents"] - counts["missing"]
+    if dry_run:
+        message = f"Dry run: {moved} files would be moved to blob store ({counts['deduplicated']} duplicates)"
+    else:
+        message = f"Moved {moved} files to blob store ({counts['deduplicated']} duplicates removed)"
+    return {"message": message, **counts, "dry_run": dry_run}
+
+@api_router.post("/migrate/document-files")
+async def migrate_document_files_route(
+    dry_run: bool = Query(False, description="Hitung saja tanpa memindahkan file"),
+    background: Optional[bool] = Query(None, description="Paksa job (true) atau langsung (false); default otomatis menurut jumlah data"),
+    user: dict = Depends(require_roles(UserRole.ADMIN))
+):
+    """Deduplicate stored document files into the content-addressed blob store"""
+    if background is None:
+        background = await db.documents.count_documents({}) > MIGRATE_SYNC_MAX_DOCS
+    
+    if background:
+        job = await create_job("migrate_document_files", user, {"dry_run": dry_run})
+        return job_accepted_response(job, "Migrasi file dokumen sedang diproses")
+    
+    return await migrate_document_files(dry_run=dry_run)
+
+# ================== BACKGROUND JOBS ==================
+# Long-running imports/exports run as jobs stored in the `jobs` collection.
+# Every API process runs JOB_WORKERS workers that claim queued jobs atomically,
+# so a job is picked up by whichever process is free. Result files live in
+# EXPORT_DIR and are removed together with the job after JOB_RESULT_TTL_HOURS.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_POLL_INTERVAL_SECONDS = float(os.environ.get('JOB_POLL_INTERVAL_SECONDS', 2))
+JOB_RESULT_TTL_HOURS = float(os.environ.get('JOB_RESULT_TTL_HOURS', 24))
+JOB_CLEANUP_INTERVAL_SECONDS = int(os.environ.get('JOB_CLEANUP_INTERVAL_SECONDS', 600))
+JOB_HEARTBEAT_SECONDS = 30
+JOB_STALE_SECONDS = 4 * JOB_HEARTBEAT_SECONDS
+JOB_PROGRESS_INTERVAL_SECONDS = 1.0
+
+JOB_FINISHED_STATUSES = ("done", "failed", "cancelled")
+# Jobs the server queues for itself; they run under the triggering user but are not listed in GET /jobs
+INTERNAL_JOB_KINDS = ("document_previews",)
+job_wakeup = asyncio.Event()
+
+class JobCancelled(Exception):
+    pass
+
+class JobContext:
+    """Handed to job handlers for progress reporting and cancellation checks"""
+    def __init__(self, job: dict):
+        self.job = job
+        self.user = {"id": job["created_by"], "username": job.get("username", "")}
+        self._last_progress = 0.0
+        self.current = 0
+        self.total = None
+    
+    async def progress(self, current: int, total: int = None, message: str = None, force: bool = False):
+        """Record progress (throttled) and raise JobCancelled if a cancel was requested"""
+        self.current = current
+        if total is not None:
+            self.total = total
+        now = time.monotonic()
+        if not force and now - self._last_progress < JOB_PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_progress = now
         
-        migrated += 1
+        update = {"progress.current": current}
+        if total is not None:
+            update["progress.total"] = total
+        if message:
+            update["progress.message"] = message
+        job = await db.jobs.find_one_and_update(
+            {"id": self.job["id"]}, {"$set": update}, projection={"_id": 0, "cancel_requested": 1}
+        )
+        if job and job.get("cancel_requested"):
+            raise JobCancelled()
+    
+    def output_path(self, suffix: str) -> Path:
+        return EXPORT_DIR / f"{self.job['id']}{suffix}"
+
+async def create_job(kind: str, user: dict, params: dict = None, job_id: str = None) -> dict:
+    job = {
+        "id": job_id or generate_id(),
+        "kind": kind,
+        "status": "queued",
+        "params": params or {},
+        "progress": {"current": 0, "total": None, "message": ""},
+        "cancel_requested": False,
+        "created_by": user["id"],
+        "username": user["username"],
+        "created_at": now_isoformat()
+    }
+    await db.jobs.insert_one(job)
+    job.pop("_id", None)
+    job_wakeup.set()
+    return job
+
+def job_accepted_response(job: dict, message: str) -> JSONResponse:
+    return JSONResponse(status_code=202, content={
+        "message": message,
+        "job_id": job["id"],
+        "status": job["status"]
+    })
+
+async def claim_next_job() -> Optional[dict]:
+    now = now_isoformat()
+    job = await db.jobs.find_one_and_update(
+        {"status": "queued", "cancel_requested": False},
+        {"$set": {"status": "running", "started_at": now, "heartbeat_at": now}},
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+    if job:
+        job.pop("_id", None)
+    return job
+
+def job_finish_fields(status: str) -> dict:
+    finished_at = datetime.now(timezone.utc)
+    return {
+        "status": status,
+        "finished_at": finished_at.isoformat(),
+        "expires_at": (finished_at + timedelta(hours=JOB_RESULT_TTL_HOURS)).isoformat()
+    }
+
+async def finish_job(job_id: str, status: str, fields: dict = None):
+    update = job_finish_fields(status)
+    update.update(fields or {})
+    await db.jobs.update_one({"id": job_id}, {"$set": update})
+
+async def job_heartbeat(job_id: str):
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        await db.jobs.update_one({"id": job_id}, {"$set": {"heartbeat_at": now_isoformat()}})
+
+async def execute_job(job: dict):
+    handler = JOB_HANDLERS.get(job["kind"])
+    if handler is None:
+        await finish_job(job["id"], "failed", {"error": f"Jenis job tidak dikenal: {job['kind']}"})
+        return
+    
+    ctx = JobContext(job)
+    heartbeat = asyncio.create_task(job_heartbeat(job["id"]))
+    try:
+        outcome = await handler(job, ctx) or {}
+    except JobCancelled:
+        await finish_job(job["id"], "cancelled")
+    except HTTPException as e:
+        await finish_job(job["id"], "failed", {"error": e.detail})
+    except Exception as e:
+        logger.exception(f"Job {job['id']} ({job['kind']}) failed")
+        await finish_job(job["id"], "failed", {"error": str(e)})
+    else:
+        total = ctx.total if ctx.total is not None else ctx.current
+        outcome.setdefault("progress", {"current": total, "total": total, "message": ""})
+        await finish_job(job["id"], "done", outcome)
+    finally:
+        heartbeat.cancel()
+
+async def job_worker_loop():
+    while True:
+        try:
+            job_wakeup.clear()
+            job = await claim_next_job()
+            if job is None:
+                try:
+                    await asyncio.wait_for(job_wakeup.wait(), timeout=JOB_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await execute_job(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job worker error: {e}")
+            await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+
+async def cleanup_jobs():
+    """Delete expired jobs with their files and fail jobs whose worker died"""
+    now = datetime.now(timezone.utc)
+    expired = await db.jobs.find(
+        {"expires_at": {"$lt": now.isoformat()}}, {"_id": 0, "id": 1, "file_path": 1, "params": 1}
+    ).to_list(None)
+    for job in expired:
+        for path in (job.get("file_path"), job.get("params", {}).get("input_path")):
+            if path:
+                Path(path).unlink(missing_ok=True)
+    if expired:
+        await db.jobs.delete_many({"id": {"$in": [job["id"] for job in expired]}})
+        logger.info(f"Removed {len(expired)} expired jobs")
+    
+    stale_before = (now - timedelta(seconds=JOB_STALE_SECONDS)).isoformat()
+    await db.jobs.update_many(
+        {"status": "running", "heartbeat_at": {"$lt": stale_before}},
+        {"$set": {
+            "status": "failed",
+            "error": "Worker berhenti sebelum job selesai",
+            "finished_at": now.isoformat(),
+            "expires_at": (now + timedelta(hours=JOB_RESULT_TTL_HOURS)).isoformat()
+        }}
+    )
+
+async def job_cleanup_loop():
+    while True:
+        try:
+            await cleanup_jobs()
+        except Exception as e:
+            logger.error(f"Job cleanup failed: {e}")
+        await asyncio.sleep(JOB_CLEANUP_INTERVAL_SECONDS)
+
+# ---- Job handlers ----
+async def job_export_personel_excel(job: dict, ctx: JobContext) -> dict:
+    params = job["params"]
+    query = personel_export_query(params.get("kategori"), params.get("status"))
+    total = await db.personel.count_documents(query)
+    output_path = ctx.output_path(".xlsx")
+    
+    async def progress(written):
+        await ctx.progress(written, total)
+    
+    output = await asyncio.to_thread(open, output_path, "wb")
+    try:
+        try:
+            rows = await write_personel_excel(query, output, progress)
+        finally:
+            await asyncio.to_thread(output.close)
+    except BaseException:
+        await asyncio.to_thread(output_path.unlink, missing_ok=True)
+        raise
+    await create_audit_log(job["created_by"], job["username"], "EXPORT_EXCEL", "personel", "all")
+    
+    return {
+        "file_path": str(output_path),
+        "filename": f"data_personel_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+        "media_type": EXCEL_MEDIA_TYPE,
+        "file_size": (await asyncio.to_thread(output_path.stat)).st_size,
+        "result": {"rows": rows}
+    }
+
+async def job_export_personel_pdf(job: dict, ctx: JobContext) -> dict:
+    params = job["params"]
+    rows = await fetch_personel_pdf_rows(personel_export_query(params.get("kategori"), params.get("status")))
+    await ctx.progress(0, len(rows), "Membuat PDF", force=True)
+    
+    output_path = ctx.output_path(".pdf")
+    file_size = await run_pdf_render(render_personel_list_pdf, output_path, rows, personel_pdf_subtitle(params.get("kategori"), params.get("status")), wait=True)
+    
+    return {
+        "file_path": str(output_path),
+        "filename": f"data_personel_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+        "media_type": "application/pdf",
+        "file_size": file_size,
+        "result": {"rows": len(rows)}
+    }
+
+async def job_export_personel_detail_pdf(job: dict, ctx: JobContext) -> dict:
+    nrp = job["params"]["nrp"]
+    personel, dikbang, keluarga = await fetch_personel_detail_pdf_data(nrp)
+    
+    output_path = ctx.output_path(".pdf")
+    printed_at = datetime.now().strftime('%d-%m-%Y %H:%M')
+    file_size = await run_pdf_render(render_personel_detail_pdf, output_path, personel, dikbang, keluarga, printed_at, wait=True)
+    
+    return {
+        "file_path": str(output_path),
+        "filename": f"biodata_{nrp}_{datetime.now().strftime('%Y%m%d')}.pdf",
+        "media_type": "application/pdf",
+        "file_size": file_size
+    }
+
+async def job_import_personel(job: dict, ctx: JobContext) -> dict:
+    input_path = Path(job["params"]["input_path"])
+    try:
+        result = await import_personel_workbook(input_path, ctx.user, ctx.progress)
+    finally:
+        await asyncio.to_thread(input_path.unlink, missing_ok=True)
+    return {"result": result}
+
+async def job_migrate_old_data(job: dict, ctx: JobContext) -> dict:
+    result = await migrate_personnel_collection(ctx.progress, dry_run=job["params"].get("dry_run", False))
+    return {"result": result}
+
+async def job_migrate_document_files(job: dict, ctx: JobContext) -> dict:
+    result = await migrate_document_files(ctx.progress, dry_run=job["params"].get("dry_run", False))
+    return {"result": result}
+
+async def job_document_previews(job: dict, ctx: JobContext) -> dict:
+    doc = await db.documents.find_one({"id": job["params"]["doc_id"]}, {"_id": 0})
+    if doc is None:
+        return {"result": {"previews": False}}
+    return {"result": {"previews": await ensure_previews(doc)}}
+
+JOB_HANDLERS = {
+    "export_personel_excel": job_export_personel_excel,
+    "export_personel_pdf": job_export_personel_pdf,
+    "export_personel_detail_pdf": job_export_personel_detail_pdf,
+    "import_personel": job_import_personel,
+    "migrate_old_data": job_migrate_old_data,
+    "migrate_document_files": job_migrate_document_files,
+    "document_previews": job_document_previews,
+}
+
+# ---- Job routes ----
+async def get_job_for_user(job_id: str, user: dict) -> dict:
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan")
+    if job["created_by"] != user["id"] and user["role"] != UserRole.ADMIN.value:
+        raise HTTPException(status_code=403, detail="Akses ditolak")
+    return job
+
+def job_response(job: dict) -> dict:
+    job.pop("file_path", None)
+    job.get("params", {}).pop("input_path", None)
+    return job
+
+@api_router.get("/jobs")
+async def get_jobs(
+    status: Optional[str] = None,
+    limit: int = 50,
+    user: dict = Depends(get_current_user)
+):
+    query = {"kind": {"$nin": list(INTERNAL_JOB_KINDS)}}
+    if user["role"] != UserRole.ADMIN.value:
+        query["created_by"] = user["id"]
+    if status:
+        query["status"] = status
+    
+    jobs = await db.jobs.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+    return [job_response(job) for job in jobs]
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, user: dict = Depends(get_current_user)):
+    return job_response(await get_job_for_user(job_id, user))
+
+@api_router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, user: dict = Depends(get_current_user)):
+    job = await get_job_for_user(job_id, user)
+    if job["status"] in JOB_FINISHED_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Job sudah selesai (status: {job['status']})")
+    
+    # Queued jobs are cancelled right away, in the same write a worker's claim would race with;
+    # running ones stop at their next progress check
+    result = await db.jobs.update_one(
+        {"id": job_id, "status": "queued"},
+        {"$set": {"cancel_requested": True, **job_finish_fields("cancelled")}}
+    )
+    if not result.modified_count:
+        await db.jobs.update_one(
+            {"id": job_id, "status": {"$nin": list(JOB_FINISHED_STATUSES)}},
+            {"$set": {"cancel_requested": True}}
+        )
+    
+    await create_audit_log(user["id"], user["username"], "CANCEL_JOB", "jobs", job_id)
+    return {"message": "Permintaan pembatalan job diterima"}
+
+@api_router.get("/jobs/{job_id}/download")
+async def download_job_result(job_id: str, user: dict = Depends(get_current_user)):
+    job = await get_job_for_user(job_id, user)
+    if job["status"] != "done" or not job.get("file_path"):
+        raise HTTPException(status_code=409, detail=f"Hasil job belum tersedia (status: {job['status']})")
+    
+    file_path = Path(job["file_path"])
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File hasil tidak ditemukan di server")
     
-    return {"message": f"Migrated {migrated} records from old collection"}
+    return FileResponse(path=file_path, filename=job["filename"], media_type=job["media_type"])
+
+# ================== DATABASE INDEXES ==================
+# Declared indexes per collection, matching the filter + sort of each route.
+# Each entry is (keys, options); names are left to MongoDB so they stay stable.
+INDEX_SPECS = {
+    "users": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("username", ASCENDING)], {"unique": True}),
+        ([("role", ASCENDING)], {}),
+    ],
+    "personel": [
+        ([("nrp", ASCENDING)], {"unique": True}),
+        ([("kategori", ASCENDING), ("pangkat", ASCENDING), ("nrp", ASCENDING)], {}),
+        ([("status_personel", ASCENDING), ("kategori", ASCENDING), ("pangkat", ASCENDING), ("nrp", ASCENDING)], {}),
+        ([("satuan_induk", ASCENDING)], {}),
+        ([("search_prefixes", ASCENDING)], {}),
+    ],
+    "riwayat_jabatan": [
+        ([("nrp", ASCENDING), ("tmt_jabatan", DESCENDING)], {}),
+        ([("id", ASCENDING)], {}),
+    ],
+    "riwayat_pangkat": [
+        ([("nrp", ASCENDING), ("tmt_pangkat", DESCENDING)], {}),
+        ([("id", ASCENDING)], {}),
+    ],
+    "dikbang": [
+        ([("nrp", ASCENDING), ("tahun", DESCENDING)], {}),
+        ([("nrp", ASCENDING), ("jenis_diklat", ASCENDING), ("tahun", DESCENDING)], {}),
+        ([("id", ASCENDING)], {}),
+    ],
+    "prestasi": [
+        ([("nrp", ASCENDING), ("tahun", DESCENDING)], {}),
+        ([("id", ASCENDING)], {}),
+    ],
+    "tanda_jasa": [
+        ([("nrp", ASCENDING), ("tahun", DESCENDING)], {}),
+    ],
+    "keluarga": [
+        ([("nrp", ASCENDING)], {}),
+    ],
+    "kesejahteraan": [
+        ([("nrp", ASCENDING)], {}),
+    ],
+    "kesjas": [
+        ([("nrp", ASCENDING), ("tanggal_tes", DESCENDING)], {}),
+    ],
+    "hukuman": [
+        ([("nrp", ASCENDING), ("tmt_mulai", DESCENDING)], {}),
+    ],
+    "absensi_cuti": [
+        ([("nrp", ASCENDING), ("tanggal_mulai", DESCENDING)], {}),
+    ],
+    "documents": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("nrp", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("sha256", ASCENDING)], {}),
+    ],
+    "pengajuan": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("created_at", DESCENDING)], {}),
+        ([("status", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("jenis_pengajuan", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)], {}),
+    ],
+    "stats_snapshot": [
+        ([("dimension", ASCENDING), ("value", ASCENDING)], {"unique": True}),
+    ],
+    "migration_checkpoints": [
+        ([("name", ASCENDING)], {"unique": True}),
+    ],
+    "collection_versions": [
+        ([("name", ASCENDING)], {"unique": True}),
+    ],
+    "leases": [
+        ([("name", ASCENDING)], {"unique": True}),
+    ],
+    "jobs": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("status", ASCENDING), ("created_at", ASCENDING)], {}),
+        ([("created_by", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("expires_at", ASCENDING)], {"sparse": True}),
+    ],
+    "custom_fields": [
+        ([("entity_type", ASCENDING), ("urutan", ASCENDING)], {}),
+    ],
+}
+for _ref_collection in REFERENCE_COLLECTIONS.values():
+    INDEX_SPECS[_ref_collection] = [
+        ([("id", ASCENDING)], {}),
+        ([("urutan", ASCENDING)], {}),
+    ]
+
+# Declared for every monthly audit_logs_YYYY_MM partition (see ensure_audit_partition)
+AUDIT_PARTITION_INDEX_SPECS = [
+    ([("id", ASCENDING)], {"unique": True}),
+    ([("timestamp", DESCENDING), ("id", DESCENDING)], {}),
+    ([("entity_type", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], {}),
+]
+
+def declared_indexes(collection: str) -> list:
+    if AUDIT_PARTITION_PATTERN.match(collection):
+        return AUDIT_PARTITION_INDEX_SPECS
+    return INDEX_SPECS.get(collection, [])
+
+async def indexed_collections() -> List[str]:
+    partitions, _ = await list_audit_collections()
+    return list(INDEX_SPECS) + partitions
+
+# Index options that matter when comparing a declared index with an existing one
+INDEX_OPTION_KEYS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+def _index_options(info: dict) -> dict:
+    return {k: info[k] for k in INDEX_OPTION_KEYS if info.get(k) not in (None, False)}
+
+async def check_index_drift(collection: str) -> dict:
+    """Compare declared indexes of a collection with what exists in MongoDB"""
+    existing = await db[collection].index_information()
+    existing_by_keys = {
+        tuple((k, int(d) if isinstance(d, (int, float)) else d) for k, d in info["key"]): (name, info)
+        for name, info in existing.items()
+    }
+
+    missing = []
+    conflicting = []
+    declared_keys = set()
+    for keys, options in declared_indexes(collection):
+        key_tuple = tuple(keys)
+        declared_keys.add(key_tuple)
+        if key_tuple not in existing_by_keys:
+            missing.append({"keys": keys, "options": options})
+            continue
+        name, info = existing_by_keys[key_tuple]
+        if _index_options(info) != options:
+            conflicting.append({"name": name, "declared": options, "actual": _index_options(info)})
+
+    extra = [name for key_tuple, (name, _) in existing_by_keys.items()
+             if key_tuple not in declared_keys and name != "_id_"]
+
+    return {"missing": missing, "conflicting": conflicting, "extra": extra}
+
+async def ensure_indexes() -> dict:
+    """Create any missing declared indexes and return the drift report.
+
+    Safe to run on every startup: existing indexes are left untouched and
+    conflicts (e.g. duplicate NRPs blocking a unique index) are only reported.
+    """
+    report = {}
+    for collection in await indexed_collections():
+        drift = await check_index_drift(collection)
+        created = []
+        failed = []
+        for spec in drift["missing"]:
+            try:
+                name = await db[collection].create_index(spec["keys"], **spec["options"])
+                created.append(name)
+            except OperationFailure as e:
+                failed.append({"keys": spec["keys"], "error": str(e)})
+
+        if created:
+            logger.info(f"Created indexes on {collection}: {', '.join(created)}")
+        for item in failed:
+            logger.warning(f"Failed to create index {item['keys']} on {collection}: {item['error']}")
+        for item in drift["conflicting"]:
+            logger.warning(f"Index drift on {collection}: {item['name']} declared {item['declared']}, actual {item['actual']}")
+        if drift["extra"]:
+            logger.info(f"Undeclared indexes on {collection}: {', '.join(drift['extra'])}")
+
+        report[collection] = {
+            "created": created,
+            "failed": failed,
+            "conflicting": drift["conflicting"],
+            "extra": drift["extra"]
+        }
+    return report
+
+@api_router.get("/admin/indexes")
+async def get_index_stats(user: dict = Depends(require_roles(UserRole.ADMIN))):
+    """Index usage statistics and drift against the declared indexes"""
+    result = {}
+    for collection in await indexed_collections():
+        try:
+            stats = await db[collection].aggregate([{"$indexStats": {}}]).to_list(100)
+        except OperationFailure:
+            stats = []
+        usage = {
+            s["name"]: {
+                "ops": s.get("accesses", {}).get("ops", 0),
+                "since": s.get("accesses", {}).get("since").isoformat() if s.get("accesses", {}).get("since") else None
+            }
+            for s in stats
+        }
+        drift = await check_index_drift(collection)
+        result[collection] = {
+            "usage": usage,
+            "missing": [spec["keys"] for spec in drift["missing"]],
+            "conflicting": drift["conflicting"],
+            "extra": drift["extra"]
+        }
+    return result
+
+@api_router.get("/admin/cache-stats")
+async def get_cache_stats(user: dict = Depends(require_roles(UserRole.ADMIN))):
+    """Hit/miss counters of the in-process caches of this worker, plus its audit log buffer"""
+    return {
+        "principal": principal_cache.stats(),
+        "count": count_cache.stats(),
+        "reference": reference_cache.stats(),
+        "audit_writer": audit_writer.stats()
+    }
 
 # Include router and middleware
 app.include_router(api_router)
@@ -1737,8 +4547,57 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
+@app.on_event("startup")
+async def startup_indexes():
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.error(f"Index bootstrap failed: {e}")
+
+@app.on_event("startup")
+async def startup_search_backfill():
+    async def run():
+        try:
+            await backfill_personel_search_fields()
+        except Exception as e:
+            logger.error(f"Search field backfill failed: {e}")
+    app.state.search_backfill_task = asyncio.create_task(run())
+
+@app.on_event("startup")
+async def startup_stats_reconcile():
+    app.state.stats_reconcile_task = asyncio.create_task(stats_reconcile_loop())
+
+@app.on_event("startup")
+async def startup_job_workers():
+    app.state.job_tasks = [asyncio.create_task(job_worker_loop()) for _ in range(JOB_WORKERS)]
+    app.state.job_tasks.append(asyncio.create_task(job_cleanup_loop()))
+
+@app.on_event("startup")
+async def startup_preview_cache():
+    app.state.preview_cache_task = asyncio.create_task(preview_cache_loop())
+
+@app.on_event("startup")
+async def startup_reference_cache():
+    app.state.reference_cache_task = asyncio.create_task(reference_cache_loop())
+
+@app.on_event("startup")
+async def startup_audit_writer():
+    audit_writer.start()
+    app.state.audit_retention_task = asyncio.create_task(audit_retention_loop())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.stats_reconcile_task.cancel()
+    app.state.search_backfill_task.cancel()
+    app.state.audit_retention_task.cancel()
+    app.state.reference_cache_task.cancel()
+    app.state.preview_cache_task.cancel()
+    for task in app.state.job_tasks:
+        task.cancel()
+    await audit_writer.stop()
+    password_executor.shutdown(wait=False)
+    pdf_render_pool.shutdown(wait=False, cancel_futures=True)
     client.close()
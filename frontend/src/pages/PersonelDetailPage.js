@@ -79,6 +79,39 @@ const InfoItem = ({ label, value, icon: Icon }) => (
   </div>
 );
 
+const PREVIEW_FILE_TYPES = ['.pdf', '.jpg', '.jpeg', '.png'];
+
+// Thumbnail from /documents/{id}/preview; keeps the file-type icon until it loads or if it fails
+const DocumentThumb = ({ api, doc, icon: Icon }) => {
+  const [src, setSrc] = useState(null);
+
+  useEffect(() => {
+    if (!PREVIEW_FILE_TYPES.includes(doc.file_type)) return undefined;
+    let url = null;
+    let cancelled = false;
+    api.get(`/documents/${doc.id}/preview`, { responseType: 'blob' })
+      .then(({ data }) => {
+        if (cancelled) return;
+        url = window.URL.createObjectURL(data);
+        setSrc(url);
+      })
+      .catch(() => {});
+    return () => {
+      cancelled = true;
+      if (url) window.URL.revokeObjectURL(url);
+    };
+  }, [api, doc.id, doc.file_type]);
+
+  if (src) {
+    return <img src={src} alt={doc.nama_file} className="w-12 h-12 object-cover rounded-lg" />;
+  }
+  return (
+    <div className="p-2 bg-[#4A5D23]/10 rounded-lg">
+      <Icon className="w-6 h-6 text-[#4A5D23]" />
+    </div>
+  );
+};
+
 export const PersonelDetailPage = () => {
   const { api, user } = useAuth();
   const { nrp } = useParams();
@@ -105,37 +138,21 @@ export const PersonelDetailPage = () => {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [
-          personelRes,
-          jabatanRes,
-          pangkatRes,
-          dikbangRes,
-          prestasiRes,
-          tandaJasaRes,
-          keluargaRes,
-          kesejahteraanRes,
-          documentsRes
-        ] = await Promise.all([
-          api.get(`/personel/${nrp}`),
-          api.get(`/personel/${nrp}/riwayat-jabatan`),
-          api.get(`/personel/${nrp}/riwayat-pangkat`),
-          api.get(`/personel/${nrp}/dikbang`),
-          api.get(`/personel/${nrp}/prestasi`),
-          api.get(`/personel/${nrp}/tanda-jasa`),
-          api.get(`/personel/${nrp}/keluarga`),
-          api.get(`/personel/${nrp}/kesejahteraan`),
-          api.get(`/personel/${nrp}/documents`)
-        ]);
+        const { data } = await api.get(`/personel/${nrp}/profile`, {
+          params: {
+            include: 'personel,riwayat_jabatan,riwayat_pangkat,dikbang,prestasi,tanda_jasa,keluarga,kesejahteraan,documents'
+          }
+        });
         
-        setPersonel(personelRes.data);
-        setRiwayatJabatan(jabatanRes.data);
-        setRiwayatPangkat(pangkatRes.data);
-        setDikbang(dikbangRes.data);
-        setPrestasi(prestasiRes.data);
-        setTandaJasa(tandaJasaRes.data);
-        setKeluarga(keluargaRes.data);
-        setKesejahteraan(kesejahteraanRes.data);
-        setDocuments(documentsRes.data || []);
+        setPersonel(data.personel);
+        setRiwayatJabatan(data.riwayat_jabatan);
+        setRiwayatPangkat(data.riwayat_pangkat);
+        setDikbang(data.dikbang);
+        setPrestasi(data.prestasi);
+        setTandaJasa(data.tanda_jasa);
+        setKeluarga(data.keluarga);
+        setKesejahteraan(data.kesejahteraan);
+        setDocuments(data.documents || []);
       } catch (error) {
         console.error('Error fetching personel:', error);
       } finally {
@@ -703,9 +720,7 @@ export const PersonelDetailPage = () => {
                         data-testid={`document-item-${doc.id}`}
                       >
                         <div className="flex items-center gap-4">
-                          <div className="p-2 bg-[#4A5D23]/10 rounded-lg">
-                            <DocIcon className="w-6 h-6 text-[#4A5D23]" />
-                          </div>
+                          <DocumentThumb api={api} doc={doc} icon={DocIcon} />
                           <div>
                             <p className="font-medium">{doc.nama_file}</p>
                             <div className="flex items-center gap-2 text-xs text-muted-foreground">
@@ -71,34 +71,20 @@ export const ProfilSayaPage = () => {
           return;
         }
 
-        const [
-          personelRes,
-          jabatanRes,
-          pangkatRes,
-          dikbangRes,
-          prestasiRes,
-          tandaJasaRes,
-          keluargaRes,
-          kesejahteraanRes
-        ] = await Promise.all([
-          api.get(`/personel/${nrp}`),
-          api.get(`/personel/${nrp}/riwayat-jabatan`),
-          api.get(`/personel/${nrp}/riwayat-pangkat`),
-          api.get(`/personel/${nrp}/dikbang`),
-          api.get(`/personel/${nrp}/prestasi`),
-          api.get(`/personel/${nrp}/tanda-jasa`),
-          api.get(`/personel/${nrp}/keluarga`),
-          api.get(`/personel/${nrp}/kesejahteraan`)
-        ]);
+        const { data } = await api.get(`/personel/${nrp}/profile`, {
+          params: {
+            include: 'personel,riwayat_jabatan,riwayat_pangkat,dikbang,prestasi,tanda_jasa,keluarga,kesejahteraan'
+          }
+        });
         
-        setPersonel(personelRes.data);
-        setRiwayatJabatan(jabatanRes.data);
-        setRiwayatPangkat(pangkatRes.data);
-        setDikbang(dikbangRes.data);
-        setPrestasi(prestasiRes.data);
-        setTandaJasa(tandaJasaRes.data);
-        setKeluarga(keluargaRes.data);
-        setKesejahteraan(kesejahteraanRes.data);
+        setPersonel(data.personel);
+        setRiwayatJabatan(data.riwayat_jabatan);
+        setRiwayatPangkat(data.riwayat_pangkat);
+        setDikbang(data.dikbang);
+        setPrestasi(data.prestasi);
+        setTandaJasa(data.tanda_jasa);
+        setKeluarga(data.keluarga);
+        setKesejahteraan(data.kesejahteraan);
       } catch (err) {
         console.error('Error fetching personel:', err);
         setError('Gagal memuat data. Silakan coba lagi.');
@@ -0,0 +1,60 @@
+"""
+Benchmark: audit log paging (skip/limit vs keyset cursor)
+
+Fills a throwaway audit_logs collection and times fetching pages at increasing
+depth with skip/limit and with paginate_keyset cursors. Skip cost grows with
+the page number; cursor pages should stay flat.
+
+Usage (needs a running MongoDB, uses a throwaway <DB_NAME>_bench database):
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=siparhanud_db \\
+        python tests/benchmarks/bench_audit_pagination.py [rows] [page_size]
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+
+import server  # noqa: E402
+
+
+async def main(rows: int, page_size: int):
+    server.db = server.client[f"{os.environ['DB_NAME']}_bench"]
+    await server.db.audit_logs.drop()
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for offset in range(0, rows, 10000):
+        await server.db.audit_logs.insert_many([
+            {"id": server.generate_id(), "action": "UPDATE_PERSONEL", "entity_type": "personel",
+             "timestamp": (start + timedelta(seconds=i // 3)).isoformat()}
+            for i in range(offset, min(offset + 10000, rows))
+        ])
+    await server.db.audit_logs.create_index([("timestamp", -1), ("id", -1)])
+
+    depths = [page for page in (1, 10, 100, 1000, 10000) if page * page_size < rows]
+    cursors = {}
+    cursor, page = None, 0
+    while page < depths[-1]:
+        _, cursor = await server.paginate_keyset(server.db.audit_logs, {}, server.AUDIT_LOG_SORT, {"_id": 0}, cursor, page_size)
+        page += 1
+        cursors[page] = cursor
+
+    for depth in depths:
+        started = time.perf_counter()
+        await server.db.audit_logs.find({}, {"_id": 0}).sort(server.AUDIT_LOG_SORT) \
+            .skip(depth * page_size).limit(page_size).to_list(page_size)
+        skip_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        await server.paginate_keyset(server.db.audit_logs, {}, server.AUDIT_LOG_SORT, {"_id": 0}, cursors[depth], page_size)
+        cursor_ms = (time.perf_counter() - started) * 1000
+        print(f"page {depth + 1:6d}  skip={skip_ms:9.2f} ms  cursor={cursor_ms:7.2f} ms")
+
+    await server.client.drop_database(f"{os.environ['DB_NAME']}_bench")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 100))
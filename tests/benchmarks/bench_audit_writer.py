@@ -0,0 +1,53 @@
+"""
+Benchmark: audit log writes (inline insert_one vs buffered insert_many)
+
+Times create_audit_log as seen by a request handler in each AUDIT_DURABILITY
+mode, then the time until every entry is actually stored. "sync" pays one
+round trip per call; "async" and "batched" take it off the request path, and
+"batched" also cuts the number of writes sent to MongoDB.
+
+Usage (needs a running MongoDB, uses a throwaway <DB_NAME>_bench database):
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=siparhanud_db \\
+        python tests/benchmarks/bench_audit_writer.py [entries]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+
+import server  # noqa: E402
+
+
+async def main(entries: int):
+    server.db = server.client[f"{os.environ['DB_NAME']}_bench"]
+    for mode in server.AuditWriter.MODES:
+        for partition in (await server.list_audit_collections())[0]:
+            await server.db.drop_collection(partition)
+        server.audit_partitions_ready.clear()
+        server.audit_writer = server.AuditWriter(mode, server.AUDIT_BATCH_SIZE,
+                                                 server.AUDIT_FLUSH_INTERVAL_SECONDS, server.AUDIT_QUEUE_MAX_SIZE)
+        server.audit_writer.start()
+
+        timings = []
+        started = time.perf_counter()
+        for i in range(entries):
+            call_started = time.perf_counter()
+            await server.create_audit_log("bench", "bench", "UPDATE_PERSONEL", "personel", str(i),
+                                          {"pangkat": "SERDA"}, {"pangkat": "SERTU"})
+            timings.append((time.perf_counter() - call_started) * 1000)
+        await server.audit_writer.stop()
+        total_ms = (time.perf_counter() - started) * 1000
+
+        assert await server.count_audit_logs({}, "exact") == entries
+        print(f"{mode:8s} per call p50={statistics.median(timings):7.3f} ms  "
+              f"max={max(timings):8.2f} ms  all stored after {total_ms:9.1f} ms")
+
+    await server.client.drop_database(f"{os.environ['DB_NAME']}_bench")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000))
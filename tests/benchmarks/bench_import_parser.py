@@ -0,0 +1,143 @@
+"""
+Benchmark: Data Personel sheet parsing (per-row scan vs PersonelSheetParser)
+
+Parses a generated workbook with the previous iterrows()/get_val loop and with
+the vectorized PersonelSheetParser, checks that both yield the same rows and
+field values, and prints the wall time of each. It then compares reading the
+whole sheet with pd.read_excel against streaming it in blocks with
+open_workbook_blocks (time and tracemalloc peak). No database is needed.
+
+Usage:
+    python tests/benchmarks/bench_import_parser.py [rows]
+"""
+import io
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+
+import server  # noqa: E402
+
+HEADER = ["NO", "NAMA", "PANGKAT", "NRP", "TMT PANGKAT", "JABATAN", "TMT JABATAN", "TEMPAT LAHIR",
+          "TGL LAHIR", "DIKBANGUM", "TAHUN", "DIKBANGSPES", "PRESTASI"]
+
+
+def make_workbook(rows: int) -> bytes:
+    """Three sections with sub-headers, numeric NRPs, empty and 'nan' cells"""
+    width = len(HEADER)
+    data = [["DATA PERSONEL ARHANUD"] + [None] * (width - 1)]
+    sections = [("PERWIRA", 0, rows // 3), ("BINTARA", rows // 3, 2 * rows // 3), ("TAMTAMA", 2 * rows // 3, rows)]
+    for kategori, start, end in sections:
+        data.append([kategori] + [None] * (width - 1))
+        data.append(HEADER)
+        data.append([str(i) for i in range(1, width + 1)])
+        for i in range(start, end):
+            data.append([
+                i + 1, f"PERSONEL {i}", "SERDA", 31000000000000 + i if i % 2 else f"3100{i:010d}",
+                None if i % 5 == 0 else "01-04-2020", "BATI", "01-10-2021", "MALANG",
+                "N/A" if i % 7 == 0 else datetime(1990, 1, 1 + i % 28), "1. SECABA, 2. SUSBA", "2010",
+                "SUSPA ARH" if i % 4 else None, "JUARA 1" if i % 3 == 0 else None,
+            ])
+            if i % 500 == 0:
+                data.append(["JUMLAH"] + [None] * (width - 1))
+    output = io.BytesIO()
+    pd.DataFrame(data).to_excel(output, header=False, index=False)
+    return output.getvalue()
+
+
+def parse_rows_before(df_raw):
+    """The previous implementation: stringify, join and rescan every row"""
+    rows = []
+    current_kategori = None
+    header_row = None
+    columns = []
+    for idx, row in df_raw.iterrows():
+        row_values = [str(v).strip() if pd.notna(v) else '' for v in row]
+        row_text = ' '.join(row_values).upper()
+        marker = next((m for m in ('PERWIRA', 'BINTARA', 'TAMTAMA') if m in row_text and len(row_text) < 20), None)
+        if marker:
+            current_kategori = marker
+            header_row = None
+            continue
+        if 'NRP' in row_text and 'NAMA' in row_text:
+            header_row = idx
+            columns = row_values
+            continue
+        if header_row is None or current_kategori is None:
+            continue
+        if any(x in row_text for x in ['URT', 'BAG', '1 2 3 4 5']):
+            continue
+        nrp_idx = next((i for i, col in enumerate(columns) if 'NRP' in col.upper()), None)
+        if nrp_idx is None or nrp_idx >= len(row_values):
+            continue
+        nrp = row_values[nrp_idx]
+        if not nrp or not any(c.isdigit() for c in nrp) or len(nrp) < 5:
+            continue
+
+        def get_val(col_name):
+            for i, col in enumerate(columns):
+                if col_name.upper() in col.upper() and i < len(row_values):
+                    val = row_values[i]
+                    if val and val.lower() != 'nan':
+                        return val
+            return ''
+
+        rows.append((idx, nrp, {field: get_val(field) for field in server.IMPORT_FIELDS}, current_kategori))
+    return rows
+
+
+def parse_rows_after(df_raw):
+    return list(server.PersonelSheetParser().feed(df_raw))
+
+
+def read_whole(path):
+    yield from server.PersonelSheetParser().feed(pd.read_excel(path, header=None))
+
+
+def read_streaming(path):
+    parser = server.PersonelSheetParser()
+    _, blocks = server.open_workbook_blocks(path, server.IMPORT_BATCH_SIZE)
+    for block in blocks:
+        yield from parser.feed(block)
+
+
+def main(rows: int):
+    content = make_workbook(rows)
+    df_raw = pd.read_excel(io.BytesIO(content), header=None)
+    results = {}
+    for label, parse in [("before (iterrows + get_val)", parse_rows_before),
+                         ("after (PersonelSheetParser)", parse_rows_after)]:
+        started = time.perf_counter()
+        results[label] = parse(df_raw)
+        elapsed = time.perf_counter() - started
+        print(f"{label:30s} rows={len(results[label]):6d} time={elapsed * 1000:9.1f} ms")
+
+    before, after = results.values()
+    assert before == after, "parsers disagree"
+    print("parsed rows identical")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "personel.xlsx"
+        path.write_bytes(content)
+        for label, read in [("pd.read_excel (whole sheet)", read_whole),
+                            ("open_workbook_blocks", read_streaming)]:
+            started = time.perf_counter()
+            assert list(read(path)) == after, f"{label} disagrees"
+            elapsed = time.perf_counter() - started
+
+            # Rows are consumed, not kept, as the importer does
+            tracemalloc.start()
+            count = sum(1 for _ in read(path))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{label:30s} rows={count:6d} time={elapsed * 1000:9.1f} ms peak={peak / 2**20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
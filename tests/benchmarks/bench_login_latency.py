@@ -0,0 +1,74 @@
+"""
+Load test: latency of non-auth endpoints during a burst of concurrent logins
+
+Fires `logins` concurrent POST /api/auth/login calls (bcrypt verification) while
+a probe client keeps calling GET /api/personel/stats, and prints p50/p99 of the
+probe requests plus how many logins were shed with 503.
+
+Usage (against a running server initialised with /api/init/setup):
+    REACT_APP_BACKEND_URL=http://localhost:8001 \\
+        python tests/benchmarks/bench_login_latency.py [logins] [concurrency]
+"""
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001').rstrip('/')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def login():
+    response = requests.post(f"{BASE_URL}/api/auth/login", json={"username": "staff1", "password": "staff123"})
+    return response.status_code
+
+
+def probe(headers, stop, samples):
+    session = requests.Session()
+    while not stop.is_set():
+        started = time.perf_counter()
+        session.get(f"{BASE_URL}/api/personel/stats", headers=headers)
+        samples.append((time.perf_counter() - started) * 1000)
+
+
+def run(logins, concurrency, label):
+    token = requests.post(f"{BASE_URL}/api/auth/login", json={"username": "admin", "password": "admin123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    samples = []
+    stop = threading.Event()
+    prober = threading.Thread(target=probe, args=(headers, stop, samples))
+    prober.start()
+
+    statuses = []
+    started = time.perf_counter()
+    if logins:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            statuses = list(pool.map(lambda _: login(), range(logins)))
+    else:
+        time.sleep(3)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    prober.join()
+
+    print(f"{label:20s} logins={logins:4d} ok={statuses.count(200):4d} shed_503={statuses.count(503):4d} "
+          f"wall={elapsed:6.2f}s probe_n={len(samples):5d} "
+          f"p50={statistics.median(samples):8.1f} ms p99={percentile(samples, 99):8.1f} ms")
+
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    run(0, concurrency, "idle baseline")
+    run(logins, concurrency, "during login burst")
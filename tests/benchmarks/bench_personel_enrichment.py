@@ -0,0 +1,81 @@
+"""
+Benchmark: personel enrichment of pengajuan rows (N+1 find_one vs single $in)
+
+Counts MongoDB round trips and wall time for decorating pengajuan records with
+nama_lengkap/pangkat, as done by /api/pengajuan and /api/reports/mutasi.
+
+Usage (needs a running MongoDB, uses a throwaway <DB_NAME>_bench database):
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=siparhanud_db \\
+        python tests/benchmarks/bench_personel_enrichment.py [rows]
+"""
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from pymongo import monitoring
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+counter = CommandCounter()
+monitoring.register(counter)
+
+import server  # noqa: E402
+
+
+async def enrich_one_by_one(items):
+    """The previous implementation: one find_one per row"""
+    for item in items:
+        personel = await server.db.personel.find_one({"nrp": item.get("nrp")}, {"_id": 0, "nama_lengkap": 1, "pangkat": 1})
+        if personel:
+            item["nama_lengkap"] = personel.get("nama_lengkap")
+            item["pangkat"] = personel.get("pangkat")
+    return items
+
+
+async def main(rows: int):
+    server.db = server.client[f"{os.environ['DB_NAME']}_bench"]
+    await server.db.personel.drop()
+    await server.db.pengajuan.drop()
+    await server.db.personel.create_index("nrp", unique=True)
+
+    await server.db.personel.insert_many([
+        {"nrp": f"BENCH{i:08d}", "nama_lengkap": f"Personel {i}", "pangkat": "SERDA"}
+        for i in range(rows)
+    ])
+    await server.db.pengajuan.insert_many([
+        {"id": server.generate_id(), "nrp": f"BENCH{i:08d}", "jenis_pengajuan": "mutasi", "status": "pending"}
+        for i in range(rows)
+    ])
+
+    for label, enrich in [("before (find_one per row)", enrich_one_by_one),
+                          ("after (attach_personel_fields)", server.attach_personel_fields)]:
+        items = await server.db.pengajuan.find({}, {"_id": 0}).to_list(rows)
+        counter.count = 0
+        started = time.perf_counter()
+        await enrich(items)
+        elapsed = time.perf_counter() - started
+        assert all(item.get("nama_lengkap") for item in items)
+        print(f"{label:34s} rows={rows:6d} round_trips={counter.count:6d} time={elapsed * 1000:9.1f} ms")
+
+    await server.client.drop_database(f"{os.environ['DB_NAME']}_bench")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000))
@@ -0,0 +1,82 @@
+"""
+Benchmark: personel Excel import (row-at-a-time vs batched insert_many)
+
+Counts MongoDB round trips and wall time for import_personel_workbook on a
+generated Data Personel workbook. IMPORT_BATCH_SIZE=1 approximates the previous
+per-row find_one/insert_one behaviour; the default batch size is the new path.
+
+Usage (needs a running MongoDB, uses a throwaway <DB_NAME>_bench database):
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=siparhanud_db \\
+        python tests/benchmarks/bench_personel_import.py [rows]
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+from pymongo import monitoring
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+counter = CommandCounter()
+monitoring.register(counter)
+
+import server  # noqa: E402
+
+HEADER = ["NO", "NAMA", "PANGKAT", "NRP", "TMT", "JABATAN", "LAHIR", "DIKBANGUM", "DIKBANGSPES", "PRESTASI"]
+
+
+def make_workbook(rows: int) -> bytes:
+    data = []
+    for kategori, start, end in [("PERWIRA", 0, rows // 3), ("BINTARA", rows // 3, 2 * rows // 3), ("TAMTAMA", 2 * rows // 3, rows)]:
+        data += [[kategori] + [None] * 9, HEADER, [str(i) for i in range(1, 11)]]
+        for i in range(start, end):
+            data.append([str(i + 1), f"PERSONEL {i}", "SERDA", f"BENCH{i:08d}", "01-01-2020", "BATI",
+                         "01-01-1990", "1. SECABA, 2. SUSBA", "SUSPA ARH", "JUARA 1" if i % 3 == 0 else None])
+    output = io.BytesIO()
+    pd.DataFrame(data).to_excel(output, header=False, index=False)
+    return output.getvalue()
+
+
+async def main(rows: int):
+    server.db = server.client[f"{os.environ['DB_NAME']}_bench"]
+    content = make_workbook(rows)
+    user = {"id": "bench", "username": "bench"}
+    default_batch_size = server.IMPORT_BATCH_SIZE
+
+    for label, batch_size in [("before (row at a time)", 1), (f"after (batch {default_batch_size})", default_batch_size)]:
+        for name in ("personel", "dikbang", "prestasi", "stats_snapshot", "audit_logs"):
+            await server.db[name].drop()
+        await server.db.personel.create_index("nrp", unique=True)
+
+        server.IMPORT_BATCH_SIZE = batch_size
+        counter.count = 0
+        started = time.perf_counter()
+        result = await server.import_personel_workbook(content, user)
+        elapsed = time.perf_counter() - started
+        assert result["imported"] == rows, result
+        print(f"{label:26s} rows={rows:6d} round_trips={counter.count:6d} time={elapsed * 1000:9.1f} ms")
+
+    await server.client.drop_database(f"{os.environ['DB_NAME']}_bench")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 3000))
@@ -0,0 +1,90 @@
+"""
+Benchmark: personel search (unanchored $regex vs indexed word-prefix search)
+
+Times GET /api/personel search queries (page + count) on a generated collection,
+once with the previous case-insensitive $regex on nama_lengkap/nrp and once with
+personel_search_query/search_personel, and prints p50/p99 latency per query set.
+
+Usage (needs a running MongoDB, uses a throwaway <DB_NAME>_bench database):
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=siparhanud_db \\
+        python tests/benchmarks/bench_personel_search.py [docs] [queries]
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+
+import server  # noqa: E402
+
+FIRST_NAMES = ["AGUS", "BUDI", "DEDI", "EKO", "HARI", "JOKO", "RUDI", "SITI", "WAHYU", "YUDI", "ANDI", "BAYU"]
+LAST_NAMES = ["SANTOSO", "WIBOWO", "SETIAWAN", "PRASETYO", "NUGROHO", "HIDAYAT", "SAPUTRA", "KURNIAWAN"]
+PAGE_SIZE = 100
+
+
+def make_name(i: int) -> str:
+    rng = random.Random(i)
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)[:3]}{i % 997}"
+
+
+async def search_before(search: str):
+    query = {"$or": [
+        {"nama_lengkap": {"$regex": search, "$options": "i"}},
+        {"nrp": {"$regex": search, "$options": "i"}}
+    ]}
+    data = await server.db.personel.find(query, {"_id": 0}).limit(PAGE_SIZE).to_list(PAGE_SIZE)
+    total = await server.db.personel.count_documents(query)
+    return data, total
+
+
+async def search_after(search: str):
+    query, score = server.personel_search_query(search)
+    data = await server.search_personel(query, score, 0, PAGE_SIZE)
+    total = await server.db.personel.count_documents(query)
+    return data, total
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+async def main(docs: int, queries: int):
+    server.db = server.client[f"{os.environ['DB_NAME']}_bench"]
+    await server.db.personel.drop()
+    for start in range(0, docs, 10000):
+        await server.db.personel.insert_many([
+            {"nrp": f"{31000000000000 + i}", "nama_lengkap": make_name(i), "kategori": "BINTARA",
+             **server.personel_search_fields(make_name(i))}
+            for i in range(start, min(start + 10000, docs))
+        ])
+    await server.db.personel.create_index("nrp", unique=True)
+    await server.db.personel.create_index("search_prefixes")
+
+    rng = random.Random(0)
+    query_sets = {
+        "name prefix (keystrokes)": [rng.choice(FIRST_NAMES)[:rng.randint(2, 4)] for _ in range(queries)],
+        "two words": [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)[:3]}" for _ in range(queries)],
+        "nrp prefix": [f"{31000000000000 + rng.randrange(docs)}"[:rng.randint(8, 14)] for _ in range(queries)],
+    }
+
+    for set_name, searches in query_sets.items():
+        for label, search in [("before ($regex)", search_before), ("after (prefix index)", search_after)]:
+            timings = []
+            for value in searches:
+                started = time.perf_counter()
+                await search(value)
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f"{set_name:26s} {label:22s} p50={statistics.median(timings):8.2f} ms "
+                  f"p99={percentile(timings, 99):8.2f} ms")
+
+    await server.client.drop_database(f"{os.environ['DB_NAME']}_bench")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 200))
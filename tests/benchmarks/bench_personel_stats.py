@@ -0,0 +1,103 @@
+"""
+Benchmark: /personel/stats sequential queries vs the stats_snapshot counters
+
+Seeds a synthetic personel/pengajuan dataset and prints p50/p99 latency of the
+previous six-query implementation and of get_personel_stats(), which reads the
+materialized counters (built by the warm-up call).
+
+Usage (needs a running MongoDB, uses a throwaway <DB_NAME>_bench database):
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=siparhanud_db \\
+        python tests/benchmarks/bench_personel_stats.py [personel] [iterations]
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+
+import server  # noqa: E402
+
+PANGKAT = ["LETDA", "LETTU", "KAPTEN", "MAYOR", "LETKOL", "SERDA", "SERTU", "SERKA", "SERMA", "KOPDA", "KOPTU", "KOPKA"]
+KATEGORI = ["PERWIRA", "BINTARA", "TAMTAMA", "PNS"]
+STATUS = ["AKTIF"] * 8 + ["PENSIUN", "MUTASI"]
+
+
+async def stats_sequential():
+    """The previous implementation: six sequential round trips"""
+    db = server.db
+    total = await db.personel.count_documents({})
+    aktif = await db.personel.count_documents({"status_personel": "AKTIF"})
+    by_kategori = await db.personel.aggregate([
+        {"$group": {"_id": "$kategori", "count": {"$sum": 1}}}
+    ]).to_list(10)
+    by_pangkat = await db.personel.aggregate([
+        {"$match": {"status_personel": "AKTIF"}},
+        {"$group": {"_id": "$pangkat", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": 15}
+    ]).to_list(15)
+    by_satuan = await db.personel.aggregate([
+        {"$match": {"status_personel": "AKTIF"}},
+        {"$group": {"_id": "$satuan_induk", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": 10}
+    ]).to_list(10)
+    pending_pengajuan = await db.pengajuan.count_documents({"status": "pending"})
+    return total, aktif, by_kategori, by_pangkat, by_satuan, pending_pengajuan
+
+
+async def measure(label, func, iterations):
+    await func()  # warm up
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(round(0.99 * (len(samples) - 1))))]
+    print(f"{label:28s} n={iterations:4d} p50={statistics.median(samples):8.1f} ms p99={p99:8.1f} ms")
+
+
+async def main(rows: int, iterations: int):
+    bench_db = f"{os.environ['DB_NAME']}_bench"
+    server.db = server.client[bench_db]
+    await server.client.drop_database(bench_db)
+    await server.ensure_indexes()
+
+    random.seed(42)
+    batch = []
+    for i in range(rows):
+        batch.append({
+            "id": server.generate_id(),
+            "nrp": f"BENCH{i:08d}",
+            "nama_lengkap": f"Personel {i}",
+            "kategori": random.choice(KATEGORI),
+            "pangkat": random.choice(PANGKAT),
+            "status_personel": random.choice(STATUS),
+            "satuan_induk": f"YONARHANUD {random.randint(1, 40)}"
+        })
+        if len(batch) == 5000:
+            await server.db.personel.insert_many(batch)
+            batch = []
+    if batch:
+        await server.db.personel.insert_many(batch)
+    await server.db.pengajuan.insert_many([
+        {"id": server.generate_id(), "nrp": f"BENCH{i:08d}", "status": random.choice(["pending", "approved"])}
+        for i in range(rows // 10)
+    ])
+
+    await measure("before (6 sequential)", stats_sequential, iterations)
+    await measure("after (stats_snapshot)", lambda: server.get_personel_stats({}), iterations)
+
+    await server.client.drop_database(bench_db)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    ))
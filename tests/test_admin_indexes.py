@@ -0,0 +1,51 @@
+"""
+Test suite for SIPARHANUD database index management
+- Index usage statistics and drift report (admin only)
+"""
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestAdminIndexes:
+    """Test /api/admin/indexes endpoint"""
+
+    @pytest.fixture(scope="class")
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        return response.json()["access_token"]
+
+    @pytest.fixture(scope="class")
+    def staff_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "staff1",
+            "password": "staff123"
+        })
+        return response.json()["access_token"]
+
+    def test_index_stats_admin(self, admin_token):
+        """Declared indexes are applied at startup and reported with usage"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        # reading audit logs flushes the login entry into this month's partition
+        requests.get(f"{BASE_URL}/api/audit-logs?limit=1", headers=headers)
+        response = requests.get(f"{BASE_URL}/api/admin/indexes", headers=headers)
+
+        assert response.status_code == 200, f"Get index stats failed: {response.text}"
+        data = response.json()
+        assert "personel" in data
+        partitions = [name for name in data if name.startswith("audit_logs_")]
+        assert partitions
+        assert data["personel"]["missing"] == []
+        assert "nrp_1" in data["personel"]["usage"]
+        assert "entity_type_1_timestamp_-1_id_-1" in data[max(partitions)]["usage"]
+
+    def test_index_stats_staff_forbidden(self, staff_token):
+        """Non-admin users cannot read index stats"""
+        headers = {"Authorization": f"Bearer {staff_token}"}
+        response = requests.get(f"{BASE_URL}/api/admin/indexes", headers=headers)
+        assert response.status_code == 403, f"Expected 403, got {response.status_code}"
@@ -0,0 +1,60 @@
+"""
+Test suite for SIPARHANUD audit log writer
+- Entries written through the buffered writer show up on /audit-logs right away
+- Entries store field-level changes instead of full snapshots
+- Writer mode and buffer size are reported to admins
+"""
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestAuditLog:
+    """Test the audit log pipeline"""
+
+    @pytest.fixture(scope="class")
+    def admin_headers(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def test_entry_visible_after_write(self, admin_headers):
+        """A mutation's audit entry is returned by the next /audit-logs call"""
+        nrp = f"77{uuid.uuid4().int % 10**10:010d}"
+        response = requests.post(f"{BASE_URL}/api/personel", headers=admin_headers, json={
+            "nrp": nrp, "nama_lengkap": "Test Audit", "kategori": "BINTARA", "pangkat": "SERDA",
+            "status_personel": "AKTIF"
+        })
+        assert response.status_code == 200, response.text
+
+        logs = requests.get(f"{BASE_URL}/api/audit-logs?entity_type=personel&limit=20",
+                            headers=admin_headers).json()
+        assert any(log["entity_id"] == nrp and log["action"].startswith("CREATE") for log in logs)
+
+    def test_update_stores_changed_fields(self, admin_headers):
+        nrp = f"77{uuid.uuid4().int % 10**10:010d}"
+        requests.post(f"{BASE_URL}/api/personel", headers=admin_headers, json={
+            "nrp": nrp, "nama_lengkap": "Test Audit", "kategori": "BINTARA", "pangkat": "SERDA",
+            "status_personel": "AKTIF"
+        })
+        response = requests.put(f"{BASE_URL}/api/personel/{nrp}", headers=admin_headers,
+                                json={"pangkat": "SERTU", "nama_lengkap": "Test Audit"})
+        assert response.status_code == 200
+
+        logs = requests.get(f"{BASE_URL}/api/audit-logs?entity_type=personel&limit=20",
+                            headers=admin_headers).json()
+        update = next(log for log in logs if log["entity_id"] == nrp and log["action"] == "UPDATE_PERSONEL")
+        assert update["changes"] == {"pangkat": {"old": "SERDA", "new": "SERTU"}}
+        assert "old_value" not in update and "new_value" not in update
+
+    def test_writer_stats(self, admin_headers):
+        response = requests.get(f"{BASE_URL}/api/admin/cache-stats", headers=admin_headers)
+        assert response.status_code == 200
+        stats = response.json()["audit_writer"]
+        assert stats["mode"] in ("sync", "async", "batched")
+        assert stats["pending"] >= 0
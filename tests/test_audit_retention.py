@@ -0,0 +1,108 @@
+"""
+Test suite for SIPARHANUD audit log retention
+- Old partitions are archived to gzip JSON lines and dropped
+- Archiving only drops a partition while this process holds the retention lease
+- A lost lease cancels the running retention pass
+
+Runs in-process against MongoDB (needs MONGO_URL and DB_NAME, uses a throwaway
+<DB_NAME>_retention database).
+"""
+import asyncio
+import gzip
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+if not os.environ.get("MONGO_URL") or not os.environ.get("DB_NAME"):
+    pytest.skip("needs MONGO_URL and DB_NAME", allow_module_level=True)
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import server  # noqa: E402
+
+PARTITION = "audit_logs_2000_01"
+
+
+def run(test, tmp_path):
+    async def main():
+        server.client = server.AsyncIOMotorClient(os.environ["MONGO_URL"])
+        server.db = server.client[f"{os.environ['DB_NAME']}_retention"]
+        server.AUDIT_ARCHIVE_DIR = tmp_path
+        await server.db.leases.create_index("name", unique=True)
+        try:
+            await test()
+        finally:
+            await server.client.drop_database(f"{os.environ['DB_NAME']}_retention")
+    asyncio.run(main())
+
+
+async def seed_partition(count=3):
+    await server.db[PARTITION].insert_many([
+        {"id": f"log-{i}", "timestamp": f"2000-01-0{count - i}T00:00:00+00:00", "action": "UPDATE_PERSONEL"}
+        for i in range(count)
+    ])
+
+
+def test_archive_partition(tmp_path):
+    async def test():
+        await seed_partition()
+        assert await server.acquire_lease(server.AUDIT_RETENTION_LEASE, 60)
+        path = await server.archive_audit_partition(PARTITION)
+
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            logs = [json.loads(line) for line in f]
+        assert [log["id"] for log in logs] == ["log-2", "log-1", "log-0"]
+        assert PARTITION not in await server.db.list_collection_names()
+    run(test, tmp_path)
+
+
+def test_archive_needs_lease(tmp_path):
+    """Without the lease the partition stays and no archive file is left behind"""
+    async def test():
+        await seed_partition()
+        with pytest.raises(server.LeaseLost):
+            await server.archive_audit_partition(PARTITION)
+        assert await server.db[PARTITION].count_documents({}) == 3
+        assert list(tmp_path.iterdir()) == []
+    run(test, tmp_path)
+
+
+def test_lease_held_elsewhere(tmp_path):
+    async def test():
+        await server.db.leases.insert_one({"name": "test", "owner": "other", "expires_at": "9999-01-01T00:00:00+00:00"})
+        ran = []
+
+        async def work():
+            ran.append(True)
+        assert await server.run_with_lease("test", 60, work) is None
+        assert ran == []
+
+        # an expired lease is taken over
+        await server.db.leases.update_one({"name": "test"}, {"$set": {"expires_at": "2000-01-01T00:00:00+00:00"}})
+        assert await server.run_with_lease("test", 60, work) is None
+        assert ran == [True]
+        assert await server.db.leases.count_documents({}) == 0
+    run(test, tmp_path)
+
+
+def test_lost_lease_cancels_work(tmp_path):
+    async def test():
+        cancelled = asyncio.Event()
+
+        async def work():
+            # another process takes the lease over while this one is working
+            await server.db.leases.update_one({"name": "test"}, {"$set": {"owner": "other"}})
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with pytest.raises(server.LeaseLost):
+            await server.run_with_lease("test", 0.3, work)
+        assert cancelled.is_set()
+        assert (await server.db.leases.find_one({"name": "test"}))["owner"] == "other"
+    run(test, tmp_path)
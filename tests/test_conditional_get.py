@@ -0,0 +1,84 @@
+"""
+Test suite for SIPARHANUD conditional GETs
+- Reference data ETag / Last-Modified follow the collection version
+- Personel reads answer 304 while unchanged
+- Cache-Control per route
+- Reference data is served from the in-memory cache
+"""
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestConditionalGet:
+    """Test ETag, Last-Modified and Cache-Control on read endpoints"""
+
+    @pytest.fixture(scope="class")
+    def admin_headers(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def test_reference_etag(self, admin_headers):
+        """A write to the reference collection changes its ETag"""
+        url = f"{BASE_URL}/api/reference/korps"
+        response = requests.get(url, headers=admin_headers)
+        assert response.status_code == 200
+        assert "no-cache" in response.headers["Cache-Control"]
+        etag = response.headers["ETag"]
+
+        response = requests.get(url, headers={**admin_headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+        kode = f"K{uuid.uuid4().hex[:6]}"
+        created = requests.post(url, headers=admin_headers, json={"kode": kode, "nama": kode, "urutan": 99})
+        assert created.status_code == 200
+        response = requests.get(url, headers={**admin_headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert kode in [item["kode"] for item in response.json()]
+
+        last_modified = response.headers["Last-Modified"]
+        response = requests.get(url, headers={**admin_headers, "If-Modified-Since": last_modified})
+        assert response.status_code == 304
+
+        requests.delete(f"{url}/{created.json()['id']}", headers=admin_headers)
+        response = requests.get(url, headers={**admin_headers, "If-None-Match": etag})
+        assert response.status_code == 200
+
+    def test_personel_sub_resource_etag(self, admin_headers):
+        nrp = f"55{uuid.uuid4().int % 10**10:010d}"
+        requests.post(f"{BASE_URL}/api/personel", headers=admin_headers, json={
+            "nrp": nrp, "nama_lengkap": "Test Etag", "kategori": "BINTARA", "pangkat": "SERDA"
+        })
+        url = f"{BASE_URL}/api/personel/{nrp}/keluarga"
+        response = requests.get(url, headers=admin_headers)
+        assert response.json() == []
+        etag = response.headers["ETag"]
+        assert requests.get(url, headers={**admin_headers, "If-None-Match": f'W/{etag}'}).status_code == 304
+
+        requests.post(url, headers=admin_headers, json={"nama": "Test Anak", "hubungan": "ANAK"})
+        response = requests.get(url, headers={**admin_headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert len(response.json()) == 1
+
+        response = requests.get(f"{BASE_URL}/api/personel/{nrp}", headers=admin_headers)
+        assert response.status_code == 200
+        assert response.json()["nrp"] == nrp
+        assert requests.get(f"{BASE_URL}/api/personel/{nrp}", headers={
+            **admin_headers, "If-None-Match": response.headers["ETag"]}).status_code == 304
+
+    def test_reference_served_from_cache(self, admin_headers):
+        requests.get(f"{BASE_URL}/api/reference/agama", headers=admin_headers)
+        before = requests.get(f"{BASE_URL}/api/admin/cache-stats", headers=admin_headers).json()["reference"]
+        for _ in range(3):
+            assert requests.get(f"{BASE_URL}/api/reference/agama", headers=admin_headers).status_code == 200
+        after = requests.get(f"{BASE_URL}/api/admin/cache-stats", headers=admin_headers).json()["reference"]
+        assert after["hits"] >= before["hits"] + 3
+        assert "ref_agama" in after["versions"]
@@ -0,0 +1,115 @@
+"""
+Test suite for SIPARHANUD document ZIP bundles
+- One personel's or one satuan_induk's documents as a streamed ZIP
+- Stored vs deflated entries
+- Range / If-Range resume and ETag
+"""
+import pytest
+import requests
+import os
+import io
+import uuid
+import zipfile
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestDocumentBundle:
+    """Test GET /api/documents/bundle"""
+
+    @pytest.fixture(scope="class")
+    def admin_headers(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    @pytest.fixture(scope="class")
+    def unit(self, admin_headers):
+        """A satuan with two personel; the first has a PDF and a Word document"""
+        satuan = f"YON TEST {uuid.uuid4().hex[:6]}"
+        nrps = [f"68{uuid.uuid4().int % 10**10:010d}" for _ in range(2)]
+        for nrp in nrps:
+            response = requests.post(f"{BASE_URL}/api/personel", headers=admin_headers, json={
+                "nrp": nrp, "nama_lengkap": "Test Bundle", "kategori": "BINTARA", "pangkat": "SERDA",
+                "status_personel": "AKTIF", "satuan_induk": satuan
+            })
+            assert response.status_code == 200, response.text
+        files = {
+            f"{nrps[0]}/sk.pdf": b"%PDF-1.4\n" + os.urandom(200000),
+            f"{nrps[0]}/surat.doc": b"Surat keterangan " * 5000,
+            f"{nrps[1]}/ijazah.pdf": b"%PDF-1.4\n" + os.urandom(1000),
+        }
+        for name, content in files.items():
+            nrp, filename = name.split("/")
+            response = requests.post(f"{BASE_URL}/api/personel/{nrp}/documents", headers=admin_headers,
+                                     files={"file": (filename, io.BytesIO(content))}, params={"jenis_dokumen": "LAINNYA"})
+            assert response.status_code == 200, response.text
+        return satuan, nrps, files
+
+    def test_personel_bundle(self, admin_headers, unit):
+        _, nrps, files = unit
+        response = requests.get(f"{BASE_URL}/api/documents/bundle", headers=admin_headers, params={"nrp": nrps[0]})
+        assert response.status_code == 200, response.text
+        assert response.headers["Content-Type"] == "application/zip"
+        assert int(response.headers["Content-Length"]) == len(response.content)
+
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        assert archive.testzip() is None
+        assert sorted(archive.namelist()) == sorted(name for name in files if name.startswith(nrps[0]))
+        for name in archive.namelist():
+            assert archive.read(name) == files[name]
+        assert archive.getinfo(f"{nrps[0]}/sk.pdf").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo(f"{nrps[0]}/surat.doc").compress_type == zipfile.ZIP_DEFLATED
+
+    def test_satuan_bundle(self, admin_headers, unit):
+        satuan, _, files = unit
+        response = requests.get(f"{BASE_URL}/api/documents/bundle", headers=admin_headers, params={"satuan_induk": satuan})
+        assert response.status_code == 200, response.text
+        assert sorted(zipfile.ZipFile(io.BytesIO(response.content)).namelist()) == sorted(files)
+
+    def test_resume_with_range(self, admin_headers, unit):
+        """A dropped download continues from the last byte received"""
+        _, nrps, _ = unit
+        url = f"{BASE_URL}/api/documents/bundle?nrp={nrps[0]}"
+        full = requests.get(url, headers=admin_headers)
+        etag = full.headers["ETag"]
+
+        first = requests.get(url, headers={**admin_headers, "Range": "bytes=0-150000"})
+        assert first.status_code == 206
+        rest = requests.get(url, headers={**admin_headers, "Range": "bytes=150001-", "If-Range": etag})
+        assert rest.status_code == 206
+        assert rest.headers["Content-Range"] == f"bytes 150001-{len(full.content) - 1}/{len(full.content)}"
+        assert first.content + rest.content == full.content
+
+        stale = requests.get(url, headers={**admin_headers, "Range": "bytes=150001-", "If-Range": '"stale"'})
+        assert stale.status_code == 200
+        assert requests.get(url, headers={**admin_headers, "If-None-Match": etag}).status_code == 304
+
+    def test_bundle_errors(self, admin_headers, unit):
+        satuan, nrps, _ = unit
+        response = requests.get(f"{BASE_URL}/api/documents/bundle", headers=admin_headers)
+        assert response.status_code == 400
+        response = requests.get(f"{BASE_URL}/api/documents/bundle", headers=admin_headers,
+                                params={"nrp": nrps[0], "satuan_induk": satuan})
+        assert response.status_code == 400
+        response = requests.get(f"{BASE_URL}/api/documents/bundle", headers=admin_headers,
+                                params={"satuan_induk": f"KOSONG {uuid.uuid4().hex[:6]}"})
+        assert response.status_code == 404
+
+    def test_filename_is_sanitized(self, admin_headers):
+        """Query values never reach Content-Disposition unescaped"""
+        nrp = f'68{uuid.uuid4().int % 10**6:06d}"; x=1'
+        response = requests.post(f"{BASE_URL}/api/personel", headers=admin_headers, json={
+            "nrp": nrp, "nama_lengkap": "Test Bundle", "kategori": "BINTARA", "pangkat": "SERDA",
+            "status_personel": "AKTIF"
+        })
+        assert response.status_code == 200, response.text
+        response = requests.post(f"{BASE_URL}/api/personel/{nrp}/documents", headers=admin_headers,
+                                 files={"file": ("sk.pdf", io.BytesIO(b"%PDF-1.4\n"))}, params={"jenis_dokumen": "LAINNYA"})
+        assert response.status_code == 200, response.text
+
+        response = requests.get(f"{BASE_URL}/api/documents/bundle", headers=admin_headers, params={"nrp": nrp})
+        assert response.status_code == 200, response.text
+        assert response.headers["Content-Disposition"] == f'attachment; filename="dokumen_{nrp[:8]}_x_1.zip"'
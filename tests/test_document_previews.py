@@ -0,0 +1,92 @@
+"""
+Test suite for SIPARHANUD document previews
+- JPEG thumbnails and web versions of uploaded images
+- First-page rasters of PDFs
+- ETag / If-None-Match, unsupported and unreadable files
+"""
+import pytest
+import requests
+import os
+import io
+import uuid
+from PIL import Image
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestDocumentPreviews:
+    """Test GET /api/documents/{doc_id}/preview"""
+
+    @pytest.fixture(scope="class")
+    def admin_headers(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    @pytest.fixture(scope="class")
+    def nrp(self, admin_headers):
+        nrp = f"67{uuid.uuid4().int % 10**10:010d}"
+        response = requests.post(f"{BASE_URL}/api/personel", headers=admin_headers, json={
+            "nrp": nrp, "nama_lengkap": "Test Preview", "kategori": "BINTARA", "pangkat": "SERDA",
+            "status_personel": "AKTIF"
+        })
+        assert response.status_code == 200, response.text
+        return nrp
+
+    def upload(self, headers, nrp, filename, content):
+        response = requests.post(f"{BASE_URL}/api/personel/{nrp}/documents", headers=headers,
+                                 files={"file": (filename, io.BytesIO(content))}, params={"jenis_dokumen": "FOTO"})
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+
+    def image_bytes(self, size, fmt, mode="RGB"):
+        buffer = io.BytesIO()
+        Image.new(mode, size, "navy").save(buffer, fmt)
+        return buffer.getvalue()
+
+    def test_image_thumb_and_web(self, admin_headers, nrp):
+        doc_id = self.upload(admin_headers, nrp, "foto.png", self.image_bytes((1200, 900), "PNG", "RGBA"))
+
+        response = requests.get(f"{BASE_URL}/api/documents/{doc_id}/preview", headers=admin_headers)
+        assert response.status_code == 200, response.text
+        assert response.headers["Content-Type"] == "image/jpeg"
+        thumb = Image.open(io.BytesIO(response.content))
+        assert thumb.format == "JPEG"
+        assert max(thumb.size) == 256
+
+        response = requests.get(f"{BASE_URL}/api/documents/{doc_id}/preview?size=web", headers=admin_headers)
+        assert Image.open(io.BytesIO(response.content)).size == (1200, 900)
+
+        etag = response.headers["ETag"]
+        response = requests.get(f"{BASE_URL}/api/documents/{doc_id}/preview?size=web",
+                                headers={**admin_headers, "If-None-Match": etag})
+        assert response.status_code == 304
+
+    def test_pdf_first_page(self, admin_headers, nrp):
+        doc_id = self.upload(admin_headers, nrp, "sk.pdf", self.image_bytes((595, 842), "PDF"))
+        response = requests.get(f"{BASE_URL}/api/documents/{doc_id}/preview?size=web", headers=admin_headers)
+        assert response.status_code == 200, response.text
+        page = Image.open(io.BytesIO(response.content))
+        assert page.size[1] == 1600
+
+    def test_unsupported_and_unreadable(self, admin_headers, nrp):
+        doc_id = self.upload(admin_headers, nrp, "surat.docx", b"PK\x03\x04 not really a docx")
+        response = requests.get(f"{BASE_URL}/api/documents/{doc_id}/preview", headers=admin_headers)
+        assert response.status_code == 415
+
+        doc_id = self.upload(admin_headers, nrp, "rusak.pdf", b"%PDF-1.4\nbroken")
+        response = requests.get(f"{BASE_URL}/api/documents/{doc_id}/preview", headers=admin_headers)
+        assert response.status_code == 422
+
+    def test_preview_not_found(self, admin_headers):
+        response = requests.get(f"{BASE_URL}/api/documents/nonexistent-id/preview", headers=admin_headers)
+        assert response.status_code == 404
+
+    def test_preview_jobs_not_listed(self, admin_headers, nrp):
+        """The warm-up job is internal and stays out of the user's job list"""
+        self.upload(admin_headers, nrp, "foto2.jpg", self.image_bytes((300, 200), "JPEG"))
+        response = requests.get(f"{BASE_URL}/api/jobs", headers=admin_headers)
+        assert response.status_code == 200
+        assert all(job["kind"] != "document_previews" for job in response.json())
@@ -9,6 +9,7 @@ import pytest
 import requests
 import os
 import io
+import hashlib
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
 
@@ -300,6 +301,37 @@ class TestDocumentEndpoints:
         print(f"Document verified in list: {doc_id}")
         return doc_id
     
+    def test_upload_records_hash_and_size(self, admin_token):
+        """Size and SHA-256 are computed while the upload streams to disk"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        test_content = b"%PDF-1.4\n" + os.urandom(3 * 1024 * 1024)
+        files = {"file": ("hash_test.pdf", io.BytesIO(test_content), "application/pdf")}
+        params = {"jenis_dokumen": "LAINNYA", "keterangan": "Hash test"}
+        
+        response = requests.post(f"{BASE_URL}/api/personel/{self.TEST_NRP}/documents",
+                                 headers=headers, files=files, params=params)
+        assert response.status_code == 200, f"Upload failed: {response.text}"
+        doc_id = response.json()["id"]
+        
+        docs = requests.get(f"{BASE_URL}/api/personel/{self.TEST_NRP}/documents", headers=headers).json()
+        doc = next(d for d in docs if d["id"] == doc_id)
+        assert doc["file_size"] == len(test_content)
+        assert doc["sha256"] == hashlib.sha256(test_content).hexdigest()
+    
+    def test_upload_document_too_large(self, admin_token):
+        """Uploads over the limit are rejected and leave no document behind"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        before = len(requests.get(f"{BASE_URL}/api/personel/{self.TEST_NRP}/documents", headers=headers).json())
+        test_content = b"%PDF-1.4\n" + b"0" * (10 * 1024 * 1024)
+        files = {"file": ("too_large.pdf", io.BytesIO(test_content), "application/pdf")}
+        params = {"jenis_dokumen": "LAINNYA", "keterangan": "Too large"}
+        
+        response = requests.post(f"{BASE_URL}/api/personel/{self.TEST_NRP}/documents",
+                                 headers=headers, files=files, params=params)
+        assert response.status_code == 400, f"Expected 400 for oversized file, got {response.status_code}"
+        after = len(requests.get(f"{BASE_URL}/api/personel/{self.TEST_NRP}/documents", headers=headers).json())
+        assert after == before
+    
     def test_download_document(self, admin_token):
         """Test download document"""
         headers = {"Authorization": f"Bearer {admin_token}"}
@@ -326,6 +358,43 @@ class TestDocumentEndpoints:
         print(f"Downloaded document size: {len(response.content)} bytes")
         return doc_id
     
+    def test_download_range_and_etag(self, admin_token):
+        """Downloads carry the content hash as ETag, answer 304 and serve byte ranges"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        test_content = b"%PDF-1.4\n" + os.urandom(100000)
+        files = {"file": ("range_test.pdf", io.BytesIO(test_content), "application/pdf")}
+        response = requests.post(f"{BASE_URL}/api/personel/{self.TEST_NRP}/documents", headers=headers,
+                                 files=files, params={"jenis_dokumen": "LAINNYA"})
+        assert response.status_code == 200
+        url = f"{BASE_URL}/api/documents/{response.json()['id']}/download"
+
+        response = requests.get(url, headers=headers)
+        etag = f'"{hashlib.sha256(test_content).hexdigest()}"'
+        assert response.headers["ETag"] == etag
+        assert response.headers["Content-Type"] == "application/pdf"
+        assert response.headers["Accept-Ranges"] == "bytes"
+        assert response.headers["Content-Disposition"].startswith("attachment")
+        assert response.content == test_content
+        preview = requests.get(url, headers=headers, params={"inline": "true"})
+        assert preview.headers["Content-Disposition"].startswith("inline")
+
+        assert requests.get(url, headers={**headers, "If-None-Match": etag}).status_code == 304
+
+        response = requests.get(url, headers={**headers, "Range": "bytes=100-199"})
+        assert response.status_code == 206
+        assert response.headers["Content-Range"] == f"bytes 100-199/{len(test_content)}"
+        assert response.content == test_content[100:200]
+        response = requests.get(url, headers={**headers, "Range": "bytes=-10", "If-Range": etag})
+        assert response.status_code == 206
+        assert response.content == test_content[-10:]
+        response = requests.get(url, headers={**headers, "Range": "bytes=50000-", "If-Range": '"stale"'})
+        assert response.status_code == 200
+        assert response.content == test_content
+
+        response = requests.get(url, headers={**headers, "Range": f"bytes={len(test_content)}-"})
+        assert response.status_code == 416
+        assert response.headers["Content-Range"] == f"bytes */{len(test_content)}"
+
     def test_download_nonexistent_document(self, admin_token):
         """Test download non-existent document"""
         headers = {"Authorization": f"Bearer {admin_token}"}
@@ -361,7 +430,30 @@ class TestDocumentEndpoints:
         get_response = requests.get(f"{BASE_URL}/api/documents/{doc_id}/download", headers=headers)
         assert get_response.status_code == 404, "Document should be deleted"
         print(f"Document {doc_id} successfully deleted")
-    
+
+    def test_duplicate_uploads_share_blob(self, admin_token):
+        """Identical uploads share one stored file; it outlives deleting one of them"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        test_content = b"%PDF-1.4\n" + os.urandom(4096)
+        doc_ids = []
+        for name in ("copy_a.pdf", "copy_b.pdf"):
+            files = {"file": (name, io.BytesIO(test_content), "application/pdf")}
+            response = requests.post(f"{BASE_URL}/api/personel/{self.TEST_NRP}/documents", headers=headers,
+                                     files=files, params={"jenis_dokumen": "LAINNYA"})
+            assert response.status_code == 200, response.text
+            doc_ids.append(response.json()["id"])
+
+        docs = {d["id"]: d for d in requests.get(f"{BASE_URL}/api/personel/{self.TEST_NRP}/documents", headers=headers).json()}
+        first, second = docs[doc_ids[0]], docs[doc_ids[1]]
+        assert first["file_path"] == second["file_path"]
+        assert first["filename_stored"] == hashlib.sha256(test_content).hexdigest()
+
+        assert requests.delete(f"{BASE_URL}/api/documents/{doc_ids[0]}", headers=headers).status_code == 200
+        response = requests.get(f"{BASE_URL}/api/documents/{doc_ids[1]}/download", headers=headers)
+        assert response.status_code == 200
+        assert response.content == test_content
+        assert requests.delete(f"{BASE_URL}/api/documents/{doc_ids[1]}", headers=headers).status_code == 200
+
     def test_delete_nonexistent_document(self, admin_token):
         """Test delete non-existent document"""
         headers = {"Authorization": f"Bearer {admin_token}"}
@@ -0,0 +1,42 @@
+"""
+Test suite for SIPARHANUD personel Excel export
+- Direct download: header row and one row per personel
+- The export is audit logged once it succeeds
+"""
+import pytest
+import requests
+import os
+import io
+import openpyxl
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestExportExcel:
+    """Test GET /api/export/personel/excel"""
+
+    @pytest.fixture(scope="class")
+    def admin_headers(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def test_direct_download(self, admin_headers):
+        total = requests.get(f"{BASE_URL}/api/personel?limit=1&status=AKTIF", headers=admin_headers).json()["total"]
+        response = requests.get(f"{BASE_URL}/api/export/personel/excel?status=AKTIF&background=false",
+                                headers=admin_headers)
+        assert response.status_code == 200, response.text
+        assert response.headers["Content-Type"].startswith("application/vnd.openxmlformats")
+        assert int(response.headers["Content-Length"]) == len(response.content)
+
+        sheet = openpyxl.load_workbook(io.BytesIO(response.content), read_only=True)["Data Personel"]
+        rows = list(sheet.iter_rows(values_only=True))
+        assert list(rows[0]) == ['No', 'NRP', 'Nama Lengkap', 'Pangkat', 'Kategori', 'Jabatan', 'Satuan', 'Status']
+        assert len(rows) - 1 == total
+        assert [row[0] for row in rows[1:]] == list(range(1, total + 1))
+        assert all(row[7] == "AKTIF" for row in rows[1:])
+
+        logs = requests.get(f"{BASE_URL}/api/audit-logs?entity_type=personel&limit=20", headers=admin_headers).json()
+        assert any(log["action"] == "EXPORT_EXCEL" for log in logs)
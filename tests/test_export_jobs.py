@@ -0,0 +1,90 @@
+"""
+Test suite for SIPARHANUD background export jobs
+- PDF export as a background job (job id, polling, download)
+- Job access control
+"""
+import pytest
+import requests
+import os
+import time
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+def wait_for_job(job_id, headers, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = requests.get(f"{BASE_URL}/api/jobs/{job_id}", headers=headers).json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.5)
+    raise AssertionError(f"Job {job_id} did not finish in {timeout}s")
+
+
+class TestExportJobs:
+    """Test export endpoints running as background jobs"""
+
+    @pytest.fixture(scope="class")
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        return response.json()["access_token"]
+
+    @pytest.fixture(scope="class")
+    def staff_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "staff1",
+            "password": "staff123"
+        })
+        return response.json()["access_token"]
+
+    def test_export_pdf_background_job(self, admin_token):
+        """PDF export with background=true returns a job that can be polled and downloaded"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/export/personel/pdf?background=true", headers=headers)
+
+        assert response.status_code == 202, f"Create job failed: {response.text}"
+        job_id = response.json()["job_id"]
+
+        job = wait_for_job(job_id, headers)
+        assert job["status"] == "done", f"Job failed: {job}"
+        assert "file_path" not in job
+
+        response = requests.get(f"{BASE_URL}/api/jobs/{job_id}/download", headers=headers)
+        assert response.status_code == 200
+        assert response.headers.get("content-type") == "application/pdf"
+        assert response.content[:4] == b'%PDF'
+
+    def test_export_excel_background_job(self, admin_token):
+        """Excel export can run as a job; finished jobs cannot be cancelled"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/export/personel/excel?background=true", headers=headers)
+        assert response.status_code == 202, f"Create job failed: {response.text}"
+        job_id = response.json()["job_id"]
+
+        job = wait_for_job(job_id, headers)
+        assert job["status"] == "done", f"Job failed: {job}"
+        assert job["progress"]["current"] == job["progress"]["total"]
+
+        response = requests.get(f"{BASE_URL}/api/jobs/{job_id}/download", headers=headers)
+        assert response.status_code == 200
+        assert response.content[:2] == b'PK'
+
+        response = requests.post(f"{BASE_URL}/api/jobs/{job_id}/cancel", headers=headers)
+        assert response.status_code == 400
+
+    def test_job_not_visible_to_other_user(self, admin_token, staff_token):
+        """Only the creator (or an admin) can see a job"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        job_id = requests.get(f"{BASE_URL}/api/export/personel/pdf?background=true", headers=headers).json()["job_id"]
+
+        staff_headers = {"Authorization": f"Bearer {staff_token}"}
+        response = requests.get(f"{BASE_URL}/api/jobs/{job_id}", headers=staff_headers)
+        assert response.status_code == 403, f"Expected 403, got {response.status_code}"
+
+    def test_job_not_found(self, admin_token):
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/jobs/nonexistent-job", headers=headers)
+        assert response.status_code == 404
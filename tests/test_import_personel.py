@@ -0,0 +1,71 @@
+"""
+Test suite for SIPARHANUD personel Excel import
+- New rows are imported with their DIKBANG and prestasi
+- Existing NRPs and NRPs repeated in the workbook are skipped
+"""
+import pytest
+import requests
+import os
+import io
+import time
+
+import pandas as pd
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+HEADER = ["NO", "NAMA", "PANGKAT", "NRP", "TMT", "JABATAN", "LAHIR", "DIKBANGUM", "DIKBANGSPES", "PRESTASI"]
+
+
+def make_workbook(rows):
+    """Build a Data Personel workbook with a PERWIRA section"""
+    data = [["PERWIRA"] + [None] * 9, HEADER, [str(i) for i in range(1, 11)]]
+    for i, (nrp, nama) in enumerate(rows, start=1):
+        data.append([str(i), nama, "KAPTEN", nrp, "01-01-2020", "DANRAI", "01-01-1990",
+                     "1. SECAPA, 2. SELAPA", "SUSPA ARH", "JUARA 1"])
+    output = io.BytesIO()
+    pd.DataFrame(data).to_excel(output, header=False, index=False)
+    return output.getvalue()
+
+
+class TestImportPersonel:
+    """Test POST /api/import/personel"""
+
+    @pytest.fixture(scope="class")
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        return response.json()["access_token"]
+
+    def upload(self, token, content):
+        return requests.post(
+            f"{BASE_URL}/api/import/personel?background=false",
+            headers={"Authorization": f"Bearer {token}"},
+            files={"file": ("import.xlsx", content, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
+        )
+
+    def test_import_skips_existing_and_repeated_nrp(self, admin_token):
+        """A second upload skips everything; repeated NRPs in one workbook are imported once"""
+        prefix = f"77{int(time.time() * 1000) % 10**9:09d}"
+        rows = [(f"{prefix}{i:03d}", f"TEST IMPORT {i}") for i in range(5)]
+        rows.append(rows[0])
+
+        response = self.upload(admin_token, make_workbook(rows))
+        assert response.status_code == 200, f"Import failed: {response.text}"
+        result = response.json()
+        assert result["imported"] == 5
+        assert result["skipped"] == 1
+        assert result["errors"] == []
+
+        response = self.upload(admin_token, make_workbook(rows[:5]))
+        assert response.status_code == 200
+        assert response.json()["imported"] == 0
+        assert response.json()["skipped"] == 5
+
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        personel = requests.get(f"{BASE_URL}/api/personel/{rows[0][0]}", headers=headers).json()
+        assert personel["kategori"] == "PERWIRA"
+        dikbang = requests.get(f"{BASE_URL}/api/personel/{rows[0][0]}/dikbang", headers=headers).json()
+        assert sorted(d["nama_diklat"] for d in dikbang) == ["SECAPA", "SELAPA", "SUSPA ARH"]
+        prestasi = requests.get(f"{BASE_URL}/api/personel/{rows[0][0]}/prestasi", headers=headers).json()
+        assert [p["nama_prestasi"] for p in prestasi] == ["JUARA 1"]
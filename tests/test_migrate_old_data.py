@@ -0,0 +1,97 @@
+"""
+Test suite for SIPARHANUD legacy data migration
+- Dry run counts without writing
+- An interrupted run resumes after its checkpoint
+- Legacy rows with null fields migrate with defaults
+- Only one run at a time
+
+Runs in-process against MongoDB (needs MONGO_URL and DB_NAME, uses a throwaway
+<DB_NAME>_migrate database).
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+if not os.environ.get("MONGO_URL") or not os.environ.get("DB_NAME"):
+    pytest.skip("needs MONGO_URL and DB_NAME", allow_module_level=True)
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import server  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+
+
+def run(test):
+    async def main():
+        server.client = server.AsyncIOMotorClient(os.environ["MONGO_URL"])
+        server.db = server.client[f"{os.environ['DB_NAME']}_migrate"]
+        await server.db.leases.create_index("name", unique=True)
+        await server.db.personnel.insert_many([
+            {"_id": i, "nrp": f"LEGACY{i}", "nama": f"Personel {i}", "pangkat": "SERDA", "status": "aktif",
+             "satuan": "YON A", "dikbangum": "1. SECABA, 2. SUSBA"}
+            for i in range(1, 6)
+        ])
+        try:
+            await test()
+        finally:
+            await server.client.drop_database(f"{os.environ['DB_NAME']}_migrate")
+    asyncio.run(main())
+
+
+def test_dry_run():
+    async def test():
+        result = await server.migrate_personnel_collection(dry_run=True)
+        assert result["dry_run"] is True
+        assert result["migrated"] == 5
+        assert result["dikbang"] == 10
+        assert await server.db.personel.count_documents({}) == 0
+        assert await server.db.dikbang.count_documents({}) == 0
+        assert await server.db.migration_checkpoints.count_documents({}) == 0
+    run(test)
+
+
+def test_resume_from_checkpoint(monkeypatch):
+    monkeypatch.setattr(server, "MIGRATE_BATCH_SIZE", 2)
+
+    async def test():
+        # a previous run stopped after the batch ending at _id 2
+        await server.db.migration_checkpoints.insert_one({
+            "name": server.MIGRATE_CHECKPOINT, "status": "running", "last_id": 2,
+            "migrated": 2, "skipped": 0, "dikbang": 4, "prestasi": 0
+        })
+        result = await server.migrate_personnel_collection()
+        assert result["resumed"] is True
+        assert result["migrated"] == 5
+        assert sorted(await server.db.personel.distinct("nrp")) == ["LEGACY3", "LEGACY4", "LEGACY5"]
+
+        checkpoint = await server.db.migration_checkpoints.find_one({"name": server.MIGRATE_CHECKPOINT})
+        assert checkpoint["status"] == "done"
+        assert checkpoint["last_id"] == 5
+        assert await server.db.leases.count_documents({}) == 0
+    run(test)
+
+
+def test_null_fields():
+    async def test():
+        await server.db.personnel.insert_one({"_id": 6, "nrp": "LEGACY6", "nama": None, "status": None,
+                                              "pangkat": None, "satuan": None})
+        await server.migrate_personnel_collection()
+        personel = await server.db.personel.find_one({"nrp": "LEGACY6"})
+        assert personel["status_personel"] == "AKTIF"
+        assert personel["nama_lengkap"] == "" and personel["satuan_induk"] == ""
+        assert await server.db.personel.count_documents({}) == 6
+    run(test)
+
+
+def test_concurrent_run_rejected():
+    async def test():
+        await server.db.leases.insert_one({"name": server.MIGRATE_LEASE, "owner": "other",
+                                           "expires_at": "9999-01-01T00:00:00+00:00"})
+        with pytest.raises(HTTPException) as error:
+            await server.migrate_personnel_collection()
+        assert error.value.status_code == 409
+        assert await server.db.personel.count_documents({}) == 0
+    run(test)
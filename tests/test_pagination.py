@@ -0,0 +1,73 @@
+"""
+Test suite for SIPARHANUD keyset pagination
+- /personel pages with next_cursor in (kategori, pangkat, nrp) order
+- /audit-logs pages with the X-Next-Cursor header, newest first
+- Optional totals and invalid cursors
+"""
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestPagination:
+    """Test cursor pagination on list endpoints"""
+
+    @pytest.fixture(scope="class")
+    def admin_headers(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def test_personel_cursor_walk(self, admin_headers):
+        """Walking with next_cursor returns every personel once, in sort order"""
+        full = requests.get(f"{BASE_URL}/api/personel?limit=100000", headers=admin_headers).json()
+        assert full["next_cursor"] is None
+
+        seen = []
+        params = {"limit": 2, "total": "none"}
+        while True:
+            page = requests.get(f"{BASE_URL}/api/personel", headers=admin_headers, params=params).json()
+            assert page["total"] is None
+            seen += [p["nrp"] for p in page["data"]]
+            if not page["next_cursor"]:
+                break
+            params["cursor"] = page["next_cursor"]
+
+        assert seen == [p["nrp"] for p in full["data"]]
+        keys = [(p.get("kategori") or "", p.get("pangkat") or "", p["nrp"]) for p in full["data"]]
+        assert keys == sorted(keys)
+        assert len(seen) == full["total"]
+
+    def test_personel_estimated_total(self, admin_headers):
+        exact = requests.get(f"{BASE_URL}/api/personel?limit=1", headers=admin_headers).json()["total"]
+        estimated = requests.get(f"{BASE_URL}/api/personel?limit=1&total=estimated", headers=admin_headers).json()["total"]
+        assert estimated == exact
+
+    def test_invalid_cursor(self, admin_headers):
+        response = requests.get(f"{BASE_URL}/api/personel?cursor=not-a-cursor", headers=admin_headers)
+        assert response.status_code == 400
+        response = requests.get(f"{BASE_URL}/api/audit-logs?cursor=WzFd", headers=admin_headers)
+        assert response.status_code == 400
+
+    def test_audit_log_cursor_walk(self, admin_headers):
+        """Audit log body stays a list; the cursor and total travel in headers"""
+        response = requests.get(f"{BASE_URL}/api/audit-logs?limit=5&total=exact", headers=admin_headers)
+        assert response.status_code == 200
+        assert isinstance(response.json(), list)
+        total = int(response.headers["X-Total-Count"])
+
+        seen = [log["id"] for log in response.json()]
+        while "X-Next-Cursor" in response.headers and len(seen) < 50:
+            response = requests.get(f"{BASE_URL}/api/audit-logs", headers=admin_headers,
+                                    params={"limit": 5, "cursor": response.headers["X-Next-Cursor"]})
+            assert "X-Total-Count" not in response.headers
+            seen += [log["id"] for log in response.json()]
+
+        assert len(seen) == len(set(seen))
+        assert len(seen) == min(total, 50)
+        first_page = requests.get(f"{BASE_URL}/api/audit-logs?limit={len(seen)}", headers=admin_headers).json()
+        assert [log["id"] for log in first_page] == seen
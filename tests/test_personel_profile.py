@@ -0,0 +1,79 @@
+"""
+Test suite for SIPARHANUD personel profile
+- One response with the personel and all sub-collections
+- include= section selector
+- ETag / If-None-Match
+"""
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestPersonelProfile:
+    """Test GET /api/personel/{nrp}/profile"""
+
+    @pytest.fixture(scope="class")
+    def admin_headers(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    @pytest.fixture(scope="class")
+    def nrp(self, admin_headers):
+        nrp = f"66{uuid.uuid4().int % 10**10:010d}"
+        response = requests.post(f"{BASE_URL}/api/personel", headers=admin_headers, json={
+            "nrp": nrp, "nama_lengkap": "Test Profile", "kategori": "BINTARA", "pangkat": "SERDA",
+            "status_personel": "AKTIF"
+        })
+        assert response.status_code == 200, response.text
+        for tahun in ("2019", "2021"):
+            requests.post(f"{BASE_URL}/api/personel/{nrp}/prestasi", headers=admin_headers,
+                          json={"nama_prestasi": f"Juara {tahun}", "tahun": tahun})
+        return nrp
+
+    def test_full_profile(self, admin_headers, nrp):
+        response = requests.get(f"{BASE_URL}/api/personel/{nrp}/profile", headers=admin_headers)
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["personel"]["nrp"] == nrp
+        assert "search_prefixes" not in data["personel"]
+        assert [p["tahun"] for p in data["prestasi"]] == ["2021", "2019"]
+        assert data["kesejahteraan"] == {}
+        for section in ("riwayat_jabatan", "riwayat_pangkat", "dikbang", "tanda_jasa", "keluarga",
+                        "kesjas", "hukuman", "cuti", "documents"):
+            assert data[section] == []
+
+    def test_include_selects_sections(self, admin_headers, nrp):
+        response = requests.get(f"{BASE_URL}/api/personel/{nrp}/profile", headers=admin_headers,
+                                params={"include": "prestasi,keluarga"})
+        assert response.status_code == 200
+        assert set(response.json()) == {"prestasi", "keluarga"}
+
+        response = requests.get(f"{BASE_URL}/api/personel/{nrp}/profile", headers=admin_headers,
+                                params={"include": "prestasi,gaji"})
+        assert response.status_code == 400
+
+    def test_missing_personel(self, admin_headers):
+        response = requests.get(f"{BASE_URL}/api/personel/0000000000/profile", headers=admin_headers,
+                                params={"include": "prestasi"})
+        assert response.status_code == 404
+
+    def test_etag(self, admin_headers, nrp):
+        """Unchanged profile answers 304; a change produces a new ETag"""
+        url = f"{BASE_URL}/api/personel/{nrp}/profile"
+        etag = requests.get(url, headers=admin_headers).headers["ETag"]
+
+        response = requests.get(url, headers={**admin_headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+        requests.put(f"{BASE_URL}/api/personel/{nrp}", headers=admin_headers, json={"pangkat": "SERTU"})
+        response = requests.get(url, headers={**admin_headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert response.json()["personel"]["pangkat"] == "SERTU"
@@ -0,0 +1,103 @@
+"""
+Test suite for SIPARHANUD personel search
+- Word-prefix name search with relevance ordering
+- Anchored NRP prefix search
+- Search fields follow renames and are not returned
+"""
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestPersonelSearch:
+    """Test GET /api/personel?search="""
+
+    @pytest.fixture(scope="class")
+    def admin_headers(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    @pytest.fixture(scope="class")
+    def people(self, admin_headers):
+        """Three personel sharing a random name word"""
+        word = f"Zq{uuid.uuid4().hex[:6]}"
+        base = int(uuid.uuid4().int % 10**8)
+        people = {
+            f"88{base:08d}01": f"{word} Santoso",
+            f"88{base:08d}02": f"Santoso {word}",
+            f"88{base:08d}03": word,
+        }
+        for nrp, nama in people.items():
+            response = requests.post(f"{BASE_URL}/api/personel", headers=admin_headers, json={
+                "nrp": nrp, "nama_lengkap": nama, "kategori": "BINTARA", "pangkat": "SERDA", "status_personel": "AKTIF"
+            })
+            assert response.status_code == 200, response.text
+        return word, list(people)
+
+    def search(self, headers, value):
+        response = requests.get(f"{BASE_URL}/api/personel", headers=headers, params={"search": value})
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    def test_name_prefix_relevance(self, admin_headers, people):
+        """Exact name first, then names starting with the query, then other word matches"""
+        word, nrps = people
+        result = self.search(admin_headers, word[:5].upper())
+        assert result["total"] == 3
+        assert [p["nrp"] for p in result["data"]] == [nrps[2], nrps[0], nrps[1]]
+        assert "search_prefixes" not in result["data"][0]
+
+    def test_multi_word_prefix(self, admin_headers, people):
+        word, nrps = people
+        result = self.search(admin_headers, f"sant {word[:4]}")
+        assert sorted(p["nrp"] for p in result["data"]) == sorted(nrps[:2])
+
+    def test_nrp_prefix_is_anchored(self, admin_headers, people):
+        _, nrps = people
+        assert [p["nrp"] for p in self.search(admin_headers, nrps[0])["data"]] == [nrps[0]]
+        assert self.search(admin_headers, nrps[0][:-2])["total"] == 3
+        assert self.search(admin_headers, nrps[0][2:])["total"] == 0
+
+    def test_rename_updates_search(self, admin_headers, people):
+        word, nrps = people
+        new_word = f"Xv{uuid.uuid4().hex[:6]}"
+        response = requests.put(f"{BASE_URL}/api/personel/{nrps[1]}", headers=admin_headers,
+                                json={"nama_lengkap": f"Santoso {new_word}"})
+        assert response.status_code == 200
+        assert [p["nrp"] for p in self.search(admin_headers, new_word)["data"]] == [nrps[1]]
+        assert self.search(admin_headers, word)["total"] == 2
+
+    def test_alphanumeric_nrp_prefix(self, admin_headers):
+        """A single word with a digit also matches as an NRP prefix"""
+        nrp = f"B{uuid.uuid4().hex[:8].upper()}7"
+        response = requests.post(f"{BASE_URL}/api/personel", headers=admin_headers, json={
+            "nrp": nrp, "nama_lengkap": "Test Nrp", "kategori": "BINTARA", "pangkat": "SERDA", "status_personel": "AKTIF"
+        })
+        assert response.status_code == 200, response.text
+        assert [p["nrp"] for p in self.search(admin_headers, nrp[:6])["data"]] == [nrp]
+        assert self.search(admin_headers, nrp[2:])["total"] == 0
+
+    def test_satuan_filter_is_literal_prefix(self, admin_headers):
+        satuan = f"YON.{uuid.uuid4().hex[:6]} (A)"
+        nrp = f"89{uuid.uuid4().int % 10**10:010d}"
+        response = requests.post(f"{BASE_URL}/api/personel", headers=admin_headers, json={
+            "nrp": nrp, "nama_lengkap": "Test Satuan", "kategori": "BINTARA", "pangkat": "SERDA",
+            "status_personel": "AKTIF", "satuan_induk": satuan
+        })
+        assert response.status_code == 200, response.text
+
+        def nrps(value):
+            response = requests.get(f"{BASE_URL}/api/personel", headers=admin_headers, params={"satuan": value})
+            assert response.status_code == 200, response.text
+            return [p["nrp"] for p in response.json()["data"]]
+        assert nrps(satuan) == [nrp]
+        assert nrps(satuan[:10]) == [nrp]
+        assert nrps(satuan.replace(".", "X")) == []
+        assert nrps(satuan[1:]) == []
+        assert nrps("(") == []
@@ -0,0 +1,89 @@
+"""
+Test suite for SIPARHANUD personel statistics
+- /personel/stats counters follow personel creates and updates
+- Reconciliation repairs a counter that drifted
+
+The reconciliation test runs in-process against MongoDB (needs MONGO_URL and
+DB_NAME, uses a throwaway <DB_NAME>_stats database).
+"""
+import asyncio
+import pytest
+import requests
+import os
+import sys
+import uuid
+from pathlib import Path
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestPersonelStats:
+    """Test GET /api/personel/stats against fresh counts"""
+
+    @pytest.fixture(scope="class")
+    def admin_headers(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def count(self, headers, **params):
+        response = requests.get(f"{BASE_URL}/api/personel", headers=headers, params={"limit": 1, **params})
+        return response.json()["total"]
+
+    def assert_stats_match(self, headers):
+        stats = requests.get(f"{BASE_URL}/api/personel/stats", headers=headers).json()
+        assert stats["total"] == self.count(headers)
+        assert stats["aktif"] == self.count(headers, status="AKTIF")
+        for kategori in ("PERWIRA", "BINTARA", "TAMTAMA", "PNS"):
+            assert stats["by_kategori"].get(kategori, 0) == self.count(headers, kategori=kategori)
+
+    def test_create_and_update(self, admin_headers):
+        self.assert_stats_match(admin_headers)
+
+        nrp = f"69{uuid.uuid4().int % 10**10:010d}"
+        response = requests.post(f"{BASE_URL}/api/personel", headers=admin_headers, json={
+            "nrp": nrp, "nama_lengkap": "Test Stats", "kategori": "BINTARA", "pangkat": "SERDA",
+            "status_personel": "AKTIF"
+        })
+        assert response.status_code == 200, response.text
+        self.assert_stats_match(admin_headers)
+
+        for change in ({"status_personel": "PENSIUN"}, {"kategori": "PERWIRA", "pangkat": "LETDA"},
+                       {"status_personel": "AKTIF"}):
+            response = requests.put(f"{BASE_URL}/api/personel/{nrp}", headers=admin_headers, json=change)
+            assert response.status_code == 200, response.text
+            self.assert_stats_match(admin_headers)
+
+
+@pytest.mark.skipif(not os.environ.get("MONGO_URL") or not os.environ.get("DB_NAME"),
+                    reason="needs MONGO_URL and DB_NAME")
+def test_reconcile_repairs_drift():
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+    import server
+
+    async def main():
+        server.client = server.AsyncIOMotorClient(os.environ["MONGO_URL"])
+        server.db = server.client[f"{os.environ['DB_NAME']}_stats"]
+        try:
+            await server.db.personel.insert_many([
+                {"nrp": str(i), "kategori": "BINTARA", "pangkat": "SERDA", "status_personel": "AKTIF",
+                 "satuan_induk": "YON A"}
+                for i in range(3)
+            ])
+            assert (await server.compute_personel_stats())["aktif"] == 3
+
+            await server.db.stats_snapshot.update_one({"dimension": "status", "value": "AKTIF"}, {"$set": {"count": 7}})
+            await server.db.stats_snapshot.insert_one({"dimension": "kategori", "value": "PNS", "count": 2})
+            await server.db.stats_snapshot.delete_one({"dimension": "pangkat", "value": "SERDA"})
+            assert await server.reconcile_stats_snapshot() == 3
+
+            stats = await server.compute_personel_stats()
+            assert stats["aktif"] == 3
+            assert stats["by_kategori"] == {"BINTARA": 3}
+            assert (await server.read_stats_counters())["pangkat"] == {"SERDA": 3}
+            assert await server.reconcile_stats_snapshot() == 0
+        finally:
+            await server.client.drop_database(f"{os.environ['DB_NAME']}_stats")
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+"""
+Test suite for SIPARHANUD principal cache
+- Cached user lookups are evicted on user changes
+- Cache hit/miss counters (admin only)
+"""
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestPrincipalCache:
+    """Test get_current_user caching and invalidation"""
+
+    @pytest.fixture(scope="class")
+    def admin_token(self):
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        return response.json()["access_token"]
+
+    def test_deactivated_user_loses_access(self, admin_token):
+        """A cached principal is evicted when the account is deactivated"""
+        admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        username = f"TEST_cache_{uuid.uuid4().hex[:8]}"
+        response = requests.post(f"{BASE_URL}/api/users", headers=admin_headers, json={
+            "username": username,
+            "password": "cache123",
+            "nama_lengkap": "Test Cache",
+            "role": "staff"
+        })
+        assert response.status_code == 200, f"Create user failed: {response.text}"
+        user_id = response.json()["id"]
+
+        login = requests.post(f"{BASE_URL}/api/auth/login", json={"username": username, "password": "cache123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        # Warm the cache
+        for _ in range(3):
+            assert requests.get(f"{BASE_URL}/api/auth/me", headers=headers).status_code == 200
+
+        response = requests.delete(f"{BASE_URL}/api/users/{user_id}", headers=admin_headers)
+        assert response.status_code == 200
+
+        response = requests.get(f"{BASE_URL}/api/auth/me", headers=headers)
+        assert response.status_code == 401, f"Expected 401 after deactivation, got {response.status_code}"
+
+    def test_cache_stats(self, admin_token):
+        """Cache counters are reported to admins"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/admin/cache-stats", headers=headers)
+
+        assert response.status_code == 200, f"Get cache stats failed: {response.text}"
+        stats = response.json()["principal"]
+        assert stats["hits"] >= 1
+        assert "misses" in stats
+        assert "size" in stats